@@ -0,0 +1,154 @@
+"""
+Per plant per hour rollups of the readings (count, mean, std, min and max of each
+metric, and the latest last_watered) for the long-term archive, built incrementally
+from time-ordered chunks and compacted into daily and monthly rollups
+"""
+
+# ========== IMPORTS ==========
+import pandas as pd
+
+METRICS = ["soil_moisture", "temperature"]
+STATS = ["count", "mean", "std", "min", "max"]
+ROLLUP_COLUMNS = (["plant_id", "bucket_start"] +
+                  [f"{metric}_{stat}" for metric in METRICS for stat in STATS] +
+                  ["last_watered"])
+
+
+# ========== FUNCTIONS ==========
+def empty_rollups() -> pd.DataFrame:
+    """Returns pd.DF of no rollups, with ROLLUP_COLUMNS and their types."""
+
+    dtypes = {column: "float64" for column in ROLLUP_COLUMNS}
+    dtypes |= {f"{metric}_count": "int64" for metric in METRICS}
+    dtypes |= {"plant_id": "int64", "bucket_start": "datetime64[ns, UTC]",
+               "last_watered": "datetime64[ns, UTC]"}
+
+    return pd.DataFrame({column: pd.Series(dtype=dtypes[column])
+                         for column in ROLLUP_COLUMNS})
+
+
+def get_partials(df: pd.DataFrame, freq: str = "h") -> pd.DataFrame:
+    """Gets the count, mean, M2 (sum of squared differences from the mean),
+    min and max of each metric per plant and `freq` bucket, in one groupby.
+    Returns pd.DF."""
+
+    df = df.assign(bucket_start=df["recording_taken"].dt.floor(freq))
+    if "last_watered" not in df:
+        df["last_watered"] = pd.NaT
+    groups = df.groupby(["plant_id", "bucket_start"])
+
+    partials = groups[METRICS].agg(["count", "mean", "var", "min", "max"])
+    partials.columns = [f"{metric}_{stat}" for metric, stat in partials.columns]
+    for metric in METRICS:
+        partials[f"{metric}_m2"] = (partials.pop(f"{metric}_var").fillna(0) *
+                                    (partials[f"{metric}_count"] - 1))
+    partials["last_watered"] = pd.to_datetime(groups["last_watered"].max(),
+                                              utc=True)
+
+    return partials.reset_index()
+
+
+def combine_partials(partials: pd.DataFrame, freq: str | None = None) -> pd.DataFrame:
+    """Combines partials of the same plant and bucket, after moving them into
+    `freq` buckets if given, using the parallel form of Welford's algorithm.
+    Returns pd.DF of partials."""
+
+    if freq is not None:
+        partials = partials.assign(
+            bucket_start=partials["bucket_start"].dt.tz_localize(None)
+            .dt.to_period(freq).dt.start_time.dt.tz_localize("UTC"))
+    partials = partials.copy()
+    groups = partials.groupby(["plant_id", "bucket_start"])
+
+    combined = pd.DataFrame(index=groups.size().index)
+    for metric in METRICS:
+        count, mean = partials[f"{metric}_count"], partials[f"{metric}_mean"]
+        partials[f"{metric}_weighted"] = (count * mean).fillna(0)
+        combined[f"{metric}_count"] = groups[f"{metric}_count"].sum()
+        combined[f"{metric}_mean"] = (groups[f"{metric}_weighted"].sum() /
+                                      combined[f"{metric}_count"])
+        overall = groups[f"{metric}_weighted"].transform("sum") / \
+            groups[f"{metric}_count"].transform("sum")
+        partials[f"{metric}_spread"] = (partials[f"{metric}_m2"] +
+                                        count * (mean - overall) ** 2).fillna(0)
+        combined[f"{metric}_m2"] = groups[f"{metric}_spread"].sum()
+        combined[f"{metric}_min"] = groups[f"{metric}_min"].min()
+        combined[f"{metric}_max"] = groups[f"{metric}_max"].max()
+    combined["last_watered"] = groups["last_watered"].max()
+
+    return combined.reset_index()
+
+
+def to_rollups(partials: pd.DataFrame) -> pd.DataFrame:
+    """Replaces M2 with the sample standard deviation.
+    Returns pd.DF with ROLLUP_COLUMNS."""
+
+    rollups = partials.copy()
+    for metric in METRICS:
+        count = rollups[f"{metric}_count"]
+        rollups[f"{metric}_std"] = (rollups[f"{metric}_m2"] / (count - 1)) ** 0.5
+        rollups.loc[count < 2, f"{metric}_std"] = float("nan")
+        rollups[f"{metric}_count"] = count.astype("int64")
+
+    return rollups[ROLLUP_COLUMNS]
+
+
+def to_partials(rollups: pd.DataFrame) -> pd.DataFrame:
+    """Recovers M2 from the standard deviation of archived rollups,
+    so they can be compacted.
+    Returns pd.DF of partials."""
+
+    partials = rollups.copy()
+    for metric in METRICS:
+        count = partials[f"{metric}_count"]
+        partials[f"{metric}_m2"] = (partials.pop(f"{metric}_std").fillna(0) ** 2 *
+                                    (count - 1).clip(lower=0))
+
+    return partials
+
+
+def compact(rollups: pd.DataFrame, freq: str) -> pd.DataFrame:
+    """Compacts rollups into coarser buckets, e.g. "D" for days or "M" for months.
+    Returns pd.DF with ROLLUP_COLUMNS."""
+
+    if rollups.empty:
+        return empty_rollups()
+
+    return to_rollups(combine_partials(to_partials(rollups), freq))
+
+
+def summarise(rollups: pd.DataFrame) -> pd.DataFrame:
+    """Combines rollups into 1 mean, std, min and max per metric per plant,
+    the archived summary, for when the readings are no longer kept.
+    Returns pd.DF."""
+
+    partials = to_partials(rollups).assign(bucket_start=pd.Timestamp(0, tz="UTC"))
+    summary = to_rollups(combine_partials(partials))
+
+    return summary[["plant_id"] + [f"{metric}_{stat}" for metric in METRICS
+                                   for stat in ["mean", "std", "min", "max"]]]
+
+
+class HourlyRollups:
+    """Builds hourly rollups from time-ordered chunks of readings. Each chunk
+    is reduced to its partials at once, and partials of hours that span
+    chunks are combined at the end, so only the partials are kept."""
+
+    def __init__(self):
+        self.partials = []
+
+    def add(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """Adds a chunk of readings.
+        Returns the chunk, so this can sit in a pipeline of chunks."""
+
+        self.partials.append(get_partials(chunk))
+        return chunk
+
+    def result(self) -> pd.DataFrame:
+        """Returns pd.DF of the hourly rollups with ROLLUP_COLUMNS."""
+
+        if not self.partials:
+            return empty_rollups()
+
+        return to_rollups(combine_partials(pd.concat(self.partials,
+                                                     ignore_index=True)))
@@ -2,30 +2,39 @@
 Python script for visualising and hosting a dashboard for LMNH plant data
 """
 
+from contextlib import AbstractContextManager
 from os import environ as ENV, system, listdir
 from datetime import datetime, timezone, timedelta
 from dateutil.relativedelta import relativedelta
 from re import fullmatch
 from dotenv import load_dotenv
 from boto3 import client
-from pymssql import connect
+from pymssql import connect, Connection
+from connection import get_pool
+from rolling import add_rolling_nstd
+from rollups import ROLLUP_COLUMNS, summarise
 import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
 import altair as alt
 import streamlit as st
 
+# e.g. 2024/04/17/anomalies.parquet, 2024/04/17/summary/plant_id=7.csv,
+# 2024/04/17/daily.parquet or 2024/04/monthly.parquet
+ARCHIVE_PATTERN = (r"\d{4}/\d{2}/(?:\d{2}/(?:(?:summary|anomalies)(?:/plant_id=\d+)?"
+                   r"\.(?:parquet|csv)|daily\.parquet)|monthly\.parquet)")
+SUMMARY_COLUMNS = ["plant_id"] + [f"{metric}_{stat}"
+                                  for metric in ["soil_moisture", "temperature"]
+                                  for stat in ["mean", "std", "min", "max"]]
+# the newest schema version of the long-term Parquet archives this dashboard can read
+ARCHIVE_SCHEMA_VERSION = 1
 
-def get_db_connection(config: dict) -> connect:
-    """Returns database connection."""
 
-    return connect(
-        server=config["DB_HOST"],
-        port=config["DB_PORT"],
-        user=config["DB_USER"],
-        database=config["DB_NAME"],
-        password=config["DB_PASSWORD"],
-        as_dict=True
-    )
+def get_db_connection(config: dict) -> AbstractContextManager[Connection]:
+    """Returns a context manager lending a connection from the shared pool,
+    which is given back, with any open transaction rolled back, on exit."""
+
+    return get_pool(config, factory=connect).connection()
 
 
 # ========== FUNCTIONS: ST.SELECTIONS ==========
@@ -154,7 +163,7 @@ def get_realtime_df(conn: connect) -> pd.DataFrame:
     """Returns real-time data as a pd.DF."""
 
     with conn.cursor() as curr:
-        query = f"""
+        query = """
             SELECT r.recording_taken, r.plant_id, soil_moisture, temperature
             FROM s_beta.recording AS r
             """
@@ -200,34 +209,13 @@ def get_realtime_graph(df: pd.DataFrame,
     return graph
 
 
-def get_std(row: dict, df: pd.DataFrame, col: str) -> int:
-    """Compare minutely value to mean of past hour;
-    Returns std."""
-
-    last_hour = pd.Timestamp(datetime.now(timezone.utc)-timedelta(hours=1))
-    last_hour_vals = df[(df["plant_id"] == row["plant_id"]) &
-                        (df["recording_taken"] >= last_hour)][col]
-
-    mean = last_hour_vals.mean()
-    std = last_hour_vals.std()
-
-    nstd = (row[col] - mean) / std
-
-    return nstd
-
-
 def get_realtime_stds(df: pd.DataFrame,
                       current: datetime = datetime.now(timezone.utc)) -> alt.Chart:
     """Returns top real-time standard deviations as a bar chart."""
 
-    df = df[(current - df["recording_taken"]) <= timedelta(hours=1)]
-
-    df["soil_moisture_nstd"] = df.apply(get_std,
-                                        args=(df, "soil_moisture"),
-                                        axis=1)
-    df["temperature_nstd"] = df.apply(get_std,
-                                      args=(df, "temperature"),
-                                      axis=1)
+    # each reading is compared with the same plant's readings in the hour before it
+    df = df[(current - df["recording_taken"]) <= timedelta(hours=1, minutes=1)]
+    df = add_rolling_nstd(df)
 
     df = df[(current - df["recording_taken"]) <= timedelta(minutes=1)]
 
@@ -246,34 +234,49 @@ def check_within_timeframe(month: int,
                            filename: str,
                            current: datetime = datetime.today()) -> bool:
 
-    split = [int(num) for num in filename.split("/")[:3]]
-    file_date = datetime(split[0], split[1], split[2])
+    split = [int(num) for num in filename.split("/")[:3] if num.isdigit()]
+    # monthly rollups are dated by the first of their month
+    file_date = datetime(split[0], split[1], split[2] if len(split) > 2 else 1)
 
-    return file_date >= (current - relativedelta(month=month))
+    return file_date >= (current - relativedelta(months=month))
 
 
-def get_longterm_csv_names(client: client,
-                           month: int,
-                           bucket: str = "late-ordovician") -> list[str]:
-    """Returns a list of filenames of summary/anomalies.csv
-    within a given time span."""
+def get_longterm_names(client: client,
+                       month: int,
+                       bucket: str = "late-ordovician") -> list[str]:
+    """Returns a list of filenames of anomalies archives and rollups
+    within a given time span, in Parquet where it exists and CSV otherwise,
+    skipping the daily rollups of months already compacted. Summaries are
+    only kept for days archived before there were rollups."""
 
     filenames = [obj["Key"] for obj
                  in client.list_objects(Bucket=bucket)["Contents"]
-                 if bool(fullmatch(r".{11}(?:summary|anomalies).csv", obj["Key"]))
+                 if bool(fullmatch(ARCHIVE_PATTERN, obj["Key"]))
                  and check_within_timeframe(month, obj["Key"])]
-
-    return filenames
-
-
-def download_longterm_csvs(client: client,
-                           month: int,
-                           bucket: str = "late-ordovician",
-                           directory: str = "data") -> None:
+    parquet = {filename.rsplit(".", 1)[0] for filename in filenames
+               if filename.endswith(".parquet")}
+    compacted = {filename[:8] for filename in filenames
+                 if filename.endswith("monthly.parquet")}
+    rolled_up = {filename[:11] for filename in filenames
+                 if filename.endswith("daily.parquet")}
+
+    return [filename for filename in filenames
+            if (filename.endswith(".parquet")
+                or filename.rsplit(".", 1)[0] not in parquet)
+            and not (filename.endswith("daily.parquet")
+                     and filename[:8] in compacted)
+            and not (filename[11:].startswith("summary")
+                     and filename[:11] in rolled_up)]
+
+
+def download_longterm_archives(client: client,
+                               month: int,
+                               bucket: str = "late-ordovician",
+                               directory: str = "data") -> None:
     """Downloads a list of objects from an S3 bucket.
     Returns nothing."""
 
-    filenames = get_longterm_csv_names(client, month, bucket)
+    filenames = get_longterm_names(client, month, bucket)
 
     system(f"mkdir {directory}")
 
@@ -282,26 +285,65 @@ def download_longterm_csvs(client: client,
         client.download_file(bucket, filename, path)
 
 
-def combine_csvs(info: str, directory: str = "data") -> pd.DataFrame:
-    """Return CSVs with the same type of data as pd.DF."""
+def read_archive(path: str, columns: list[str] | None = None) -> pd.DataFrame:
+    """Reads only `columns` of one archive file, Parquet or CSV.
+    Returns pd.DF."""
+
+    if not path.endswith(".parquet"):
+        return pd.read_csv(path, usecols=columns)
+
+    table = pq.read_table(path, columns=columns)
+    version = int((table.schema.metadata or {}).get(b"schema_version", 1))
+    if version > ARCHIVE_SCHEMA_VERSION:
+        raise ValueError(f"{path} has archive schema version {version}; "
+                         f"only up to {ARCHIVE_SCHEMA_VERSION} can be read")
+
+    return table.to_pandas()
+
+
+def combine_archives(info: str,
+                     directory: str = "data",
+                     columns: list[str] | None = None) -> pd.DataFrame:
+    """Return archives with the same type of data as pd.DF."""
 
     files = listdir(directory)
-    csvs = [pd.read_csv(f"{directory}/{file}")
-            for file in files
-            if info in file]
-    df = pd.concat(csvs, ignore_index=True)
+    archives = [read_archive(f"{directory}/{file}", columns)
+                for file in files
+                if info in file]
+    if not archives:
+        return pd.DataFrame(columns=columns)
+
+    df = pd.concat(archives, ignore_index=True)
     return df
 
 
+def get_historical_summary(directory: str = "data") -> pd.DataFrame:
+    """Gets 1 mean, std, min and max per parameter per plant
+    from the archived daily and monthly rollups, alongside the
+    summaries of days archived before there were rollups.
+    Returns pd.DF."""
+
+    rollups = pd.concat([combine_archives(info, directory, ROLLUP_COLUMNS)
+                         for info in ["daily", "monthly"]], ignore_index=True)
+    summaries = [summary for summary in [
+        summarise(rollups), combine_archives("summary", directory, SUMMARY_COLUMNS)]
+        if not summary.empty]
+
+    return (pd.concat(summaries, ignore_index=True) if summaries
+            else pd.DataFrame(columns=SUMMARY_COLUMNS))
+
+
 def get_historical_graph(df: pd.DataFrame,
                          plant_id: int,
-                         current: datetime = datetime.now(timezone.utc)) -> st.altair_chart:
-    """Returns historical data as a line graph."""
+                         current: datetime = datetime.now(timezone.utc)) -> alt.HConcatChart | None:
+    """Returns historical data as a line graph,
+    or None if the plant has no history."""
 
-    df = df.groupby(["plant_id", "plant_name", "scientific_name"],
-                    as_index=False).mean()
+    df = df[df["plant_id"] == plant_id]
+    if df.empty:
+        return None
 
-    record = df[df["plant_id"] == plant_id].iloc[0].to_dict()
+    record = df.astype("float64").mean().to_dict()
 
     soil_x = np.linspace(record["soil_moisture_min"],
                          record["soil_moisture_max"], 1000)
@@ -323,7 +365,6 @@ def get_historical_graph(df: pd.DataFrame,
                        / record["temperature_std"])**2)
     temp_df = pd.DataFrame({"temperature": temp_x,
                             "pdf": temp_pdf})
-    print(temp_pdf)
 
     temp_graph = alt.Chart(temp_df
                            ).mark_line(color="orangered"
@@ -352,8 +393,6 @@ if __name__ == "__main__":
 
     load_dotenv()
 
-    connection = get_db_connection(ENV)
-
     S3 = client('s3',
                 aws_access_key_id=ENV["AWS_KEY"],
                 aws_secret_access_key=ENV["AWS_SKEY"])
@@ -362,76 +401,81 @@ if __name__ == "__main__":
     st.set_page_config(page_title="LMNH Plant Dashboard", page_icon="🌿", layout="wide",
                        initial_sidebar_state="expanded", menu_items=None)
 
-    # ===== DASHBOARD: SIDEBAR =====
-    st.sidebar.title(":rainbow[LMNH Plant Recordings Dashboard]")
-    st.sidebar.subheader("Plant recordings, no better way to see 'em")
-
-    with st.sidebar:
-        sidebar_plant_id = get_plant_selection(connection, "sidebar_plant_id")
-
-        st.subheader("Plant Summary", divider="rainbow")
-
-        plant_name, scientific_name, origin, botanists = get_plant_details(
-            connection, sidebar_plant_id)
-
-        st.write(f"Plant Name: {plant_name}")
-        st.write(f"Scientific Name: {scientific_name}")
-        st.write(f"Country, Location, Timezone: {origin}")
-        st.write(f"Botanists: {botanists}")
-
-    # ===== DASHBOARD: MAIN =====
-    basic, stds = st.columns([.7, .3], gap="large")
-
-    with basic:
-        metrics = st.columns(3)
-        with metrics[0]:
-            total_plant_count = get_total_plant_count(connection)
-            st.metric("total plant count", total_plant_count)
-        with metrics[1]:
-            soil_avg, soil_delta = get_avg_metric(connection, "soil_moisture")
-            st.metric("avg soil moisture", soil_avg, soil_delta, "off")
-        with metrics[2]:
-            temp_avg, temp_delta = get_avg_metric(connection, "temperature")
-            st.metric("avg temperature", temp_avg, temp_delta, "off")
-
-        st.subheader("Real-time Soil Moisture and Temperature")
-        realtime_df = get_realtime_df(connection)
-        realtime_col = st.columns([.15, .85], gap="medium")
-        with realtime_col[0]:
-            realtime_plant_id = get_plant_selection(
-                connection, "realtime_plant_id")
-            realtime_timespan = get_timespan_slider(
-                "hours", 12, "realtime_timespan")
-        with realtime_col[1]:
-            realtime_graph = get_realtime_graph(
-                realtime_df, realtime_plant_id, realtime_timespan)
-            st.altair_chart(
-                realtime_graph,
-                use_container_width=True
-            )
-
-        st.subheader("Historical Soil Moisture and Temperature")
-        historical = st.columns([.15, .85], gap="medium")
-        with historical[0]:
-            historical_plant_id = get_plant_selection(
-                connection, "historical_plant_id")
-            historical_timespan = get_timespan_slider(
-                "months", 12, "historical_timespan")
-        with historical[1]:
-            download_longterm_csvs(S3, historical_timespan)
-            summary_df = combine_csvs("summary")
-            anomalies_df = combine_csvs("anomalies")
-            historical_graphs = get_historical_graph(
-                summary_df, historical_plant_id)
-            st.altair_chart(historical_graphs, use_container_width=True)
-
-    with stds:
-        st.subheader("Top Real-time SD")
-        realtime_std = get_realtime_stds(realtime_df)
-        st.altair_chart(realtime_std, use_container_width=True)
-
-        st.subheader("Top Historical SD")
-        historical_std = get_historical_stds(anomalies_df)
-        st.altair_chart(historical_std, use_container_width=True)
-
-    connection.close()
+    # The pool lives in the `connection` module, so reruns reuse its open connections
+    with get_pool(ENV, factory=connect).connection() as connection:
+        # ===== DASHBOARD: SIDEBAR =====
+        st.sidebar.title(":rainbow[LMNH Plant Recordings Dashboard]")
+        st.sidebar.subheader("Plant recordings, no better way to see 'em")
+
+        with st.sidebar:
+            sidebar_plant_id = get_plant_selection(connection, "sidebar_plant_id")
+
+            st.subheader("Plant Summary", divider="rainbow")
+
+            plant_name, scientific_name, origin, botanists = get_plant_details(
+                connection, sidebar_plant_id)
+
+            st.write(f"Plant Name: {plant_name}")
+            st.write(f"Scientific Name: {scientific_name}")
+            st.write(f"Country, Location, Timezone: {origin}")
+            st.write(f"Botanists: {botanists}")
+
+        # ===== DASHBOARD: MAIN =====
+        basic, stds = st.columns([.7, .3], gap="large")
+
+        with basic:
+            metrics = st.columns(3)
+            with metrics[0]:
+                total_plant_count = get_total_plant_count(connection)
+                st.metric("total plant count", total_plant_count)
+            with metrics[1]:
+                soil_avg, soil_delta = get_avg_metric(connection, "soil_moisture")
+                st.metric("avg soil moisture", soil_avg, soil_delta, "off")
+            with metrics[2]:
+                temp_avg, temp_delta = get_avg_metric(connection, "temperature")
+                st.metric("avg temperature", temp_avg, temp_delta, "off")
+
+            st.subheader("Real-time Soil Moisture and Temperature")
+            realtime_df = get_realtime_df(connection)
+            realtime_col = st.columns([.15, .85], gap="medium")
+            with realtime_col[0]:
+                realtime_plant_id = get_plant_selection(
+                    connection, "realtime_plant_id")
+                realtime_timespan = get_timespan_slider(
+                    "hours", 12, "realtime_timespan")
+            with realtime_col[1]:
+                realtime_graph = get_realtime_graph(
+                    realtime_df, realtime_plant_id, realtime_timespan)
+                st.altair_chart(
+                    realtime_graph,
+                    use_container_width=True
+                )
+
+            st.subheader("Historical Soil Moisture and Temperature")
+            historical = st.columns([.15, .85], gap="medium")
+            with historical[0]:
+                historical_plant_id = get_plant_selection(
+                    connection, "historical_plant_id")
+                historical_timespan = get_timespan_slider(
+                    "months", 12, "historical_timespan")
+            with historical[1]:
+                download_longterm_archives(S3, historical_timespan)
+                # combined from the archived daily and monthly rollups
+                summary_df = get_historical_summary()
+                anomalies_df = combine_archives(
+                    "anomalies", columns=["plant_id", "soil_moisture_nstd", "temperature_nstd"])
+                historical_graphs = get_historical_graph(
+                    summary_df, historical_plant_id)
+                if historical_graphs is None:
+                    st.info("No history for this plant yet.")
+                else:
+                    st.altair_chart(historical_graphs, use_container_width=True)
+
+        with stds:
+            st.subheader("Top Real-time SD")
+            realtime_std = get_realtime_stds(realtime_df)
+            st.altair_chart(realtime_std, use_container_width=True)
+
+            st.subheader("Top Historical SD")
+            historical_std = get_historical_stds(anomalies_df)
+            st.altair_chart(historical_std, use_container_width=True)
@@ -1,4 +1,96 @@
 import pytest
+import pandas as pd
+from unittest.mock import MagicMock
+from streamlit_app import get_historical_graph, get_historical_summary, get_longterm_names, read_archive
+
 
 def test_placeholder():
     pass
+
+
+def test_get_longterm_names_prefers_parquet():
+    s3 = MagicMock()
+    s3.list_objects.return_value = {"Contents": [
+        {"Key": f"2999/01/01/{name}"}
+        for name in ["summary.parquet", "anomalies.csv", "anomalies.parquet",
+                     "anomalies/plant_id=7.csv", "daily.parquet", "notes.txt"]]}
+
+    names = get_longterm_names(s3, 1)
+
+    assert names == ["2999/01/01/anomalies.parquet", "2999/01/01/anomalies/plant_id=7.csv",
+                     "2999/01/01/daily.parquet"]
+
+
+def test_get_longterm_names_keeps_summaries_without_rollups():
+    s3 = MagicMock()
+    s3.list_objects.return_value = {"Contents": [
+        {"Key": key} for key in ["2999/01/01/summary.csv", "2999/01/02/summary/plant_id=7.csv",
+                                 "2999/01/03/summary.parquet", "2999/01/03/daily.parquet",
+                                 "2999/01/monthly.parquet"]]}
+
+    names = get_longterm_names(s3, 1)
+
+    assert names == ["2999/01/01/summary.csv", "2999/01/02/summary/plant_id=7.csv",
+                     "2999/01/monthly.parquet"]
+
+
+def test_get_longterm_names_skips_compacted_days():
+    s3 = MagicMock()
+    s3.list_objects.return_value = {"Contents": [
+        {"Key": key} for key in ["2999/01/01/daily.parquet", "2999/01/monthly.parquet",
+                                 "2999/02/01/daily.parquet"]]}
+
+    names = get_longterm_names(s3, 1)
+
+    assert names == ["2999/01/monthly.parquet", "2999/02/01/daily.parquet"]
+
+
+def test_get_historical_summary(tmp_path):
+    def rollup(count, mean, std):
+        return pd.DataFrame({
+            "plant_id": [1], "bucket_start": [pd.Timestamp("2024-04-01", tz="UTC")],
+            **{f"{metric}_{stat}": [value] for metric in ["soil_moisture", "temperature"]
+               for stat, value in [("count", count), ("mean", mean), ("std", std),
+                                   ("min", mean - 1), ("max", mean + 1)]},
+            "last_watered": [pd.NaT]})
+
+    rollup(2, 10.0, 0.0).to_parquet(tmp_path / "2024_04_monthly.parquet")
+    rollup(2, 20.0, 0.0).to_parquet(tmp_path / "2024_05_01_daily.parquet")
+    pd.DataFrame({"plant_id": [1]}).to_csv(tmp_path / "2024_05_01_anomalies.csv")
+
+    summary = get_historical_summary(str(tmp_path))
+
+    assert summary["soil_moisture_mean"].tolist() == [15.0]
+    assert summary["soil_moisture_max"].tolist() == [21.0]
+    assert summary["soil_moisture_std"].tolist() == pytest.approx([(100 / 3) ** 0.5])
+
+
+def test_read_archive_only_needed_columns(tmp_path):
+    path = str(tmp_path / "anomalies.parquet")
+    pd.DataFrame({"plant_id": [1], "soil_moisture_nstd": [3.0],
+                  "temperature": [20.0]}).to_parquet(path)
+
+    df = read_archive(path, ["plant_id", "soil_moisture_nstd"])
+
+    assert df.columns.tolist() == ["plant_id", "soil_moisture_nstd"]
+
+
+def test_get_historical_summary_of_legacy_summaries(tmp_path):
+    pd.DataFrame({"plant_id": [1, 1], "soil_moisture_mean": [10.0, 20.0],
+                  "soil_moisture_std": 1.0, "soil_moisture_min": 5.0, "soil_moisture_max": 25.0,
+                  "temperature_mean": 15.0, "temperature_std": 1.0,
+                  "temperature_min": 10.0, "temperature_max": 20.0}
+                 ).to_csv(tmp_path / "2024_04_17_summary.csv", index=False)
+
+    summary = get_historical_summary(str(tmp_path))
+
+    assert summary["soil_moisture_mean"].tolist() == [10.0, 20.0]
+    assert get_historical_graph(summary, 1) is not None
+    assert get_historical_graph(summary, 2) is None
+
+
+def test_get_historical_summary_without_archives(tmp_path):
+    summary = get_historical_summary(str(tmp_path))
+
+    assert summary.empty
+    assert get_historical_graph(summary, 1) is None
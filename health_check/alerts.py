@@ -0,0 +1,122 @@
+"""
+Alert state for the health check, kept in s_beta.alert_state with one row per plant, metric
+and kind of alert ('anomaly' or 'missing'). Each row records when the alert was first and
+last seen, and when and at what severity it was last sent, so that persistent anomalies and
+missing plants are only reported again once they escalate or their cooldown expires.
+Alerts that are not seen in a run are resolved, so a recurrence is reported as new.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+from pymssql import connect
+
+# Persistent alerts are reminded of at most this often
+COOLDOWN = timedelta(hours=6)
+# An alert is escalated once its z-score is this much further from the mean than when it was sent
+ESCALATION = 1.0
+
+KEY = ["plant_id", "metric", "kind"]
+STATE_COLUMNS = KEY + ["first_seen", "last_seen", "last_sent", "severity"]
+
+
+def get_current_alerts(anomalies: pd.DataFrame, missing_ids: set) -> pd.DataFrame:
+    """Returns one row per plant, metric and kind with the largest absolute z-score of the
+    anomalous readings. Missing plants have an empty metric and a severity of 0."""
+
+    current = (
+        anomalies.assign(severity=anomalies["z_score"].abs())
+        .groupby(["plant_id", "metric"], as_index=False)["severity"]
+        .max()
+        .assign(kind="anomaly")
+    )
+    missing = pd.DataFrame(
+        {"plant_id": sorted(missing_ids), "metric": "", "kind": "missing", "severity": 0.0}
+    )
+    return pd.concat([current, missing], ignore_index=True)[KEY + ["severity"]]
+
+
+def get_alert_state(conn: connect) -> pd.DataFrame:
+    """Returns the state of every open alert."""
+
+    query = f"""
+            SELECT {", ".join(STATE_COLUMNS)}
+            FROM s_beta.alert_state
+            """
+
+    with conn.cursor() as cur:
+        cur.execute(query)
+        rows = cur.fetchall()
+
+    return pd.DataFrame(rows, columns=STATE_COLUMNS)
+
+
+def get_alerts_to_send(
+    current: pd.DataFrame,
+    state: pd.DataFrame,
+    now: datetime,
+    cooldown: timedelta = COOLDOWN,
+    escalation: float = ESCALATION,
+) -> pd.Series:
+    """Flags the current alerts that are new, have escalated since they were last sent,
+    or were last sent longer than `cooldown` before `now`."""
+
+    merged = current.merge(state[KEY + ["last_sent", "severity"]], on=KEY, how="left",
+                           suffixes=("", "_sent"))
+    last_sent = pd.to_datetime(merged["last_sent"], utc=True)
+    new = last_sent.isna().to_numpy()
+    escalated = (merged["severity"] >= merged["severity_sent"] + escalation).to_numpy()
+    expired = (last_sent <= pd.Timestamp(now) - cooldown).to_numpy()
+
+    return pd.Series(new | escalated | expired, index=current.index)
+
+
+def save_alert_state(conn: connect, current: pd.DataFrame, sent: pd.Series,
+                     now: datetime) -> None:
+    """Records that the current alerts were seen at `now`, and sent if flagged in `sent`,
+    then resolves every alert that was not seen. New alerts that were not sent are left
+    out, so they are still new on the next run."""
+
+    now = now.astimezone(timezone.utc).replace(tzinfo=None)
+    rows = [
+        (int(row.plant_id), row.metric, row.kind, now, float(row.severity) if was_sent else None)
+        for row, was_sent in zip(current.itertuples(index=False), np.asarray(sent, dtype=bool))
+    ]
+    merge = """
+            MERGE s_beta.alert_state AS target
+            USING (SELECT %s AS plant_id, %s AS metric, %s AS kind, %s AS seen, %s AS severity)
+                AS source
+            ON target.plant_id = source.plant_id
+            AND target.metric = source.metric
+            AND target.kind = source.kind
+            WHEN MATCHED THEN
+                UPDATE SET
+                    last_seen = source.seen,
+                    last_sent = IIF(source.severity IS NULL, target.last_sent, source.seen),
+                    severity = ISNULL(source.severity, target.severity)
+            WHEN NOT MATCHED AND source.severity IS NOT NULL THEN
+                INSERT (plant_id, metric, kind, first_seen, last_seen, last_sent, severity)
+                VALUES (source.plant_id, source.metric, source.kind, source.seen,
+                        source.seen, source.seen, source.severity);
+            """
+
+    with conn.cursor() as cur:
+        if rows:
+            cur.executemany(merge, rows)
+        cur.execute("DELETE FROM s_beta.alert_state WHERE last_seen < %s", (now,))
+        conn.commit()
+
+
+def filter_alerts(anomalies: pd.DataFrame, missing_ids: set, current: pd.DataFrame,
+                  sent: pd.Series) -> tuple[pd.DataFrame, set]:
+    """Returns the anomalous readings and missing plants of the alerts flagged in `sent`."""
+
+    to_send = current[sent.to_numpy(dtype=bool)]
+    anomaly_keys = pd.MultiIndex.from_frame(
+        to_send.loc[to_send["kind"] == "anomaly", ["plant_id", "metric"]])
+    readings = anomalies[
+        pd.MultiIndex.from_frame(anomalies[["plant_id", "metric"]]).isin(anomaly_keys)
+    ]
+    missing = set(to_send.loc[to_send["kind"] == "missing", "plant_id"]) & set(missing_ids)
+    return readings, missing
@@ -0,0 +1,139 @@
+"""
+Vectorised anomaly detection for the health check. Every reading of every metric is
+scored against its plant's baseline in one pass with NumPy boolean masks, and the
+anomalies are returned as a tidy frame with one row per anomalous reading.
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+METRICS = ["soil_moisture", "temperature"]
+
+# Readings further than this many standard deviations from their plant's mean are anomalous
+DEFAULT_THRESHOLD = 2.5
+
+ANOMALY_COLUMNS = [
+    "plant_id",
+    "recording_taken",
+    "metric",
+    "value",
+    "mean",
+    "std",
+    "z_score",
+    "threshold",
+]
+
+
+def get_stats_from_readings(df: pd.DataFrame, metrics: list | None = None) -> pd.DataFrame:
+    """Returns the mean and sample standard deviation of each metric per plant, indexed by
+    plant_id, with columns `<metric>_mean` and `<metric>_std`."""
+
+    metrics = metrics or METRICS
+    grouped = df.groupby("plant_id")[metrics].agg(["mean", "std"])
+    grouped.columns = [f"{metric}_{stat}" for metric, stat in grouped.columns]
+    return grouped
+
+
+def get_stats_from_baselines(baselines: pd.DataFrame, metrics: list | None = None) -> pd.DataFrame:
+    """Returns the same statistics as get_stats_from_readings from the per-plant count,
+    sum and sum of squares aggregated by the database."""
+
+    metrics = metrics or METRICS
+    stats = pd.DataFrame(index=baselines["plant_id"].to_numpy())
+    for metric in metrics:
+        count = baselines[f"{metric}_count"].to_numpy(dtype=float)
+        total = baselines[f"{metric}_sum"].to_numpy(dtype=float)
+        squares = baselines[f"{metric}_sum_squares"].to_numpy(dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            variance = (squares - total * total / count) / (count - 1)
+            stats[f"{metric}_mean"] = total / count
+        stats[f"{metric}_std"] = np.sqrt(np.clip(variance, 0, None))
+    stats.index.name = "plant_id"
+    return stats
+
+
+def parse_thresholds(text: str | None) -> tuple[dict, dict]:
+    """Parses thresholds configured as JSON, e.g. '{"temperature": 3, "12": {"soil_moisture": 4}}'.
+    Metric names map to a threshold for every plant, and plant IDs map to thresholds for
+    that plant only. Returns the metric thresholds and the plant thresholds."""
+
+    metric_thresholds, plant_thresholds = {}, {}
+    for key, value in json.loads(text or "{}").items():
+        if isinstance(value, dict):
+            plant_thresholds[int(key)] = {metric: float(limit) for metric, limit in value.items()}
+        else:
+            metric_thresholds[key] = float(value)
+    return metric_thresholds, plant_thresholds
+
+
+def get_threshold_matrix(
+    plant_ids: np.ndarray,
+    metrics: list,
+    metric_thresholds: dict | None = None,
+    plant_thresholds: dict | None = None,
+) -> np.ndarray:
+    """Returns the threshold for each reading (row) and metric (column)."""
+
+    metric_thresholds = metric_thresholds or {}
+    limits = np.array([metric_thresholds.get(metric, DEFAULT_THRESHOLD) for metric in metrics])
+    matrix = np.broadcast_to(limits, (len(plant_ids), len(metrics))).copy()
+
+    for plant_id, overrides in (plant_thresholds or {}).items():
+        rows = plant_ids == plant_id
+        if not rows.any():
+            continue
+        for column, metric in enumerate(metrics):
+            if metric in overrides:
+                matrix[rows, column] = overrides[metric]
+
+    return matrix
+
+
+def with_missing_row(stats: pd.DataFrame) -> np.ndarray:
+    """Returns the statistics as an array with an extra row of NaNs at the end."""
+
+    return np.vstack([stats.to_numpy(dtype=float), np.full((1, stats.shape[1]), np.nan)])
+
+
+def get_anomalies(
+    readings: pd.DataFrame,
+    stats: pd.DataFrame,
+    metrics: list | None = None,
+    metric_thresholds: dict | None = None,
+    plant_thresholds: dict | None = None,
+) -> pd.DataFrame:
+    """Returns every reading further from its plant's mean than the threshold for that
+    metric and plant allows, as a frame with one row per anomalous reading and metric.
+    Readings of plants without a baseline, or whose baseline has no variation, are not
+    scored."""
+
+    metrics = metrics or METRICS
+    plant_ids = readings["plant_id"].to_numpy()
+    # Plants without a baseline get index -1, which selects the row of NaNs appended below
+    rows = stats.index.get_indexer(plant_ids)
+
+    values = readings[metrics].to_numpy(dtype=float)
+    means = with_missing_row(stats[[f"{metric}_mean" for metric in metrics]])[rows]
+    stds = with_missing_row(stats[[f"{metric}_std" for metric in metrics]])[rows]
+    thresholds = get_threshold_matrix(plant_ids, metrics, metric_thresholds, plant_thresholds)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z_scores = (values - means) / stds
+        mask = (stds > 0) & (np.abs(z_scores) > thresholds)
+
+    reading_index, metric_index = np.nonzero(mask)
+    return pd.DataFrame(
+        {
+            "plant_id": plant_ids[reading_index],
+            "recording_taken": readings["recording_taken"].to_numpy()[reading_index],
+            "metric": np.asarray(metrics, dtype=object)[metric_index],
+            "value": values[reading_index, metric_index],
+            "mean": means[reading_index, metric_index],
+            "std": stds[reading_index, metric_index],
+            "z_score": z_scores[reading_index, metric_index],
+            "threshold": thresholds[reading_index, metric_index],
+        },
+        columns=ANOMALY_COLUMNS,
+    )
@@ -0,0 +1,100 @@
+"""
+Benchmarks the vectorised anomaly detector against the original row-wise implementation
+of get_anomolous_column on a synthetic day of readings, one per plant per minute.
+
+Usage: python bench_anomalies.py [plant_count ...]
+"""
+
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from anomalies import METRICS, get_anomalies, get_stats_from_readings
+from health_check import get_last_hour
+
+MINUTES = 24 * 60
+
+
+def make_readings(plant_count: int) -> pd.DataFrame:
+    """Returns a day of readings for `plant_count` plants, with a few spikes in the last hour."""
+    rng = np.random.default_rng(0)
+    rows = plant_count * MINUTES
+    start = datetime.now(timezone.utc) - timedelta(minutes=MINUTES - 1)
+    taken = pd.date_range(start, periods=MINUTES, freq="min")
+
+    df = pd.DataFrame(
+        {
+            "plant_id": np.tile(np.arange(plant_count), MINUTES),
+            "recording_taken": np.repeat(taken, plant_count),
+            "soil_moisture": rng.normal(30, 3, rows),
+            "temperature": rng.normal(15, 1, rows),
+        }
+    )
+    spikes = rng.choice(np.arange(rows - 60 * plant_count, rows), plant_count // 10)
+    df.loc[spikes, "temperature"] += 20
+    return df
+
+
+def legacy_anomolous_column(df: pd.DataFrame, column: str) -> pd.DataFrame:
+    """get_anomolous_column as it was before the vectorised detector."""
+    last_hour = pd.Timestamp(datetime.now(timezone.utc) - timedelta(hours=1))
+    df["recording_taken"] = pd.to_datetime(df["recording_taken"], utc=True)
+    df_in_last_hour = df[(df["recording_taken"] >= last_hour)]
+    mean = df.groupby("plant_id")[column].mean().reset_index()
+    std = df.groupby("plant_id")[column].std().reset_index()
+    merged_df = pd.merge(mean, std, on="plant_id").rename(
+        columns={f"{column}_x": "mean", f"{column}_y": "std"}
+    )
+    merged_df["anomolous +"] = merged_df["mean"] + merged_df["std"].apply(lambda x: x * 2.5)
+    merged_df["anomolous -"] = merged_df["mean"] - merged_df["std"].apply(lambda x: x * 2.5)
+    merge_2 = pd.merge(merged_df, df_in_last_hour, on="plant_id")
+    merge_2 = merge_2[
+        merge_2.apply(
+            lambda x: (x["anomolous -"] <= x[column]) & (x[column] <= x["anomolous +"])
+            is False,
+            axis=1,
+        )
+    ]
+    return merge_2[["plant_id", column]]
+
+
+def timed(function, *args) -> tuple[float, object]:
+    """Returns the seconds taken by one call of `function` and its result."""
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def run_legacy(df: pd.DataFrame) -> list[pd.DataFrame]:
+    """Finds anomalies one metric at a time, as the handler used to."""
+    return [legacy_anomolous_column(df, metric) for metric in METRICS]
+
+
+def run_vectorised(df: pd.DataFrame) -> pd.DataFrame:
+    """Finds anomalies in every metric at once."""
+    return get_anomalies(get_last_hour(df), get_stats_from_readings(df))
+
+
+def main(plant_counts: list[int]) -> None:
+    """Prints the time taken by both implementations for each plant count."""
+    print(
+        f"{'plants':>8} {'rows':>10} {'legacy':>10} {'vectorised':>11} "
+        f"{'speedup':>8} {'found':>6}"
+    )
+    for plant_count in plant_counts:
+        df = make_readings(plant_count)
+
+        legacy, _ = timed(run_legacy, df)
+        vectorised, anomalies = timed(run_vectorised, df)
+
+        print(
+            f"{plant_count:>8} {len(df):>10} {legacy:>9.2f}s {vectorised:>10.3f}s "
+            f"{legacy / vectorised:>7.0f}x {len(anomalies):>6}"
+        )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100, 1000, 3000])
@@ -0,0 +1,160 @@
+"""
+Pool of database connections kept at module level, so that warm Lambda invocations and
+Streamlit reruns reuse open connections instead of repeating the TLS/TDS handshake.
+"""
+
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from threading import Condition
+
+from pymssql import connect, Connection, Error
+
+# named, as connections opened with as_dict=True reject unnamed columns
+PING_QUERY = "SELECT 1 AS ok;"
+
+DEFAULT_MAX_SIZE = 4
+DEFAULT_MAX_AGE = 15 * 60
+DEFAULT_TIMEOUT = 10
+
+
+class ConnectionPool:
+    """
+    Bounded pool of connections to one database. Idle connections are pinged before they
+    are handed out and recycled once they are older than `max_age` seconds.
+    """
+
+    def __init__(
+        self,
+        config: dict,
+        factory=connect,
+        max_size: int = DEFAULT_MAX_SIZE,
+        max_age: float = DEFAULT_MAX_AGE,
+    ):
+        self.config = config
+        self.factory = factory
+        self.max_size = max_size
+        self.max_age = max_age
+        self._idle: list[Connection] = []
+        self._created: dict[int, float] = {}
+        self._available = Condition()
+
+    @property
+    def size(self) -> int:
+        """Returns the number of open connections, idle or in use."""
+        return len(self._created)
+
+    def acquire(self, timeout: float = DEFAULT_TIMEOUT) -> Connection:
+        """
+        Returns a healthy connection, reusing an idle one where possible. Waits up to
+        `timeout` seconds for a connection to be released if the pool is full.
+        """
+        with self._available:
+            while True:
+                while self._idle:
+                    conn = self._idle.pop()
+                    if not self._expired(conn) and ping(conn):
+                        return conn
+                    self._discard(conn)
+
+                if self.size < self.max_size:
+                    return self._open()
+
+                if not self._available.wait(timeout):
+                    raise TimeoutError(
+                        f"No database connection became available within {timeout}s."
+                    )
+
+    def release(self, conn: Connection) -> None:
+        """Returns a connection to the pool, closing it if it has reached its maximum age."""
+        with self._available:
+            if id(conn) not in self._created:
+                return
+
+            if self._expired(conn):
+                self._discard(conn)
+            else:
+                self._idle.append(conn)
+            self._available.notify()
+
+    def discard(self, conn: Connection) -> None:
+        """Closes a connection that should not be reused and removes it from the pool."""
+        with self._available:
+            self._discard(conn)
+            self._available.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager yielding a pooled connection that is returned to the pool on exit.
+        Any transaction left open, committed or not, is rolled back first so it cannot leak
+        into the next borrower, and the connection is discarded if that fails.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            try:
+                conn.rollback()
+            except Error:
+                self.discard(conn)
+            else:
+                self.release(conn)
+
+    def close_all(self) -> None:
+        """Closes every idle connection; connections in use are closed when released."""
+        with self._available:
+            while self._idle:
+                self._discard(self._idle.pop())
+
+    def _open(self) -> Connection:
+        conn = self.factory(
+            server=self.config["DB_HOST"],
+            port=self.config["DB_PORT"],
+            user=self.config["DB_USER"],
+            database=self.config["DB_NAME"],
+            password=self.config["DB_PASSWORD"],
+            as_dict=True,
+        )
+        self._created[id(conn)] = time.monotonic()
+
+        return conn
+
+    def _expired(self, conn: Connection) -> bool:
+        return time.monotonic() - self._created[id(conn)] > self.max_age
+
+    def _discard(self, conn: Connection) -> None:
+        self._created.pop(id(conn), None)
+        try:
+            conn.close()
+        except Error:
+            pass
+
+
+def ping(conn: Connection) -> bool:
+    """Returns True if the connection can still run a query."""
+    try:
+        cursor = conn.cursor()
+        cursor.execute(PING_QUERY)
+        cursor.fetchall()
+    except Error:
+        return False
+
+    return True
+
+
+_POOLS: dict[tuple, ConnectionPool] = {}
+
+
+def get_pool(config: dict, factory=connect, **kwargs) -> ConnectionPool:
+    """
+    Returns the module-level pool for the database described by the config, creating it
+    on first use. Keyword arguments are passed to the pool when it is created.
+    """
+    key = (config["DB_HOST"], config["DB_PORT"], config["DB_NAME"], config["DB_USER"])
+
+    if key not in _POOLS:
+        _POOLS[key] = ConnectionPool(config, factory, **kwargs)
+
+    return _POOLS[key]
@@ -1,162 +1,276 @@
 """
-Python script that extracts recent (24hr) plant data from LMNH
-and checks for anomalous readings, if present, sends an email using
-SES
+Python script that extracts recent (1hr) plant data from LMNH
+and checks for anomalous readings, if present, emails each plant's botanist
+using SES
 """
 
+from contextlib import AbstractContextManager
 from os import environ as ENV
 from datetime import datetime, timedelta, timezone
 
 import pandas as pd
 from dotenv import load_dotenv
-from pymssql import connect
+from pymssql import connect, Connection
 
 from boto3 import client
 
+from anomalies import (
+    get_anomalies,
+    get_stats_from_baselines,
+    get_stats_from_readings,
+    parse_thresholds,
+)
+from alerts import filter_alerts, get_alert_state, get_alerts_to_send, get_current_alerts, \
+    save_alert_state
+from connection import get_pool
+from notifications import FALLBACK_RECIPIENTS, get_digests, send_digests, send_message
+
+# Checks only look at the last hour, so only the last hour is read from the database
+WINDOW = timedelta(hours=1)
+# Readings in the last hour are compared with each plant's readings over this period
+BASELINE_WINDOW = timedelta(hours=24)
+METRICS = ["soil_moisture", "temperature"]
+# e.g. '{"temperature": 3, "12": {"soil_moisture": 4}}' for a metric and a single plant
+THRESHOLDS = ENV.get("ANOMALY_THRESHOLDS")
+AGGREGATES = ["count", "sum", "sum_squares", "min", "max"]
+# The SES account's maximum send rate, in messages per second
+SEND_RATE = float(ENV.get("SES_SEND_RATE", 1))
+
 
 def handler(event, context) -> dict:
     """This function makes the lambda function work"""
 
-    conn = get_db_connection(ENV)
-    df = get_df(conn)
     load_dotenv()
-    moist_df = get_anomolous_column(df, "soil_moisture")
-    temp_df = get_anomolous_column(df, "temperature")
-    missing_ids = get_missing_values(df)
-
-    moist_html = (
-        moist_df.to_html()
-        if not moist_df.empty
-        else "<p>No moisture anomalies found.</p>"
-    )
-    temp_html = (
-        temp_df.to_html()
-        if not temp_df.empty
-        else "<p>No temperature anomalies found.</p>"
-    )
-    missing_html = (
-        f"<h3>Missing plant IDs in the last hour: {missing_ids}</h3>"
-        if missing_ids
-        else "<p>All plant IDs reported in the last hour.</p>"
-    )
-
-    combined_html = f"""
-    <html>
-        <body>
-            {missing_html}
-            <div style='display: table; width: 100%;'>
-                <div style='display: table-cell; padding: 10px;'>
-                    <h2>Anomalous Moisture Readings</h2>
-                    {moist_html}
-                </div>
-                <div style='display: table-cell; padding: 10px;'>
-                    <h2>Anomalous Temperature Readings</h2>
-                    {temp_html}
-                </div>
-            </div>
-        </body>
-    </html>
-    """
-
-    if not moist_df.empty or not temp_df.empty or missing_ids:
-        ses_client = client(
-            "ses",
-            aws_access_key_id=ENV["AWS_K"],
-            aws_secret_access_key=ENV["AWS_SKEY"],
-            region_name="eu-west-2",
+    with get_pool(ENV, factory=connect).connection() as conn:
+        now = datetime.now(timezone.utc)
+        df = get_df(conn, now - WINDOW)
+        baselines = get_baselines(conn, now - BASELINE_WINDOW)
+        expected_ids = get_expected_plant_ids(conn)
+        gaps = get_gaps(get_last_seen(conn), expected_ids, now,
+                        get_gap_history(conn, now - BASELINE_WINDOW))
+        botanists = get_plant_botanists(conn, now - BASELINE_WINDOW)
+        state = get_alert_state(conn)
+        anomalies = get_anomalies(
+            get_last_hour(df), get_stats_from_baselines(baselines), METRICS,
+            *parse_thresholds(THRESHOLDS)
         )
-        send_email(ses_client, combined_html)
+        missing_ids = set(gaps["plant_id"].tolist())
+
+        # Only new, escalated or overdue alerts are sent
+        current = get_current_alerts(anomalies, missing_ids)
+        sent = get_alerts_to_send(current, state, now)
+        digests = get_digests(*filter_alerts(anomalies, missing_ids, current, sent), botanists,
+                              gaps=gaps)
+
+        if digests:
+            ses_client = client(
+                "ses",
+                aws_access_key_id=ENV["AWS_K"],
+                aws_secret_access_key=ENV["AWS_SKEY"],
+                region_name="eu-west-2",
+            )
+            for digest, result in zip(digests, send_digests(ses_client, digests, rate=SEND_RATE)):
+                if not result.ok:
+                    print(f"Could not email {result.recipients}: {result.error}")
+                    sent &= ~current["plant_id"].isin(digest.plant_ids)
+        save_alert_state(conn, current, sent, now)
 
     return {
         "statusCode": 200,
-        "body": "Processing complete. Email sent if anomalies were found.",
+        "body": f"Processing complete. {len(digests)} report(s) for new alerts sent.",
     }
 
 
-def get_db_connection(config: dict) -> client:
-    """Returns database connection."""
+def get_db_connection(config: dict) -> AbstractContextManager[Connection]:
+    """Returns a context manager lending a connection from the shared pool,
+    which is given back, with any open transaction rolled back, on exit."""
 
-    return connect(
-        server=config["DB_HOST"],
-        port=config["DB_PORT"],
-        user=config["DB_USER"],
-        database=config["DB_NAME"],
-        password=config["DB_PASSWORD"],
-        as_dict=True,
-    )
+    return get_pool(config, factory=connect).connection()
 
 
-def get_df(conn: connect) -> pd.DataFrame:
-    """Returns a Dataframe of the database"""
+def get_df(conn: connect, since: datetime | None = None) -> pd.DataFrame:
+    """Returns a Dataframe of the recordings taken since `since`, or of every recording
+    if it is None, with only the columns the checks use. The time window is filtered by
+    the database using the index on recording_taken."""
 
     query = """
-            SELECT *
+            SELECT r.plant_id, r.recording_taken, r.soil_moisture, r.temperature
             FROM s_beta.recording AS r
+            """
+    params = None
+    if since is not None:
+        query += "WHERE r.recording_taken >= %s"
+        params = (since.astimezone(timezone.utc).replace(tzinfo=None),)
+
+    with conn.cursor() as cur:
+        cur.execute(query, params)
+        rows = cur.fetchall()
+
+    df = pd.DataFrame(rows, columns=["plant_id", "recording_taken", *METRICS])
+    df["recording_taken"] = pd.to_datetime(df["recording_taken"], utc=True)
+    df[METRICS] = df[METRICS].astype(float)
+
+    return df
+
+
+def get_baselines(conn: connect, since: datetime) -> pd.DataFrame:
+    """Returns a Dataframe with one row per plant of the count, sum, sum of squares,
+    minimum and maximum of each metric since the start of the hour of `since`. These are
+    combined from the hourly statistics the pipeline keeps in s_beta.recording_stats, so
+    the query reads a few rows per plant rather than every reading."""
 
+    aggregates = ",\n                ".join(
+        f"""SUM(IIF(s.metric = '{metric}', s.reading_count, 0)) AS {metric}_count,
+                SUM(IIF(s.metric = '{metric}', s.reading_count * s.mean, 0)) AS {metric}_sum,
+                SUM(IIF(s.metric = '{metric}', s.m2 + s.reading_count * s.mean * s.mean, 0))
+                    AS {metric}_sum_squares,
+                MIN(IIF(s.metric = '{metric}', s.min_value, NULL)) AS {metric}_min,
+                MAX(IIF(s.metric = '{metric}', s.max_value, NULL)) AS {metric}_max"""
+        for metric in METRICS
+    )
+    query = f"""
+            SELECT s.plant_id,
+                {aggregates}
+            FROM s_beta.recording_stats AS s
+            WHERE s.bucket_start >= %s
+            GROUP BY s.plant_id
+            """
+    since = since.astimezone(timezone.utc).replace(tzinfo=None)
+
+    with conn.cursor() as cur:
+        cur.execute(query, (since.replace(minute=0, second=0, microsecond=0),))
+        rows = cur.fetchall()
+
+    columns = ["plant_id"] + [
+        f"{metric}_{aggregate}" for metric in METRICS for aggregate in AGGREGATES
+    ]
+    return pd.DataFrame(rows, columns=columns)
+
+
+def get_expected_plant_ids(conn: connect) -> set:
+    """Returns the IDs of plants the pipeline's plant registry currently marks as active."""
+
+    query = """
+            SELECT plant_id
+            FROM s_beta.plant_registry
+            WHERE active = 1
             """
 
     with conn.cursor() as cur:
         cur.execute(query)
         rows = cur.fetchall()
 
-    return pd.DataFrame(rows)
-
-
-def send_email(sesclient: client, html: str) -> None:
-    """Sends email using BOTO3"""
-
-    sesclient.send_email(
-        Source="trainee.dominic.chambers@sigmalabs.co.uk",
-        Destination={
-            "ToAddresses": [
-                "trainee.ervin.rexhepi@sigmalabs.co.uk",
-                "trainee.adam.osullivan@sigmalabs.co.uk",
-                "trainee.dominic.chambers@sigmalabs.co.uk",
-            ]
-        },
-        Message={
-            "Subject": {"Data": "WE FOUND ANOMOLIES IN YOUR PLANT DATA. URGENT"},
-            "Body": {"Text": {"Data": "HELLO FROM BOTO3"}, "Html": {"Data": html}},
-        },
-    )
+    return {row["plant_id"] for row in rows}
 
 
-def get_anomolous_column(df: pd.DataFrame, column: str) -> pd.DataFrame:
+def get_plant_botanists(conn: connect, since: datetime) -> pd.DataFrame:
+    """Returns a Dataframe mapping each plant recorded since `since` to the botanist
+    who took its latest recording, with their email and first name."""
+
+    query = """
+            SELECT r.plant_id, b.botanist_id, b.email, b.first_name
+            FROM s_beta.recording AS r
+            JOIN s_beta.botanist AS b
+                ON r.botanist_id = b.botanist_id
+            WHERE r.recording_taken = (
+                SELECT MAX(l.recording_taken)
+                FROM s_beta.recording AS l
+                WHERE l.plant_id = r.plant_id
+                    AND l.recording_taken >= %s
+            )
+            """
+    since = since.astimezone(timezone.utc).replace(tzinfo=None)
+
+    with conn.cursor() as cur:
+        cur.execute(query, (since,))
+        rows = cur.fetchall()
+
+    return pd.DataFrame(rows, columns=["plant_id", "botanist_id", "email", "first_name"])
+
+
+def send_email(sesclient: client, html: str, recipients: list | None = None) -> None:
+    """Sends one email using BOTO3, to `recipients` or otherwise the fallback recipients"""
+
+    send_message(sesclient, recipients or FALLBACK_RECIPIENTS, html)
+
+
+def get_last_hour(df: pd.DataFrame) -> pd.DataFrame:
+    """Returns the recordings taken in the last hour. Timestamps are only parsed if
+    `df` did not come from get_df, which parses them once for every check."""
+
+    if not isinstance(df["recording_taken"].dtype, pd.DatetimeTZDtype):
+        df["recording_taken"] = pd.to_datetime(df["recording_taken"], utc=True)
+    last_hour = pd.Timestamp(datetime.now(timezone.utc) - WINDOW)
+    return df[df["recording_taken"] >= last_hour]
+
+
+def get_anomolous_column(
+    df: pd.DataFrame, column: str, baselines: pd.DataFrame | None = None
+) -> pd.DataFrame:
     """This function returns any anomolies in a specific column over the last hour
-    we assume that any anomolies are 2.5 standard deviations above or below the mean."""
+    we assume that any anomolies are 2.5 standard deviations above or below the mean.
+    The mean and standard deviation come from `baselines` if given (see get_baselines),
+    and are otherwise computed from `df`."""
 
-    last_hour = pd.Timestamp(datetime.now(timezone.utc) - timedelta(hours=1))
-    df["recording_taken"] = pd.to_datetime(df["recording_taken"], utc=True)
-    df_in_last_hour = df[(df["recording_taken"] >= last_hour)]
-    mean = df.groupby("plant_id")[column].mean().reset_index()
-    std = df.groupby("plant_id")[column].std().reset_index()
-    merged_df = pd.merge(mean, std, on="plant_id").rename(
-        columns={f"{column}_x": "mean", f"{column}_y": "std"}
-    )
-    merged_df["anomolous +"] = merged_df["mean"] + merged_df["std"].apply(
-        lambda x: x * 2.5
+    stats = (
+        get_stats_from_baselines(baselines, [column])
+        if baselines is not None
+        else get_stats_from_readings(df, [column])
     )
-    merged_df["anomolous -"] = merged_df["mean"] - merged_df["std"].apply(
-        lambda x: x * 2.5
-    )
-    merge_2 = pd.merge(merged_df, df_in_last_hour, on="plant_id")
-    merge_2 = merge_2[
-        merge_2.apply(
-            lambda x: (x["anomolous -"] <= x[column]) & (x[column] <= x["anomolous +"])
-            is False,
-            axis=1,
-        )
-    ]
-    return merge_2[["plant_id", column]]
+    anomalies = get_anomalies(get_last_hour(df), stats, [column])
+    return anomalies[["plant_id", "value"]].rename(columns={"value": column})
 
 
-def get_missing_values(df: pd.DataFrame) -> set:
-    """If any plants did not have a reading in the past hour we notify the stakeholders."""
+def get_last_seen(conn: connect) -> pd.DataFrame:
+    """Returns a Dataframe of when each plant last reported, from the last-seen index
+    the pipeline keeps, so no recordings are read."""
 
-    last_hour = pd.Timestamp(datetime.now(timezone.utc) - timedelta(hours=1))
-    df["recording_taken"] = pd.to_datetime(df["recording_taken"], utc=True)
-    df_in_last_hour = df[(df["recording_taken"] >= last_hour)]
-    values_in_hour = set(df_in_last_hour["plant_id"].unique().tolist())
-    expected_values = set(range(51))
-    ids_not_found = expected_values - values_in_hour
-    return ids_not_found
+    query = """
+            SELECT plant_id, last_seen
+            FROM s_beta.plant_last_seen
+            """
+
+    with conn.cursor() as cur:
+        cur.execute(query)
+        rows = cur.fetchall()
+
+    df = pd.DataFrame(rows, columns=["plant_id", "last_seen"])
+    df["last_seen"] = pd.to_datetime(df["last_seen"], utc=True)
+    return df
+
+
+def get_gap_history(conn: connect, since: datetime) -> pd.DataFrame:
+    """Returns a Dataframe with the number of gaps in each plant's readings that ended
+    since `since`, and the longest of them in minutes."""
+
+    query = """
+            SELECT plant_id, COUNT(*) AS gap_count,
+                MAX(DATEDIFF(minute, gap_start, gap_end)) AS longest_gap_minutes
+            FROM s_beta.reading_gap
+            WHERE gap_end >= %s
+            GROUP BY plant_id
+            """
+    since = since.astimezone(timezone.utc).replace(tzinfo=None)
+
+    with conn.cursor() as cur:
+        cur.execute(query, (since,))
+        rows = cur.fetchall()
+
+    return pd.DataFrame(rows, columns=["plant_id", "gap_count", "longest_gap_minutes"])
+
+
+def get_gaps(last_seen: pd.DataFrame, expected_ids: set, now: datetime,
+             history: pd.DataFrame | None = None) -> pd.DataFrame:
+    """Returns one row per expected plant that has not reported within WINDOW of `now`,
+    with when it was last seen (NaT if never), how many minutes it has been missing,
+    and, if `history` is given, its recent gaps."""
+
+    gaps = pd.DataFrame({"plant_id": sorted(expected_ids)}).merge(
+        last_seen, on="plant_id", how="left")
+    gaps["last_seen"] = pd.to_datetime(gaps["last_seen"], utc=True)
+    gaps = gaps[~(gaps["last_seen"] >= pd.Timestamp(now - WINDOW))]
+    gaps = gaps.assign(
+        missing_minutes=(pd.Timestamp(now) - gaps["last_seen"]) // pd.Timedelta(minutes=1))
+    if history is not None:
+        gaps = gaps.merge(history, on="plant_id", how="left").fillna({"gap_count": 0})
+    return gaps.reset_index(drop=True)
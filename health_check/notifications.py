@@ -0,0 +1,259 @@
+"""
+Routes health check results to the botanists responsible for each plant. Anomalies and
+missing plants are grouped into one digest per botanist, and the digests are sent through
+SES concurrently, with a bounded number of workers and a throttle that keeps below the
+account's sending rate.
+"""
+
+from __future__ import annotations
+
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from threading import Lock
+
+import pandas as pd
+from botocore.exceptions import ClientError
+
+SENDER = "trainee.dominic.chambers@sigmalabs.co.uk"
+# Anything that cannot be routed to a botanist is sent here instead
+FALLBACK_RECIPIENTS = [
+    "trainee.ervin.rexhepi@sigmalabs.co.uk",
+    "trainee.adam.osullivan@sigmalabs.co.uk",
+    "trainee.dominic.chambers@sigmalabs.co.uk",
+]
+SUBJECT = "Plant health check: anomalies found in your plants"
+
+MAX_WORKERS = 4
+# SES sandbox accounts may send one message per second; production accounts start at 14
+SEND_RATE = 1.0
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+THROTTLE_CODES = {"Throttling", "ThrottlingException", "TooManyRequestsException"}
+
+
+@dataclass
+class Digest:
+    """The anomalies and missing plants to report to one set of recipients."""
+
+    recipients: list
+    name: str = "botanist"
+    anomalies: pd.DataFrame = field(default_factory=pd.DataFrame)
+    missing_ids: set = field(default_factory=set)
+    gaps: pd.DataFrame = field(default_factory=pd.DataFrame)
+
+    @property
+    def empty(self) -> bool:
+        """Returns True if there is nothing to report."""
+        return self.anomalies.empty and not self.missing_ids
+
+    @property
+    def plant_ids(self) -> set:
+        """Returns the IDs of every plant reported in the digest."""
+        plant_ids = set(self.missing_ids)
+        if not self.anomalies.empty:
+            plant_ids.update(self.anomalies["plant_id"].tolist())
+        return plant_ids
+
+
+@dataclass
+class SendResult:
+    """The outcome of sending one digest, including throttled attempts."""
+
+    recipients: list
+    message_id: str | None = None
+    attempts: int = 0
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        """Returns True if SES accepted the message."""
+        return self.message_id is not None
+
+
+class Throttle:
+    """Spaces out calls shared between threads so that at most `rate` start per second."""
+
+    def __init__(self, rate: float, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 1 / rate
+        self.clock = clock
+        self.sleep = sleep
+        self._next = 0.0
+        self._lock = Lock()
+
+    def wait(self) -> None:
+        """Blocks until the next call is allowed."""
+        with self._lock:
+            now = self.clock()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            self.sleep(start - now)
+
+
+class StubSESClient:
+    """
+    Stands in for the boto3 SES client locally and in tests. Sent messages are kept in
+    `sent`; the first `throttle_count` calls fail as SES does when the rate is exceeded.
+    """
+
+    def __init__(self, throttle_count: int = 0):
+        self.sent = []
+        self.throttle_count = throttle_count
+        self._lock = Lock()
+
+    def send_email(self, **message) -> dict:
+        """Records the message and returns a response shaped like SES's."""
+        with self._lock:
+            if self.throttle_count > 0:
+                self.throttle_count -= 1
+                raise ClientError(
+                    {"Error": {"Code": "Throttling", "Message": "Maximum sending rate exceeded."}},
+                    "SendEmail",
+                )
+            self.sent.append(message)
+            return {"MessageId": f"stub-{len(self.sent)}"}
+
+
+def get_digests(
+    anomalies: pd.DataFrame,
+    missing_ids: set,
+    botanists: pd.DataFrame,
+    fallback: list | None = None,
+    gaps: pd.DataFrame | None = None,
+) -> list[Digest]:
+    """
+    Returns one digest per botanist with anomalies or missing plants, using `botanists`
+    (see health_check.get_plant_botanists) to map plants to botanists. Plants no botanist
+    is known for are collected into one digest for the `fallback` recipients. Each digest
+    lists the rows of `gaps` (see health_check.get_gaps) of its missing plants.
+    """
+
+    fallback = FALLBACK_RECIPIENTS if fallback is None else fallback
+    owners = botanists.drop_duplicates("plant_id", keep="last").set_index("plant_id")
+    routed = anomalies.assign(
+        email=owners["email"].reindex(anomalies["plant_id"]).to_numpy()
+    )
+
+    digests = {}
+    for email, group in routed.groupby("email", sort=False):
+        digests[email] = Digest([email], anomalies=group.drop(columns="email"))
+    for plant_id in missing_ids:
+        email = owners["email"].get(plant_id)
+        if email is not None:
+            digests.setdefault(email, Digest([email])).missing_ids.add(plant_id)
+
+    names = botanists.drop_duplicates("email").set_index("email")
+    for email, digest in digests.items():
+        digest.name = names.loc[email, "first_name"]
+
+    unrouted = Digest(
+        list(fallback),
+        name="team",
+        anomalies=routed[routed["email"].isna()].drop(columns="email"),
+        missing_ids={plant_id for plant_id in missing_ids if plant_id not in owners.index},
+    )
+    digests = [digest for digest in [*digests.values(), unrouted] if not digest.empty]
+    if gaps is not None:
+        for digest in digests:
+            digest.gaps = gaps[gaps["plant_id"].isin(digest.missing_ids)]
+    return digests
+
+
+def render_digest(digest: Digest) -> str:
+    """Returns the HTML body of the email for one digest."""
+
+    missing_html = (
+        f"<h3>Missing plant IDs in the last hour: {sorted(digest.missing_ids)}</h3>"
+        if digest.missing_ids
+        else ""
+    )
+    if not digest.gaps.empty:
+        missing_html += digest.gaps.to_html(index=False, na_rep="never")
+    tables = []
+    for metric, title in [("soil_moisture", "Moisture"), ("temperature", "Temperature")]:
+        rows = (
+            digest.anomalies[digest.anomalies["metric"] == metric]
+            if not digest.anomalies.empty
+            else digest.anomalies
+        )
+        table = (
+            rows.to_html(index=False)
+            if not rows.empty
+            else f"<p>No {title.lower()} anomalies found.</p>"
+        )
+        tables.append(
+            f"""<div style='display: table-cell; padding: 10px;'>
+                    <h2>Anomalous {title} Readings</h2>
+                    {table}
+                </div>"""
+        )
+
+    return f"""
+    <html>
+        <body>
+            <p>Hello {digest.name},</p>
+            {missing_html}
+            <div style='display: table; width: 100%;'>
+                {"".join(tables)}
+            </div>
+        </body>
+    </html>
+    """
+
+
+def send_message(
+    ses_client,
+    recipients: list,
+    html: str,
+    throttle: Throttle | None = None,
+    max_retries: int = MAX_RETRIES,
+) -> SendResult:
+    """Sends one email, retrying with exponential backoff if SES throttles the request."""
+
+    result = SendResult(recipients)
+    while result.attempts <= max_retries:
+        if throttle is not None:
+            throttle.wait()
+        result.attempts += 1
+        try:
+            response = ses_client.send_email(
+                Source=SENDER,
+                Destination={"ToAddresses": recipients},
+                Message={
+                    "Subject": {"Data": SUBJECT},
+                    "Body": {"Html": {"Data": html}},
+                },
+            )
+            result.message_id = response.get("MessageId", "")
+            result.error = None
+            return result
+        except ClientError as error:
+            result.error = str(error)
+            if error.response["Error"]["Code"] not in THROTTLE_CODES:
+                break
+            time.sleep(random.uniform(0, BACKOFF_BASE * 2 ** (result.attempts - 1)))
+
+    return result
+
+
+def send_digests(
+    ses_client,
+    digests: list[Digest],
+    max_workers: int = MAX_WORKERS,
+    rate: float = SEND_RATE,
+) -> list[SendResult]:
+    """Sends every digest, at most `max_workers` at a time and `rate` per second, and
+    returns the result of each in the order given."""
+
+    throttle = Throttle(rate)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(
+            executor.map(
+                lambda digest: send_message(
+                    ses_client, digest.recipients, render_digest(digest), throttle
+                ),
+                digests,
+            )
+        )
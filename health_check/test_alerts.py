@@ -0,0 +1,103 @@
+"""This file tests alerts.py"""
+import unittest
+from unittest.mock import MagicMock
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+from alerts import (
+    STATE_COLUMNS, filter_alerts, get_alerts_to_send, get_current_alerts, save_alert_state
+)
+
+
+class TestAlerts(unittest.TestCase):
+    """
+    Unit tests for alert deduplication, covering new, persistent, escalated and
+    overdue alerts, and how the alert state is saved.
+    """
+    def setUp(self):
+        """
+        Creates anomalies for plants 1 and 2 and a missing plant 3, and alert state in
+        which plant 1's soil moisture anomaly and plant 3 were sent an hour ago.
+        """
+        self.now = datetime(2024, 4, 17, 12, 0, tzinfo=timezone.utc)
+        self.anomalies = pd.DataFrame({
+            'plant_id': [1, 1, 2],
+            'metric': ['soil_moisture', 'soil_moisture', 'temperature'],
+            'value': [90.0, 91.0, 40.0],
+            'z_score': [3.0, -3.2, 4.0],
+        })
+        self.missing_ids = {3}
+        sent = self.now - timedelta(hours=1)
+        self.state = pd.DataFrame([
+            (1, 'soil_moisture', 'anomaly', sent, sent, sent, 3.0),
+            (3, '', 'missing', sent, sent, sent, 0.0),
+        ], columns=STATE_COLUMNS)
+        self.current = get_current_alerts(self.anomalies, self.missing_ids)
+
+    def test_get_current_alerts(self):
+        """
+        Test that alerts are keyed by plant, metric and kind with their worst z-score.
+        """
+        self.assertEqual(len(self.current), 3)
+        first = self.current.iloc[0]
+        self.assertEqual((first['plant_id'], first['metric'], first['kind']),
+                         (1, 'soil_moisture', 'anomaly'))
+        self.assertAlmostEqual(first['severity'], 3.2)
+        self.assertEqual(self.current.iloc[2]['kind'], 'missing')
+
+    def test_persistent_alerts_are_not_resent(self):
+        """
+        Test that only the new alert is sent while the others are within their cooldown.
+        """
+        sent = get_alerts_to_send(self.current, self.state, self.now)
+        self.assertEqual(sent.tolist(), [False, True, False])
+
+    def test_escalated_alerts_are_resent(self):
+        """
+        Test that an alert is sent again once its z-score grows by the escalation margin.
+        """
+        sent = get_alerts_to_send(self.current, self.state, self.now, escalation=0.1)
+        self.assertTrue(sent.iloc[0])
+
+    def test_overdue_alerts_are_resent(self):
+        """
+        Test that persistent alerts are sent again once their cooldown expires.
+        """
+        sent = get_alerts_to_send(self.current, self.state, self.now, cooldown=timedelta(hours=1))
+        self.assertTrue(sent.all())
+
+    def test_nothing_to_send(self):
+        """
+        Test that no readings or plants are reported if no alert is flagged.
+        """
+        sent = pd.Series(False, index=self.current.index)
+        readings, missing = filter_alerts(self.anomalies, self.missing_ids, self.current, sent)
+        self.assertTrue(readings.empty)
+        self.assertEqual(missing, set())
+
+    def test_filter_alerts(self):
+        """
+        Test that only the readings and plants of flagged alerts are reported.
+        """
+        sent = get_alerts_to_send(self.current, self.state, self.now)
+        readings, missing = filter_alerts(self.anomalies, self.missing_ids, self.current, sent)
+        self.assertEqual(readings['plant_id'].tolist(), [2])
+        self.assertEqual(missing, set())
+
+    def test_save_alert_state(self):
+        """
+        Test that every current alert is upserted, with a severity only if it was sent,
+        and that alerts not seen are resolved.
+        """
+        conn = MagicMock()
+        cursor = conn.cursor.return_value.__enter__.return_value
+        sent = pd.Series([False, True, False])
+        save_alert_state(conn, self.current, sent, self.now)
+
+        rows = cursor.executemany.call_args.args[1]
+        self.assertEqual([row[4] for row in rows], [None, 4.0, None])
+        self.assertIn("DELETE FROM s_beta.alert_state", cursor.execute.call_args.args[0])
+        conn.commit.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+"""This file tests anomalies.py"""
+import unittest
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+from anomalies import get_anomalies, get_stats_from_readings, parse_thresholds
+from health_check import get_anomolous_column
+
+
+class TestAnomalies(unittest.TestCase):
+    """
+    Unit tests for the vectorised anomaly detector, covering z-score thresholds,
+    per-metric and per-plant overrides and plants without a usable baseline.
+    """
+    def setUp(self):
+        """
+        Creates a baseline of ten readings for plants 1 and 2, with a mean of 30 and a
+        standard deviation of about 1.05 for both metrics, and one reading for plant 3.
+        """
+        now = datetime.now(timezone.utc)
+        values = [29, 31] * 5
+        self.history = pd.DataFrame({
+            'plant_id': [1] * 10 + [2] * 10 + [3],
+            'soil_moisture': values + values + [30],
+            'temperature': values + values + [30],
+            'recording_taken': [now - timedelta(hours=2)] * 21,
+        })
+        self.stats = get_stats_from_readings(self.history)
+        self.readings = pd.DataFrame({
+            'plant_id': [1, 2, 3, 4],
+            'soil_moisture': [40.0, 30.5, 90.0, 90.0],
+            'temperature': [30.0, 34.0, 90.0, 90.0],
+            'recording_taken': [now] * 4,
+        })
+
+    def test_get_anomalies(self):
+        """
+        Test that readings beyond 2.5 standard deviations are found for every metric,
+        and that plants without variation or without a baseline are not scored.
+        """
+        anomalies = get_anomalies(self.readings, self.stats)
+        self.assertEqual(
+            list(zip(anomalies['plant_id'], anomalies['metric'])),
+            [(1, 'soil_moisture'), (2, 'temperature')],
+        )
+        self.assertGreater(anomalies['z_score'].iloc[0], 2.5)
+        self.assertEqual(anomalies['mean'].iloc[0], 30)
+
+    def test_get_anomalies_thresholds(self):
+        """
+        Test that thresholds can be set per metric and overridden per plant.
+        """
+        metric_thresholds, plant_thresholds = parse_thresholds(
+            '{"soil_moisture": 20, "2": {"temperature": 5}}'
+        )
+        anomalies = get_anomalies(
+            self.readings, self.stats, None, metric_thresholds, plant_thresholds
+        )
+        self.assertTrue(anomalies.empty)
+
+    def test_get_anomolous_column(self):
+        """
+        Test that the per-column helper returns anomalous readings as before,
+        including readings below the mean.
+        """
+        readings = self.readings.assign(soil_moisture=[20.0, 30.0, 30.0, 30.0])
+        df = pd.concat([self.history, readings])
+        anomalies = get_anomolous_column(df, 'soil_moisture')
+        self.assertEqual(anomalies['plant_id'].tolist(), [1])
+        self.assertEqual(anomalies['soil_moisture'].tolist(), [20.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
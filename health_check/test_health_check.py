@@ -4,7 +4,8 @@ from unittest.mock import MagicMock, patch
 from datetime import datetime, timedelta, timezone
 import pandas as pd
 from health_check import get_db_connection, get_df, send_email,\
-      get_anomolous_column, get_missing_values
+      get_expected_plant_ids, get_baselines, get_plant_botanists, get_gaps, get_last_seen
+from anomalies import get_stats_from_baselines
 
 class TestHealthCheck(unittest.TestCase):
     """
@@ -76,16 +77,91 @@ class TestHealthCheck(unittest.TestCase):
         df = get_df(self.mock_db_conn)
         self.assertEqual(len(df), 3)
 
-
-    def test_get_missing_values(self):
+    def test_get_df_filters_window_in_query(self):
+        """
+        Test that the time window and columns are pushed into the query, and that
+        timestamps and readings are parsed once for every check.
+        """
+        since = datetime(2024, 4, 17, 10, 0, tzinfo=timezone.utc)
+        df = get_df(self.mock_db_conn, since)
+        query, params = self.mock_cursor.execute.call_args.args
+        self.assertIn("WHERE r.recording_taken >= %s", query)
+        self.assertNotIn("*", query)
+        self.assertEqual(params, (datetime(2024, 4, 17, 10, 0),))
+        self.assertIsInstance(df["recording_taken"].dtype, pd.DatetimeTZDtype)
+        self.assertEqual(df["temperature"].dtype, float)
+
+    def test_get_baselines(self):
+        """
+        Test that baselines are combined per plant from the hourly statistics, in one query.
+        """
+        self.mock_cursor.fetchall.return_value = [{
+            "plant_id": 1,
+            "soil_moisture_count": 3, "soil_moisture_sum": 90.0,
+            "soil_moisture_sum_squares": 2708.0, "soil_moisture_min": 28.0,
+            "soil_moisture_max": 32.0,
+            "temperature_count": 3, "temperature_sum": 60.0,
+            "temperature_sum_squares": 1200.0, "temperature_min": 20.0,
+            "temperature_max": 20.0,
+        }]
+        baselines = get_baselines(self.mock_db_conn, datetime.now(timezone.utc))
+        query = self.mock_cursor.execute.call_args.args[0]
+        self.assertIn("FROM s_beta.recording_stats", query)
+        self.assertIn("GROUP BY s.plant_id", query)
+        self.assertEqual(self.mock_cursor.execute.call_count, 1)
+
+        stats = get_stats_from_baselines(baselines)
+        self.assertEqual(stats.loc[1, "soil_moisture_mean"], 30.0)
+        self.assertAlmostEqual(stats.loc[1, "soil_moisture_std"], 2.0)
+        self.assertEqual(stats.loc[1, "temperature_std"], 0)
+
+    def test_get_gaps(self):
+        """
+        Test that expected plants not seen in the last hour, or ever, are reported with
+        how long they have been missing and their recent gaps.
         """
-        Test the identification of missing values in the dataset.
+        now = datetime(2024, 4, 17, 12, 0, tzinfo=timezone.utc)
+        last_seen = pd.DataFrame({
+            "plant_id": [1, 2, 9],
+            "last_seen": [now - timedelta(minutes=5), now - timedelta(minutes=90),
+                          now - timedelta(days=2)],
+        })
+        history = pd.DataFrame({"plant_id": [2], "gap_count": [3], "longest_gap_minutes": [40]})
+        gaps = get_gaps(last_seen, {1, 2, 3}, now, history)
+        self.assertEqual(gaps["plant_id"].tolist(), [2, 3])
+        self.assertEqual(gaps.loc[0, "missing_minutes"], 90)
+        self.assertEqual(gaps["gap_count"].tolist(), [3, 0])
+        self.assertTrue(pd.isna(gaps.loc[1, "last_seen"]))
+
+    def test_get_last_seen(self):
+        """
+        Test that last-seen times come from the index rather than the recordings.
+        """
+        self.mock_cursor.fetchall.return_value = [
+            {"plant_id": 1, "last_seen": datetime(2024, 4, 17, 11, 59)}]
+        last_seen = get_last_seen(self.mock_db_conn)
+        query = self.mock_cursor.execute.call_args.args[0]
+        self.assertIn("FROM s_beta.plant_last_seen", query)
+        self.assertIsInstance(last_seen["last_seen"].dtype, pd.DatetimeTZDtype)
+
+    def test_get_expected_plant_ids(self):
+        """
+        Test that the expected plant IDs are read from the plant registry.
+        """
+        self.mock_cursor.fetchall.return_value = [{"plant_id": 1}, {"plant_id": 5}]
+        expected_ids = get_expected_plant_ids(self.mock_db_conn)
+        self.assertEqual(expected_ids, {1, 5})
 
-        This method ensures that the function accurately finds and returns 
-        a set of columns with missing data.
+    def test_get_plant_botanists(self):
+        """
+        Test that each plant is mapped to the botanist of its latest recording.
         """
-        missing_values = get_missing_values(self.example_data)
-        self.assertIsInstance(missing_values, set)
+        self.mock_cursor.fetchall.return_value = [
+            {"plant_id": 1, "botanist_id": 2, "email": "ada@lmnh.org", "first_name": "Ada"}]
+        botanists = get_plant_botanists(self.mock_db_conn, datetime.now(timezone.utc))
+        query = self.mock_cursor.execute.call_args.args[0]
+        self.assertIn("JOIN s_beta.botanist", query)
+        self.assertEqual(botanists.set_index("plant_id").loc[1, "email"], "ada@lmnh.org")
 
     def test_send_email(self):
         """
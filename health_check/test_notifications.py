@@ -0,0 +1,120 @@
+"""This file tests notifications.py"""
+import unittest
+from unittest.mock import patch
+import pandas as pd
+from notifications import (
+    Digest, StubSESClient, Throttle, get_digests, render_digest, send_digests, send_message
+)
+
+
+class TestNotifications(unittest.TestCase):
+    """
+    Unit tests for routing anomalies to botanists, rendering their digests and
+    sending them through a stub SES client.
+    """
+    def setUp(self):
+        """
+        Creates anomalies for plants 1, 2 and 3, where plants 1 and 2 belong to Ada,
+        and plant 3 and any plant without recordings to no known botanist.
+        """
+        self.anomalies = pd.DataFrame({
+            'plant_id': [1, 2, 3],
+            'metric': ['soil_moisture', 'temperature', 'temperature'],
+            'value': [90.0, 40.0, 41.0],
+        })
+        self.botanists = pd.DataFrame({
+            'plant_id': [1, 2, 5],
+            'botanist_id': [1, 1, 2],
+            'email': ['ada@lmnh.org', 'ada@lmnh.org', 'bo@lmnh.org'],
+            'first_name': ['Ada', 'Ada', 'Bo'],
+        })
+
+    def test_get_digests_groups_by_botanist(self):
+        """
+        Test that each botanist gets one digest of their own plants, and that
+        everything else goes to the fallback recipients.
+        """
+        digests = get_digests(self.anomalies, {5, 9}, self.botanists, ['team@lmnh.org'])
+        by_recipient = {tuple(digest.recipients): digest for digest in digests}
+
+        self.assertEqual(len(digests), 3)
+        ada = by_recipient[('ada@lmnh.org',)]
+        self.assertEqual(ada.name, 'Ada')
+        self.assertEqual(ada.anomalies['plant_id'].tolist(), [1, 2])
+        self.assertNotIn('email', ada.anomalies.columns)
+        self.assertEqual(by_recipient[('bo@lmnh.org',)].missing_ids, {5})
+        team = by_recipient[('team@lmnh.org',)]
+        self.assertEqual(team.anomalies['plant_id'].tolist(), [3])
+        self.assertEqual(team.missing_ids, {9})
+
+    def test_get_digests_skips_empty(self):
+        """
+        Test that nobody is emailed if there is nothing to report.
+        """
+        self.assertEqual(get_digests(self.anomalies.iloc[:0], set(), self.botanists), [])
+
+    def test_render_digest(self):
+        """
+        Test that a digest lists only its own anomalies and missing plants.
+        """
+        html = render_digest(Digest(['ada@lmnh.org'], 'Ada', self.anomalies.iloc[:1], {7}))
+        self.assertIn('Hello Ada', html)
+        self.assertIn('[7]', html)
+        self.assertIn('90.0', html)
+        self.assertIn('No temperature anomalies found.', html)
+
+    def test_render_digest_with_gaps(self):
+        """
+        Test that missing plants are listed with how long they have been missing.
+        """
+        gaps = pd.DataFrame({'plant_id': [5, 6], 'missing_minutes': [95, 30]})
+        digests = get_digests(self.anomalies.iloc[:0], {5}, self.botanists, gaps=gaps)
+        self.assertEqual(digests[0].gaps['plant_id'].tolist(), [5])
+        self.assertIn('95', render_digest(digests[0]))
+
+    def test_throttle_spaces_calls(self):
+        """
+        Test that calls are spaced by the interval the rate allows.
+        """
+        sleeps = []
+        throttle = Throttle(2, clock=lambda: 10.0, sleep=sleeps.append)
+        for _ in range(3):
+            throttle.wait()
+        self.assertEqual(sleeps, [0.5, 1.0])
+
+    @patch('notifications.time.sleep')
+    def test_send_message_retries_throttling(self, _):
+        """
+        Test that a throttled send is retried until SES accepts it.
+        """
+        ses_client = StubSESClient(throttle_count=2)
+        result = send_message(ses_client, ['ada@lmnh.org'], '<p>Hi</p>')
+        self.assertTrue(result.ok)
+        self.assertEqual(result.attempts, 3)
+        self.assertEqual(len(ses_client.sent), 1)
+
+    @patch('notifications.time.sleep')
+    def test_send_message_gives_up(self, _):
+        """
+        Test that a send that is always throttled fails after the retries.
+        """
+        result = send_message(StubSESClient(throttle_count=10), ['ada@lmnh.org'], '', max_retries=2)
+        self.assertFalse(result.ok)
+        self.assertEqual(result.attempts, 3)
+        self.assertIn('Throttling', result.error)
+
+    def test_send_digests(self):
+        """
+        Test that every digest is sent once to its own recipients.
+        """
+        ses_client = StubSESClient()
+        digests = get_digests(self.anomalies, {5}, self.botanists, ['team@lmnh.org'])
+        results = send_digests(ses_client, digests, rate=1000)
+
+        self.assertTrue(all(result.ok for result in results))
+        sent_to = sorted(message['Destination']['ToAddresses'][0] for message in ses_client.sent)
+        self.assertEqual(sent_to, ['ada@lmnh.org', 'bo@lmnh.org', 'team@lmnh.org'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Serialises the daily summary, anomalies and rollups for the S3 archive as typed,
+compressed Parquet, optionally alongside the original CSV; every Parquet file
+records the version of its schema, and rows are sorted by plant so readers can
+skip row groups
+"""
+
+# ========== IMPORTS ==========
+from io import BytesIO
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+SCHEMA_VERSION = 1
+# bump whenever how the archives are derived changes, so a backfill redoes
+# every partition written before
+PROCESSING_VERSION = 1
+FORMATS = ["parquet", "csv"]
+COMPRESSION = "zstd"
+# small row groups let readers filtering on plant_id skip most of a file
+ROW_GROUP_SIZE = 10_000
+
+METRIC_STATS = [pa.field(f"{metric}_{stat}", pa.float64())
+                for metric in ["soil_moisture", "temperature"]
+                for stat in ["mean", "std", "min", "max"]]
+SCHEMAS = {
+    "summary": pa.schema([pa.field("plant_id", pa.int32()), *METRIC_STATS]),
+    "anomalies": pa.schema([
+        pa.field("recording_taken", pa.timestamp("us", tz="UTC")),
+        pa.field("plant_id", pa.int32()),
+        pa.field("soil_moisture", pa.float64()),
+        pa.field("temperature", pa.float64()),
+        pa.field("soil_moisture_nstd", pa.float64()),
+        pa.field("temperature_nstd", pa.float64())]),
+}
+# hourly rollups, and their daily and monthly compactions
+ROLLUP_SCHEMA = pa.schema([
+    pa.field("plant_id", pa.int32()),
+    pa.field("bucket_start", pa.timestamp("us", tz="UTC")),
+    *[pa.field(f"{metric}_{stat}", pa.int64() if stat == "count" else pa.float64())
+      for metric in ["soil_moisture", "temperature"]
+      for stat in ["count", "mean", "std", "min", "max"]],
+    pa.field("last_watered", pa.timestamp("us", tz="UTC"))])
+SCHEMAS |= {"hourly": ROLLUP_SCHEMA, "daily": ROLLUP_SCHEMA, "monthly": ROLLUP_SCHEMA}
+
+
+# ========== FUNCTIONS ==========
+def to_parquet(df: pd.DataFrame, name: str) -> bytes:
+    """Converts `df` to Parquet with the schema of archive `name`.
+    Returns bytes."""
+
+    schema = SCHEMAS[name].with_metadata(
+        {"schema_version": str(SCHEMA_VERSION), "archive": name})
+    df = df.sort_values("plant_id", kind="stable")
+    table = pa.Table.from_pandas(df[schema.names], schema=schema,
+                                 preserve_index=False)
+
+    buffer = BytesIO()
+    pq.write_table(table, buffer, compression=COMPRESSION,
+                   row_group_size=ROW_GROUP_SIZE)
+    return buffer.getvalue()
+
+
+def to_csv(df: pd.DataFrame, name: str) -> bytes:
+    """Converts `df` to the CSV the archive held before Parquet.
+    Returns bytes."""
+
+    return df[SCHEMAS[name].names].to_csv(index=False).encode()
+
+
+def get_artifacts(df: pd.DataFrame,
+                  name: str,
+                  formats: list[str] | None = None,
+                  by_plant: bool = False) -> dict[str, bytes]:
+    """Serialises archive `name` in each of `formats`, one file per plant
+    if `by_plant`, e.g. `summary.parquet` or `summary/plant_id=7.parquet`.
+    Returns {filename: bytes}."""
+
+    writers = {"parquet": to_parquet, "csv": to_csv}
+    parts = (df.groupby("plant_id") if by_plant else [(None, df)])
+
+    artifacts = {}
+    for plant_id, part in parts:
+        stem = name if plant_id is None else f"{name}/plant_id={plant_id}"
+        for extension in formats or FORMATS:
+            artifacts[f"{stem}.{extension}"] = writers[extension](part, name)
+
+    return artifacts
+
+
+def get_partition_artifacts(archives: dict[str, pd.DataFrame],
+                            formats: list[str] | None = None,
+                            by_plant: bool = False) -> dict[str, bytes]:
+    """Serialises the archives of one partition: the summary and anomalies in
+    each of `formats`, and the rollups as Parquet, the daily ones in one file.
+    Returns {filename: bytes}."""
+
+    artifacts = {}
+    for name, df in archives.items():
+        artifacts |= get_artifacts(df, name,
+                                   formats if name in ["summary", "anomalies"] else ["parquet"],
+                                   by_plant and name != "daily")
+
+    return artifacts
@@ -0,0 +1,173 @@
+"""
+Rebuilds the archive for a range of past days, e.g. after a failed daily run or
+a change to how the summary is derived. Days are reprocessed in parallel, each in
+its own process, from the readings still in the database or from the hourly
+rollups already archived; each partition is written atomically and then marked
+by a manifest, so days already up to date are skipped.
+
+    python3 backfill.py 2023-01-01 2023-12-31 --source hourly --workers 8
+"""
+
+# ========== IMPORTS ==========
+from argparse import ArgumentParser
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from io import BytesIO
+from os import environ as ENV
+from re import fullmatch
+from datetime import date, datetime, timedelta, timezone
+from dotenv import load_dotenv
+from boto3 import client
+import pandas as pd
+from archive import PROCESSING_VERSION, SCHEMA_VERSION, get_artifacts, get_partition_artifacts
+from longterm import archive_partition, get_db_connection, get_month_rollups, get_s3_client
+from recording_stats import to_bucket
+from retention import count_recordings, get_window, RETENTION
+from rollups import compact, summarise
+from uploader import BUCKET, get_key, get_manifest, put_manifest, upload_atomic
+
+SOURCES = ["hourly", "raw"]
+MAX_WORKERS = 4
+# hourly rollups in one file, or one per plant if ARCHIVE_BY_PLANT is set
+HOURLY_PATTERN = r"hourly(?:/plant_id=\d+)?\.parquet"
+
+
+# ========== FUNCTIONS ==========
+def get_partitions(start: date, end: date) -> list[date]:
+    """Returns every date from `start` to `end`, inclusive."""
+
+    return [start + timedelta(days=day) for day in range((end - start).days + 1)]
+
+
+def is_up_to_date(manifest: dict | None) -> bool:
+    """Returns whether a partition was written by the current
+    processing and schema versions."""
+
+    return (manifest is not None and
+            manifest["processing_version"] == PROCESSING_VERSION and
+            manifest["schema_version"] == SCHEMA_VERSION)
+
+
+def from_hourly(s3: client, partition: date,
+                bucket: str = BUCKET) -> dict[str, pd.DataFrame] | None:
+    """Rederives the summary and daily rollups of a partition from its
+    archived hourly rollups, in one file or one per plant. Anomalies need
+    the readings, so are left as they are.
+    Returns {archive name: pd.DF}, or None if there are no hourly rollups."""
+
+    pages = s3.get_paginator("list_objects_v2").paginate(
+        Bucket=bucket, Prefix=get_key(partition, "hourly"))
+    keys = [obj["Key"] for page in pages for obj in page.get("Contents", [])
+            if fullmatch(HOURLY_PATTERN, obj["Key"].removeprefix(get_key(partition, "")))]
+    if not keys:
+        return None
+
+    hourly = pd.concat([pd.read_parquet(BytesIO(
+        s3.get_object(Bucket=bucket, Key=key)["Body"].read())) for key in keys],
+        ignore_index=True)
+    return {"summary": summarise(hourly), "hourly": hourly,
+            "daily": compact(hourly, "D")}
+
+
+def process_partition(partition: date,
+                      source: str,
+                      formats: list[str],
+                      by_plant: bool = False,
+                      force: bool = False) -> dict | None:
+    """Rebuilds the archive of one partition, unless it is up to date, in
+    a worker process with its own connections. From the readings, this is
+    what the daily run does.
+    Returns the new manifest, or None if the partition was skipped."""
+
+    s3 = get_s3_client(ENV)
+    if not force and is_up_to_date(get_manifest(s3, partition)):
+        return None
+
+    if source == "hourly":
+        archives = from_hourly(s3, partition)
+        if archives is None:
+            return None
+        checksums = upload_atomic(s3, get_partition_artifacts(archives, formats, by_plant),
+                                  partition)
+        return put_manifest(s3, partition, checksums, source)
+
+    since, until = get_window(partition)
+    if until > to_bucket(datetime.now(timezone.utc) - RETENTION):
+        raise ValueError(f"readings of {since.date()} are within retention; "
+                         "they are left to the daily run")
+
+    with get_db_connection(ENV) as conn:
+        # once archived the readings are deleted, so an archive is never
+        # overwritten by an empty one
+        if not count_recordings(conn, until, since):
+            return None
+        return archive_partition(conn, s3, partition, formats, by_plant)
+
+
+def compact_months(s3: client, partitions: list[date]) -> list[date]:
+    """Recompacts the monthly rollups of every finished month
+    that any of `partitions` belongs to.
+    Returns the months recompacted."""
+
+    this_month = datetime.now(timezone.utc).date().replace(day=1)
+    months = sorted({partition.replace(day=1) for partition in partitions
+                     if partition.replace(day=1) < this_month})
+
+    for month in months:
+        month_rollups = get_month_rollups(s3, month)
+        if not month_rollups.empty:
+            upload_atomic(s3, get_artifacts(compact(month_rollups, "M"), "monthly",
+                                             ["parquet"]),
+                          month, prefix="%Y/%m/")
+
+    return months
+
+
+def backfill(partitions: list[date],
+             source: str,
+             formats: list[str],
+             by_plant: bool = False,
+             force: bool = False,
+             max_workers: int = MAX_WORKERS,
+             executor: Executor | None = None) -> dict[date, dict | None]:
+    """Rebuilds the archive of each of `partitions`, `max_workers` at
+    a time, then the monthly rollups of the months rebuilt.
+    Returns {partition: manifest, or None if skipped}."""
+
+    if source not in SOURCES:
+        raise ValueError(f"source must be one of {SOURCES}, not {source}")
+
+    results = {}
+    with executor or ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(process_partition, partition, source, formats,
+                               by_plant, force): partition
+                   for partition in partitions}
+        for future in as_completed(futures):
+            partition = futures[future]
+            results[partition] = future.result()
+            print(partition, "rebuilt" if results[partition] else "skipped")
+
+    rebuilt = [partition for partition, manifest in results.items() if manifest]
+    compact_months(get_s3_client(ENV), rebuilt)
+
+    return results
+
+
+if __name__ == "__main__":
+
+    load_dotenv()
+
+    parser = ArgumentParser(description="Rebuilds the long-term archive of past days.")
+    parser.add_argument("start", type=date.fromisoformat, help="first day, YYYY-MM-DD")
+    parser.add_argument("end", type=date.fromisoformat, help="last day, YYYY-MM-DD")
+    parser.add_argument("--source", choices=SOURCES, default="hourly",
+                        help="rebuild from the archived hourly rollups, or from the "
+                        "readings still in the database")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--force", action="store_true",
+                        help="rebuild partitions that are already up to date")
+    args = parser.parse_args()
+
+    backfill(get_partitions(args.start, args.end), args.source,
+             ENV.get("ARCHIVE_FORMATS", "parquet,csv").split(","),
+             ENV.get("ARCHIVE_BY_PLANT", "false").lower() == "true",
+             args.force, args.workers)
@@ -0,0 +1,79 @@
+"""
+Benchmarks the rolling z-score module against the per-row `get_std` it replaced,
+on a day of minute readings
+
+Usage: python bench_rolling.py [plant_count ...]
+"""
+
+# ========== IMPORTS ==========
+import sys
+import time
+from datetime import datetime, timezone, timedelta
+import numpy as np
+import pandas as pd
+from rolling import get_rolling_nstd
+
+MINUTES = 24 * 60
+# the per-row version is quadratic, so it is only timed on frames up to this size
+MAX_LEGACY_ROWS = 30_000
+
+
+# ========== FUNCTIONS ==========
+def make_readings(plant_count: int) -> pd.DataFrame:
+    """Gets a day of minute readings for `plant_count` plants.
+    Returns pd.DF."""
+
+    rng = np.random.default_rng(0)
+    rows = plant_count * MINUTES
+    start = datetime.now(timezone.utc) - timedelta(minutes=MINUTES - 1)
+    times = pd.date_range(start, periods=MINUTES, freq="min")
+
+    return pd.DataFrame({
+        "plant_id": np.tile(np.arange(plant_count), MINUTES),
+        "recording_taken": np.repeat(times, plant_count),
+        "soil_moisture": rng.normal(30, 3, rows),
+        "temperature": rng.normal(15, 1, rows)})
+
+
+def legacy_get_std(row: dict, df: pd.DataFrame, col: str) -> int:
+    """`get_std` as it was before the rolling module."""
+
+    last_hour = pd.Timestamp(datetime.now(timezone.utc)-timedelta(hours=1))
+    last_hour_vals = df[(df["plant_id"] == row["plant_id"]) &
+                        (df["recording_taken"] >= last_hour)][col]
+
+    return (row[col] - last_hour_vals.mean()) / last_hour_vals.std()
+
+
+def run_legacy(df: pd.DataFrame) -> None:
+    """Scores every row of both metrics with the per-row version."""
+
+    for col in ["soil_moisture", "temperature"]:
+        df.apply(legacy_get_std, args=(df, col), axis=1)
+
+
+def timed(function, df: pd.DataFrame) -> float:
+    """Returns the seconds taken by one call of `function`."""
+
+    start = time.perf_counter()
+    function(df)
+    return time.perf_counter() - start
+
+
+def main(plant_counts: list[int]) -> None:
+    """Prints the time taken by each version for each plant count."""
+
+    print(f"{'plants':>8} {'rows':>10} {'legacy':>10} {'rolling':>9} {'µs/row':>7}")
+    for plant_count in plant_counts:
+        df = make_readings(plant_count)
+
+        rolling = timed(get_rolling_nstd, df)
+        legacy = (f"{timed(run_legacy, df):>9.2f}s"
+                  if len(df) <= MAX_LEGACY_ROWS else f"{'-':>10}")
+
+        print(f"{plant_count:>8} {len(df):>10} {legacy} {rolling:>8.3f}s "
+              f"{rolling / len(df) * 1e6:>7.2f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [5, 20, 100, 1000, 3000])
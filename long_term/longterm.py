@@ -1,47 +1,83 @@
 # ========== IMPORTS ==========
+from collections.abc import Iterable, Iterator
+from contextlib import AbstractContextManager
+from io import BytesIO
 from os import environ as ENV
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone, timedelta
 from dotenv import load_dotenv
-from pymssql import connect
+from pymssql import connect, Connection
+from archive import get_artifacts, get_partition_artifacts
+from rollups import HourlyRollups, compact
+from uploader import put_manifest, upload_atomic
+from connection import get_pool
+from recording_stats import get_stats_summary
+from retention import apply_retention, get_oldest_recording, get_partition, get_window
+from rolling import add_rolling_nstd, is_anomalous, WINDOW
 import pandas as pd
 from boto3 import client
 
+COLUMNS = ["recording_taken", "plant_id", "soil_moisture", "temperature",
+           "last_watered"]
+# Readings fetched from the database at a time
+CHUNK_SIZE = 50_000
 
-def get_db_connection(config: dict) -> connect:
-    """Returns database connection."""
 
-    return connect(
-        server=config["DB_HOST"],
-        port=config["DB_PORT"],
-        user=config["DB_USER"],
-        database=config["DB_NAME"],
-        password=config["DB_PASSWORD"],
-        as_dict=True
-    )
+def get_db_connection(config: dict) -> AbstractContextManager[Connection]:
+    """Returns a context manager lending a connection from the shared pool,
+    which is given back, with any open transaction rolled back, on exit."""
 
+    return get_pool(config, factory=connect).connection()
 
-def get_data(conn: connect) -> pd.DataFrame:
-    """Returns a Dataframe of method data from database."""
 
-    query = """ 
-            SELECT *
-            FROM s_beta.recording AS r
-            FULL JOIN s_beta.plant AS p
-                ON r.plant_id = p.plant_id
-            """
+def get_s3_client(config: dict) -> client:
+    """Returns an S3 client."""
 
-    with conn.cursor() as cur:
-        cur.execute(query)
-        rows = cur.fetchall()
+    return client('s3',
+                  aws_access_key_id=config["AWS_KEY"],
+                  aws_secret_access_key=config["AWS_SKEY"])
 
-    df = pd.DataFrame(rows)[
-        ["recording_taken", "plant_id", "soil_moisture", "temperature"]]
 
-    df = df.astype({"soil_moisture": "float64",
-                    "temperature": "float64"})
-    df['recording_taken'] = pd.to_datetime(df['recording_taken'], utc=True)
+def get_data_chunks(conn: connect,
+                    chunk_size: int = CHUNK_SIZE,
+                    until: datetime | None = None,
+                    since: datetime | None = None) -> Iterator[pd.DataFrame]:
+    """Yields the readings in database, or those taken from `since` and
+    before `until`, in order of recording_taken, in Dataframes of at most
+    `chunk_size` rows. Only the needed columns are selected, as tuples, so
+    memory is bounded by the chunk size rather than the number of readings."""
 
-    return df
+    query = f"""
+            SELECT {", ".join(COLUMNS)}
+            FROM s_beta.recording
+            """
+    conditions, params = [], []
+    if since is not None:
+        conditions.append("recording_taken >= %s")
+        params.append(since)
+    if until is not None:
+        conditions.append("recording_taken < %s")
+        params.append(until)
+    if conditions:
+        query += f"WHERE {' AND '.join(conditions)}\n"
+    query += "ORDER BY recording_taken"
+
+    with conn.cursor(as_dict=False) as cur:
+        cur.execute(query, tuple(params) or None)
+        while rows := cur.fetchmany(chunk_size):
+            df = pd.DataFrame.from_records(rows, columns=COLUMNS)
+            df = df.astype({"soil_moisture": "float64",
+                            "temperature": "float64"})
+            df["recording_taken"] = pd.to_datetime(df["recording_taken"],
+                                                   utc=True)
+            df["last_watered"] = pd.to_datetime(df["last_watered"], utc=True)
+            yield df
+
+
+def get_data(conn: connect) -> pd.DataFrame:
+    """Returns a Dataframe of method data from database."""
+
+    return pd.concat([pd.DataFrame(columns=COLUMNS), *get_data_chunks(conn)],
+                     ignore_index=True)
 
 
 def get_summary(df: pd.DataFrame) -> pd.DataFrame:
@@ -62,106 +98,143 @@ def get_summary(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def get_std(row: dict, df: pd.DataFrame, col: str) -> int:
-    """Compare minutely value to mean of past hour;
-    Returns std."""
+def get_anomalies(df: pd.DataFrame) -> pd.DataFrame:
+    """Gets rows with values 2.5std away from the mean of
+    the same plant's readings in the hour before.
+    Returns pd.DF."""
 
-    last_hour = pd.Timestamp(datetime.now(timezone.utc)-timedelta(hours=1))
-    last_hour_vals = df[(df["plant_id"] == row["plant_id"]) &
-                        (df["recording_taken"] >= last_hour)][col]
+    df = add_rolling_nstd(df)
 
-    mean = last_hour_vals.mean()
-    std = last_hour_vals.std()
+    return df[is_anomalous(df)]
 
-    nstd = (row[col] - mean) / std
 
-    return nstd
+def get_anomalies_streaming(chunks: Iterable[pd.DataFrame],
+                            window: str = WINDOW) -> pd.DataFrame:
+    """Gets the same rows as get_anomalies from time-ordered chunks of
+    readings. The last `window` of each chunk is carried into the next,
+    so only a chunk and an hour of readings are held at once.
+    Returns pd.DF."""
 
+    anomalies = []
+    carry = pd.DataFrame(columns=COLUMNS)
+    for chunk in chunks:
+        df = pd.concat([carry, chunk], ignore_index=True) \
+            if not carry.empty else chunk.reset_index(drop=True)
+        scored = get_anomalies(df)
+        anomalies.append(scored[scored.index >= len(carry)])
 
-def get_anomalies(df: pd.DataFrame) -> pd.DataFrame:
-    """Gets rows with values 2.5std away from mean.
-    Returns pd.DF."""
+        latest = df["recording_taken"].max()
+        carry = df[df["recording_taken"] >= latest - pd.Timedelta(window)]
 
-    df["soil_moisture_nstd"] = df.apply(get_std,
-                                        args=(data, "soil_moisture"),
-                                        axis=1)
-    df["temperature_nstd"] = df.apply(get_std,
-                                      args=(df, "temperature"),
-                                      axis=1)
+    if not anomalies:
+        return get_anomalies(carry)
 
-    df = df[(df["soil_moisture_nstd"] <= -2.5) |
-            (df["soil_moisture_nstd"] >= 2.5) |
-            (df["temperature_nstd"] <= -2.5) |
-            (df["temperature_nstd"] >= 2.5)]
+    return pd.concat(anomalies, ignore_index=True)
 
-    return df
 
+def get_archives(conn: connect, partition: date) -> dict[str, pd.DataFrame]:
+    """Gets the summary, anomalies and hourly and daily rollups of the
+    readings archived under the `partition` date, in one pass over them.
+    Returns {archive name: pd.DF}."""
 
-def upload_object(client: client,
-                  file: str,
-                  bucket: str = "late-ordovician",
-                  date: datetime = datetime.now()) -> None:
-    """Upload file to S3 bucket.
-    Returns nothing."""
-
-    key = date.strftime("%Y/%m/%d/") + file
-
-    client.upload_file(file, bucket, key)
-
-
-def reset_recording(conn: connect) -> None:
-    """Drops and recreates table `recording` in database."""
-
-    drop = "DROP TABLE s_beta.recording"
-    create = """
-            IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'recording' AND schema_id = SCHEMA_ID('s_beta'))
-            BEGIN
-                CREATE TABLE s_beta.recording (
-                    recording_id BIGINT IDENTITY(1,1) PRIMARY KEY,
-                    plant_id INT NOT NULL,
-                        FOREIGN KEY (plant_id) REFERENCES s_beta.plant(plant_id) ON DELETE CASCADE,
-                    recording_taken DATETIME2 NOT NULL,
-                    last_watered DATETIME2,
-                    soil_moisture DECIMAL(8, 4) NOT NULL,
-                    temperature DECIMAL(8, 4) NOT NULL,
-                    image_id BIGINT,
-                        FOREIGN KEY (image_id) REFERENCES s_beta.image(image_id) ON DELETE CASCADE,
-                    botanist_id INT NOT NULL,
-                        FOREIGN KEY (botanist_id) REFERENCES s_beta.botanist(botanist_id) ON DELETE CASCADE
-                );
-            END;
-            """
+    since, until = get_window(partition)
+    rollups = HourlyRollups()
+    anomalies = get_anomalies_streaming(
+        map(rollups.add, get_data_chunks(conn, until=until, since=since)))
+    hourly = rollups.result()
 
-    with conn.cursor() as cur:
-        cur.execute(drop)
-        cur.execute(create)
-        conn.commit()
+    # summarised from the pipeline's hourly statistics rather than the raw readings
+    summary = get_stats_summary(conn, since.replace(tzinfo=timezone.utc),
+                                until.replace(tzinfo=timezone.utc))
 
+    return {"summary": summary, "anomalies": anomalies, "hourly": hourly,
+            "daily": compact(hourly, "D")}
 
-if __name__ == "__main__":
 
-    # ===== connections =====
-    load_dotenv()
+def archive_partition(conn: connect,
+                      s3: client,
+                      partition: date,
+                      formats: list[str] | None = None,
+                      by_plant: bool = False) -> dict:
+    """Archives the readings of the `partition` date atomically, marks the
+    partition complete for backfill.py, then deletes the readings.
+    Returns the manifest."""
 
-    connection = get_db_connection(ENV)
+    archives = get_archives(conn, partition)
+    checksums = upload_atomic(s3, get_partition_artifacts(archives, formats, by_plant),
+                              partition)
+    # marked before deleting, so a rerun cannot overwrite it with fewer readings
+    manifest = put_manifest(s3, partition, checksums, "raw")
 
-    S3 = client('s3',
-                aws_access_key_id=ENV["AWS_KEY"],
-                aws_secret_access_key=ENV["AWS_SKEY"])
+    since, until = get_window(partition)
+    apply_retention(conn, archives["hourly"], until, since)
 
-    # ===== extract data =====
-    data = get_data(connection)
+    return manifest
 
-    # # ===== transform data =====
-    summary = get_summary(data)
-    anomalies = get_anomalies(data)
 
-    # # ===== load data =====
-    summary.to_csv("summary.csv", index=False)
-    anomalies.to_csv("anomalies.csv", index=False)
+def get_pending_partitions(conn: connect, today: date) -> list[date]:
+    """Gets the partitions to archive today: today's, and those of any readings
+    left by missed runs, so each day is still archived under its own partition.
+    Returns the dates, oldest first."""
+
+    oldest = get_oldest_recording(conn)
+    start = min(get_partition(oldest), today) if oldest else today
+
+    return [start + timedelta(days=day) for day in range((today - start).days + 1)]
+
+
+def archive_pending(conn: connect,
+                    s3: client,
+                    today: date,
+                    formats: list[str] | None = None,
+                    by_plant: bool = False) -> list[date]:
+    """Archives every pending partition, and on the first of the month compacts
+    the previous month's days.
+    Returns the partitions archived."""
+
+    partitions = get_pending_partitions(conn, today)
+    for partition in partitions:
+        archive_partition(conn, s3, partition, formats, by_plant)
+
+        if partition.day == 1:
+            last_month = partition - timedelta(days=1)
+            month_rollups = get_month_rollups(s3, last_month)
+            if not month_rollups.empty:
+                upload_atomic(s3, get_artifacts(compact(month_rollups, "M"), "monthly",
+                                                ["parquet"]),
+                              last_month, prefix="%Y/%m/")
+
+    return partitions
+
+
+def get_month_rollups(client: client,
+                      month: date,
+                      bucket: str = "late-ordovician") -> pd.DataFrame:
+    """Gets the daily rollups archived for every day of `month`.
+    Returns pd.DF."""
+
+    pages = client.get_paginator("list_objects_v2").paginate(
+        Bucket=bucket, Prefix=month.strftime("%Y/%m/"))
+    keys = [obj["Key"] for page in pages for obj in page.get("Contents", [])
+            if obj["Key"].endswith("/daily.parquet")]
+    days = [pd.read_parquet(BytesIO(client.get_object(Bucket=bucket, Key=key)["Body"].read()))
+            for key in keys]
+
+    return pd.concat(days, ignore_index=True) if days else pd.DataFrame()
+
+
+if __name__ == "__main__":
+
+    # ===== connections =====
+    load_dotenv()
+
+    S3 = get_s3_client(ENV)
 
-    upload_object(S3, "summary.csv")
-    upload_object(S3, "anomalies.csv")
+    # "parquet", "csv" or both, comma-separated
+    formats = ENV.get("ARCHIVE_FORMATS", "parquet,csv").split(",")
+    by_plant = ENV.get("ARCHIVE_BY_PLANT", "false").lower() == "true"
 
-    # # ===== reset 24h recordings =====
-    reset_recording(connection)
+    # readings are archived under the day of the run, and deleted, once they are older
+    # than 24h; days left by missed runs are archived first
+    with get_db_connection(ENV) as connection:
+        archive_pending(connection, S3, datetime.now(timezone.utc).date(), formats, by_plant)
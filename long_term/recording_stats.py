@@ -0,0 +1,91 @@
+"""
+Reads the hourly statistics the pipeline keeps in s_beta.recording_stats
+and combines them into per-plant summaries
+"""
+
+# ========== IMPORTS ==========
+from datetime import datetime, timezone
+from pymssql import connect
+import pandas as pd
+
+METRICS = ["soil_moisture", "temperature"]
+STATS = ["mean", "std", "min", "max"]
+
+
+# ========== FUNCTIONS ==========
+def get_stats(conn: connect,
+              since: datetime,
+              until: datetime | None = None) -> pd.DataFrame:
+    """Gets the hourly statistics of every plant and metric
+    from the hour of `since` up to `until`.
+    Returns pd.DF."""
+
+    query = """
+            SELECT s.plant_id, s.metric, s.bucket_start, s.reading_count,
+                s.mean, s.m2, s.min_value, s.max_value
+            FROM s_beta.recording_stats AS s
+            WHERE s.bucket_start >= %s
+            """
+    params = [to_bucket(since)]
+    if until is not None:
+        query += "AND s.bucket_start < %s"
+        params.append(until.astimezone(timezone.utc).replace(tzinfo=None))
+
+    with conn.cursor() as cur:
+        cur.execute(query, tuple(params))
+        rows = cur.fetchall()
+
+    return pd.DataFrame(rows, columns=["plant_id", "metric", "bucket_start",
+                                       "reading_count", "mean", "m2",
+                                       "min_value", "max_value"])
+
+
+def to_bucket(time: datetime) -> datetime:
+    """Returns the start of the hour of `time`, in naive UTC as stored."""
+
+    return time.astimezone(timezone.utc).replace(tzinfo=None, minute=0,
+                                                  second=0, microsecond=0)
+
+
+def combine_stats(stats: pd.DataFrame) -> pd.DataFrame:
+    """Combines hourly statistics into 1 mean, std, min and max
+    per parameter per plant, using the parallel form of Welford's algorithm.
+    Returns pd.DF."""
+
+    stats = stats.astype({"reading_count": "float64", "mean": "float64",
+                          "m2": "float64", "min_value": "float64",
+                          "max_value": "float64"})
+    stats["weighted_mean"] = stats["reading_count"] * stats["mean"]
+    groups = stats.groupby(["plant_id", "metric"])
+    overall_mean = (groups["weighted_mean"].transform("sum") /
+                    groups["reading_count"].transform("sum"))
+    stats["spread"] = stats["m2"] + stats["reading_count"] * \
+        (stats["mean"] - overall_mean) ** 2
+
+    combined = stats.groupby(["plant_id", "metric"]).agg(
+        count=("reading_count", "sum"),
+        weighted_mean=("weighted_mean", "sum"),
+        m2=("spread", "sum"),
+        min=("min_value", "min"),
+        max=("max_value", "max"))
+    combined["mean"] = combined["weighted_mean"] / combined["count"]
+    combined["std"] = (combined["m2"] / (combined["count"] - 1)) ** 0.5
+    combined.loc[combined["count"] < 2, "std"] = float("nan")
+
+    summary = combined[STATS].unstack("metric")
+    summary.columns = [f"{metric}_{stat}" for stat, metric in summary.columns]
+    summary = summary.reindex(columns=[f"{metric}_{stat}"
+                                       for metric in METRICS
+                                       for stat in STATS])
+
+    return summary.reset_index()
+
+
+def get_stats_summary(conn: connect,
+                      since: datetime,
+                      until: datetime | None = None) -> pd.DataFrame:
+    """Gets 1 mean, std, min and max per parameter per plant
+    from the hourly statistics between `since` and `until`.
+    Returns pd.DF."""
+
+    return combine_stats(get_stats(conn, since, until))
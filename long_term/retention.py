@@ -0,0 +1,118 @@
+"""
+Rolling retention of s_beta.recording: readings older than the retention
+period are archived, then deleted in small batches, each committed on
+its own so the minute loader is never blocked for long, and only if the archive
+holds as many of them as the table does
+"""
+
+# ========== IMPORTS ==========
+import time
+from datetime import date, datetime, timedelta
+from pymssql import connect
+import pandas as pd
+
+RETENTION = timedelta(hours=24)
+# below the 5000 locks at which SQL Server escalates to a table lock
+BATCH_SIZE = 4000
+# gives the minute loader a chance to take its locks between batches
+BATCH_PAUSE = 0.05
+
+
+# ========== FUNCTIONS ==========
+def get_window(partition: date) -> tuple[datetime, datetime]:
+    """Returns the start and end, in naive UTC as stored, of the readings
+    archived under the `partition` date: the day that passed out of retention
+    by midnight starting it, when the daily run starts."""
+
+    until = datetime.combine(partition, datetime.min.time()) - RETENTION
+    return until - timedelta(days=1), until
+
+
+def get_partition(taken: datetime) -> date:
+    """Returns the date of the partition archiving a reading taken at `taken`."""
+
+    return (taken + RETENTION).date() + timedelta(days=1)
+
+
+def get_oldest_recording(conn: connect) -> datetime | None:
+    """Returns when the oldest reading still held was taken, or None if there are none."""
+
+    query = """
+            SELECT MIN(recording_taken) AS oldest
+            FROM s_beta.recording
+            """
+
+    with conn.cursor() as cur:
+        cur.execute(query)
+        return cur.fetchone()["oldest"]
+
+
+def count_recordings(conn: connect,
+                     cutoff: datetime,
+                     since: datetime = datetime.min) -> int:
+    """Returns the number of readings taken from `since` and before `cutoff`."""
+
+    query = """
+            SELECT COUNT(*) AS recordings
+            FROM s_beta.recording
+            WHERE recording_taken >= %s AND recording_taken < %s
+            """
+
+    with conn.cursor() as cur:
+        cur.execute(query, (since, cutoff))
+        return cur.fetchone()["recordings"]
+
+
+def count_archived(hourly: pd.DataFrame,
+                   cutoff: datetime,
+                   since: datetime = datetime.min) -> int:
+    """Returns the number of readings taken from `since` and before `cutoff`
+    according to the archived hourly rollups."""
+
+    buckets = hourly["bucket_start"]
+    archived = hourly[(buckets >= pd.Timestamp(since, tz="UTC")) &
+                      (buckets < pd.Timestamp(cutoff, tz="UTC"))]
+    return int(archived["soil_moisture_count"].sum())
+
+
+def delete_before(conn: connect,
+                  cutoff: datetime,
+                  batch_size: int = BATCH_SIZE,
+                  pause: float = BATCH_PAUSE,
+                  since: datetime = datetime.min) -> int:
+    """Deletes readings taken from `since` and before `cutoff`, `batch_size`
+    at a time, committing after each batch.
+    Returns the number deleted."""
+
+    query = """
+            DELETE TOP (%s) FROM s_beta.recording
+            WHERE recording_taken >= %s AND recording_taken < %s
+            """
+
+    deleted = 0
+    with conn.cursor() as cur:
+        while True:
+            cur.execute(query, (batch_size, since, cutoff))
+            conn.commit()
+            deleted += cur.rowcount
+            if cur.rowcount < batch_size:
+                return deleted
+            time.sleep(pause)
+
+
+def apply_retention(conn: connect,
+                    hourly: pd.DataFrame,
+                    cutoff: datetime,
+                    since: datetime = datetime.min) -> int:
+    """Deletes the readings taken from `since` and before `cutoff` (naive UTC,
+    as stored), after checking the archived `hourly` rollups account for all
+    of them.
+    Returns the number deleted."""
+
+    in_table = count_recordings(conn, cutoff, since)
+    archived = count_archived(hourly, cutoff, since)
+    if in_table != archived:
+        raise ValueError(f"{in_table} readings before {cutoff} but {archived} "
+                         "archived; nothing deleted")
+
+    return delete_before(conn, cutoff, since=since)
@@ -0,0 +1,111 @@
+"""
+Vectorised rolling-window z-scores of plant recordings; every reading is
+compared with the mean and standard deviation of the same plant's readings
+in the preceding window
+"""
+
+# ========== IMPORTS ==========
+import numpy as np
+import pandas as pd
+
+METRICS = ["soil_moisture", "temperature"]
+WINDOW = "1h"
+THRESHOLD = 2.5
+
+
+# ========== FUNCTIONS ==========
+def get_window_bounds(plant_ids: np.ndarray,
+                      seconds: np.ndarray,
+                      window: int) -> tuple[np.ndarray, np.ndarray]:
+    """Gets, for readings sorted by plant and time, the positions of the first
+    reading in each one's window and of the reading itself (exclusive end).
+    Plant and time are packed into one sorted key so that a single binary search
+    finds every window.
+    Returns (starts, ends)."""
+
+    groups = np.cumsum(np.r_[False, plant_ids[1:] != plant_ids[:-1]])
+    seconds = seconds - seconds.min()
+    span = seconds.max() + window + 1
+    keys = groups * span + seconds
+
+    starts = np.searchsorted(keys, keys - window, side="left")
+    ends = np.searchsorted(keys, keys, side="left")
+
+    return starts, ends
+
+
+def get_window_sums(values: np.ndarray,
+                    starts: np.ndarray,
+                    ends: np.ndarray) -> np.ndarray:
+    """Gets the column sums of `values` between each start and end
+    as differences of prefix sums.
+    Returns np.ndarray."""
+
+    prefix = np.vstack([np.zeros((1, values.shape[1])),
+                        np.cumsum(values, axis=0)])
+    return prefix[ends] - prefix[starts]
+
+
+def get_rolling_nstd(df: pd.DataFrame,
+                     cols: list[str] | None = None,
+                     window: str = WINDOW) -> pd.DataFrame:
+    """Gets the number of standard deviations each value lies from the mean
+    of the same plant's values within `window` before it.
+    Readings are sorted once, and window sums come from prefix sums, so the
+    work grows with n log n rather than n^2.
+    Returns pd.DF of `<col>_nstd` columns aligned with `df`."""
+
+    cols = cols or METRICS
+    if df.empty:
+        return pd.DataFrame(index=df.index,
+                            columns=[f"{col}_nstd" for col in cols], dtype=float)
+
+    times = pd.to_datetime(df["recording_taken"], utc=True)
+    seconds = ((times - pd.Timestamp(0, tz="UTC")) //
+               pd.Timedelta(seconds=1)).to_numpy(dtype=np.int64)
+    plant_ids = df["plant_id"].to_numpy()
+
+    order = np.lexsort((seconds, plant_ids))
+    starts, ends = get_window_bounds(plant_ids[order], seconds[order],
+                                     int(pd.Timedelta(window).total_seconds()))
+
+    values = df[cols].to_numpy(dtype=float)[order]
+    present = ~np.isnan(values)
+    # shifting by the mean keeps the prefix sums small and precise
+    shifted = np.where(present, values - np.nanmean(values, axis=0), 0.0)
+
+    count = get_window_sums(present.astype(float), starts, ends)
+    total = get_window_sums(shifted, starts, ends)
+    squares = get_window_sums(shifted ** 2, starts, ends)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = total / count
+        variance = (squares - total * mean) / (count - 1)
+        std = np.sqrt(np.where(variance > 0, variance, np.nan))
+        nstd = np.where(count > 1, (np.where(present, shifted, np.nan) - mean) / std,
+                        np.nan)
+
+    result = np.empty_like(nstd)
+    result[order] = nstd
+
+    return pd.DataFrame(result, index=df.index,
+                        columns=[f"{col}_nstd" for col in cols])
+
+
+def add_rolling_nstd(df: pd.DataFrame,
+                     cols: list[str] | None = None,
+                     window: str = WINDOW) -> pd.DataFrame:
+    """Adds `<col>_nstd` columns to a copy of `df`.
+    Returns pd.DF."""
+
+    return df.join(get_rolling_nstd(df, cols, window))
+
+
+def is_anomalous(df: pd.DataFrame,
+                 cols: list[str] | None = None,
+                 threshold: float = THRESHOLD) -> pd.Series:
+    """Flags rows with any `<col>_nstd` at least `threshold` away from 0.
+    Returns pd.Series of bool."""
+
+    cols = cols or METRICS
+    return (df[[f"{col}_nstd" for col in cols]].abs() >= threshold).any(axis=1)
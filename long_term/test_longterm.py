@@ -1,5 +1,461 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from io import BytesIO
+import hashlib
+from unittest.mock import MagicMock
 import pytest
+import pandas as pd
+import pyarrow.parquet as pq
+import boto3
+from moto import mock_aws
+from archive import get_artifacts, SCHEMA_VERSION
+import backfill as backfill_module
+from backfill import backfill, get_partitions
+from longterm import (archive_partition, archive_pending, get_anomalies, get_anomalies_streaming, get_data_chunks,
+                      get_month_rollups)
+from recording_stats import combine_stats
+from rolling import get_rolling_nstd
+from rollups import HourlyRollups, compact, summarise
+from retention import apply_retention, delete_before, get_window
+from uploader import get_manifest, upload_artifacts, upload_atomic
 
 
 def test_func():
     pass
+
+
+def test_combine_stats():
+    stats = pd.DataFrame({
+        "plant_id": [1, 1],
+        "metric": ["temperature", "temperature"],
+        "bucket_start": ["2024-04-17 10:00:00", "2024-04-17 11:00:00"],
+        "reading_count": [2, 2],
+        "mean": [11.0, 15.0],
+        "m2": [2.0, 2.0],
+        "min_value": [10.0, 14.0],
+        "max_value": [12.0, 16.0]})
+
+    summary = combine_stats(stats).iloc[0]
+
+    # the same as the readings 10, 12, 14 and 16
+    assert summary["temperature_mean"] == 13.0
+    assert round(summary["temperature_std"], 6) == 2.581989
+    assert (summary["temperature_min"], summary["temperature_max"]) == (10.0, 16.0)
+
+
+def test_get_rolling_nstd_matches_per_row_windows():
+    times = pd.date_range("2024-04-17 10:00", periods=6, freq="20min", tz="UTC")
+    df = pd.DataFrame({
+        "plant_id": [1, 2] * 6,
+        "recording_taken": times.repeat(2),
+        "soil_moisture": [1, 5, 2, 6, 3, 7, 10, 8, 4, 9, 5, 1.0],
+        "temperature": [20.0] * 12}).sample(frac=1, random_state=0)
+
+    nstd = get_rolling_nstd(df)
+
+    for index, row in df.iterrows():
+        window = df[(df["plant_id"] == row["plant_id"]) &
+                    (df["recording_taken"] < row["recording_taken"]) &
+                    (df["recording_taken"] >= row["recording_taken"] - timedelta(hours=1))]
+        expected = (row["soil_moisture"] - window["soil_moisture"].mean()) / \
+            window["soil_moisture"].std()
+        assert nstd.loc[index, "soil_moisture_nstd"] == pytest.approx(expected, nan_ok=True)
+    # no variation, so no score
+    assert nstd["temperature_nstd"].isna().all()
+
+
+def test_get_anomalies():
+    times = pd.date_range("2024-04-17 10:00", periods=30, freq="min", tz="UTC")
+    df = pd.DataFrame({
+        "plant_id": 1,
+        "recording_taken": times,
+        "soil_moisture": [30.0, 31.0] * 14 + [30.5, 60.0],
+        "temperature": 20.0})
+
+    anomalies = get_anomalies(df)
+
+    assert anomalies["soil_moisture"].tolist() == [60.0]
+
+
+def test_get_data_chunks():
+    conn = MagicMock()
+    cur = conn.cursor.return_value.__enter__.return_value
+    rows = [(datetime(2024, 4, 17, 10, minute), 1, "30.5", "20.0",
+             datetime(2024, 4, 17, 9, 0)) for minute in range(5)]
+    cur.fetchmany.side_effect = [rows[:2], rows[2:4], rows[4:], []]
+
+    chunks = list(get_data_chunks(conn, chunk_size=2))
+
+    conn.cursor.assert_called_with(as_dict=False)
+    assert "ORDER BY recording_taken" in cur.execute.call_args.args[0]
+    assert "WHERE" not in cur.execute.call_args.args[0]
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert chunks[0]["soil_moisture"].dtype == "float64"
+    assert str(chunks[0]["recording_taken"].dt.tz) == "UTC"
+
+
+def test_get_anomalies_streaming_matches_batch():
+    times = pd.date_range("2024-04-17 10:00", periods=150, freq="min", tz="UTC")
+    df = pd.DataFrame({
+        "recording_taken": times.repeat(2),
+        "plant_id": [1, 2] * 150,
+        "soil_moisture": [30.0, 31.0, 32.0, 29.0] * 75,
+        "temperature": 20.0})
+    df.loc[[101, 250], "soil_moisture"] = 60.0
+
+    chunks = [df.iloc[start:start + 37] for start in range(0, len(df), 37)]
+    streamed = get_anomalies_streaming(chunks)
+
+    expected = get_anomalies(df)
+    assert streamed["recording_taken"].tolist() == expected["recording_taken"].tolist()
+    assert streamed["plant_id"].tolist() == expected["plant_id"].tolist() == [2, 1]
+
+
+def test_get_artifacts_parquet_round_trip():
+    summary = pd.DataFrame({"plant_id": [2, 1]} |
+                           {f"{metric}_{stat}": [1.0, 2.0]
+                            for metric in ["soil_moisture", "temperature"]
+                            for stat in ["mean", "std", "min", "max"]})
+
+    artifacts = get_artifacts(summary, "summary", ["parquet", "csv"])
+    table = pq.read_table(BytesIO(artifacts["summary.parquet"]))
+
+    assert set(artifacts) == {"summary.parquet", "summary.csv"}
+    assert table.schema.metadata[b"schema_version"] == str(SCHEMA_VERSION).encode()
+    assert table.schema.field("plant_id").type == "int32"
+    assert table.column("plant_id").to_pylist() == [1, 2]
+
+
+def test_get_artifacts_by_plant():
+    summary = pd.DataFrame({"plant_id": [1, 2, 2]} |
+                           {f"{metric}_{stat}": 1.0
+                            for metric in ["soil_moisture", "temperature"]
+                            for stat in ["mean", "std", "min", "max"]})
+
+    artifacts = get_artifacts(summary, "summary", ["parquet"], by_plant=True)
+
+    assert set(artifacts) == {"summary/plant_id=1.parquet",
+                              "summary/plant_id=2.parquet"}
+    assert pq.read_table(BytesIO(artifacts["summary/plant_id=2.parquet"])).num_rows == 2
+
+
+def test_hourly_rollups_across_chunks():
+    times = pd.date_range("2024-04-17 10:30", periods=120, freq="min", tz="UTC")
+    df = pd.DataFrame({
+        "recording_taken": times,
+        "plant_id": 1,
+        "soil_moisture": [10.0, 12.0, 14.0, 16.0] * 30,
+        "temperature": 20.0,
+        "last_watered": times.floor("15min")})
+
+    rollups = HourlyRollups()
+    for start in range(0, len(df), 45):
+        rollups.add(df.iloc[start:start + 45])
+    hourly = rollups.result()
+
+    expected = df.groupby(df["recording_taken"].dt.floor("h"))["soil_moisture"]
+    assert hourly["soil_moisture_count"].tolist() == [30, 60, 30]
+    assert hourly["soil_moisture_std"].tolist() == pytest.approx(expected.std().tolist())
+    assert hourly["last_watered"].iloc[0] == pd.Timestamp("2024-04-17 10:45", tz="UTC")
+
+
+def test_compact_matches_readings():
+    times = pd.date_range("2024-04-17 22:00", periods=240, freq="min", tz="UTC")
+    df = pd.DataFrame({
+        "recording_taken": times,
+        "plant_id": [1, 2] * 120,
+        "soil_moisture": range(240),
+        "temperature": 20.0})
+
+    rollups = HourlyRollups()
+    rollups.add(df)
+    daily = compact(rollups.result(), "D")
+
+    expected = df.groupby(["plant_id", df["recording_taken"].dt.floor("D")])["soil_moisture"]
+    assert len(daily) == 4
+    assert daily["soil_moisture_mean"].tolist() == pytest.approx(expected.mean().tolist())
+    assert daily["soil_moisture_std"].tolist() == pytest.approx(expected.std().tolist())
+    assert compact(daily, "M")["soil_moisture_count"].tolist() == [120, 120]
+
+
+def test_compact_empty_rollups():
+    hourly = HourlyRollups().result()
+
+    daily = compact(hourly, "D")
+
+    assert daily.empty
+    assert list(daily.columns) == list(hourly.columns)
+    assert compact(daily, "M").empty
+    assert "daily.parquet" in get_artifacts(daily, "daily", ["parquet"])
+
+def test_get_data_chunks_until():
+    conn = MagicMock()
+    cur = conn.cursor.return_value.__enter__.return_value
+    cur.fetchmany.return_value = []
+
+    assert list(get_data_chunks(conn, until=datetime(2024, 4, 17))) == []
+    query, params = cur.execute.call_args.args
+    assert "WHERE recording_taken < %s" in query
+    assert params == (datetime(2024, 4, 17),)
+
+
+def test_delete_before_commits_each_batch():
+    conn = MagicMock()
+    cur = conn.cursor.return_value.__enter__.return_value
+    rowcounts = iter([3, 3, 1])
+    cur.execute.side_effect = lambda *args: setattr(cur, "rowcount", next(rowcounts))
+
+    deleted = delete_before(conn, datetime(2024, 4, 17), batch_size=3, pause=0)
+
+    assert deleted == 7
+    assert cur.execute.call_count == conn.commit.call_count == 3
+    assert "DELETE TOP (%s)" in cur.execute.call_args.args[0]
+
+
+def test_apply_retention_checks_archive():
+    conn = MagicMock()
+    cur = conn.cursor.return_value.__enter__.return_value
+    cur.fetchone.return_value = {"recordings": 5}
+    hourly = pd.DataFrame({
+        "bucket_start": pd.to_datetime(["2024-04-16 22:00", "2024-04-16 23:00"], utc=True),
+        "soil_moisture_count": [3, 1]})
+
+    with pytest.raises(ValueError):
+        apply_retention(conn, hourly, datetime(2024, 4, 17))
+    assert cur.execute.call_count == 1
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="late-ordovician")
+        yield s3
+
+
+def test_upload_artifacts(s3):
+    artifacts = {"summary.parquet": b"small", "hourly.parquet": b"x" * (9 * 1024 * 1024)}
+
+    checksums = upload_artifacts(s3, artifacts, date(2024, 4, 17))
+
+    assert set(checksums) == {"2024/04/17/summary.parquet", "2024/04/17/hourly.parquet"}
+    for key, filename in [("2024/04/17/summary.parquet", "summary.parquet"),
+                          ("2024/04/17/hourly.parquet", "hourly.parquet")]:
+        obj = s3.get_object(Bucket="late-ordovician", Key=key)
+        assert obj["Body"].read() == artifacts[filename]
+        assert obj["Metadata"]["sha256"] == checksums[key] == \
+            hashlib.sha256(artifacts[filename]).hexdigest()
+
+
+def test_get_month_rollups(s3):
+    daily = pd.DataFrame({"plant_id": [1], "soil_moisture_count": [60]})
+    for day in [1, 2]:
+        s3.put_object(Bucket="late-ordovician", Key=f"2024/04/0{day}/daily.parquet",
+                      Body=daily.to_parquet())
+    s3.put_object(Bucket="late-ordovician", Key="2024/05/01/daily.parquet",
+                  Body=daily.to_parquet())
+
+    assert len(get_month_rollups(s3, date(2024, 4, 30))) == 2
+
+
+def test_get_data_chunks_since():
+    conn = MagicMock()
+    cur = conn.cursor.return_value.__enter__.return_value
+    cur.fetchmany.return_value = []
+
+    list(get_data_chunks(conn, until=datetime(2024, 4, 17), since=datetime(2024, 4, 16)))
+    query, params = cur.execute.call_args.args
+    assert "WHERE recording_taken >= %s AND recording_taken < %s" in query
+    assert params == (datetime(2024, 4, 16), datetime(2024, 4, 17))
+
+
+def test_summarise_matches_readings():
+    times = pd.date_range("2024-04-17 10:30", periods=120, freq="min", tz="UTC")
+    df = pd.DataFrame({"recording_taken": times, "plant_id": [1, 2] * 60,
+                       "soil_moisture": [float(i % 7) for i in range(120)],
+                       "temperature": 20.0})
+    rollups = HourlyRollups()
+    rollups.add(df)
+
+    summary = summarise(rollups.result())
+
+    expected = df.groupby("plant_id")["soil_moisture"]
+    assert summary["soil_moisture_mean"].tolist() == pytest.approx(expected.mean().tolist())
+    assert summary["soil_moisture_std"].tolist() == pytest.approx(expected.std().tolist())
+    assert summary["soil_moisture_max"].tolist() == expected.max().tolist()
+
+
+def test_upload_atomic(s3):
+    checksums = upload_atomic(s3, {"summary.csv": b"plant_id"}, date(2024, 4, 17))
+
+    keys = [obj["Key"] for obj in s3.list_objects_v2(Bucket="late-ordovician")["Contents"]]
+    assert keys == ["2024/04/17/summary.csv"]
+    obj = s3.get_object(Bucket="late-ordovician", Key=keys[0])
+    assert obj["Metadata"]["sha256"] == checksums[keys[0]]
+
+
+def test_backfill_from_hourly_skips_up_to_date(s3, monkeypatch):
+    monkeypatch.setenv("AWS_KEY", "testing")
+    monkeypatch.setenv("AWS_SKEY", "testing")
+    times = pd.date_range("2024-04-16", periods=48, freq="h", tz="UTC")
+    df = pd.DataFrame({"recording_taken": times, "plant_id": 1,
+                       "soil_moisture": 10.0, "temperature": 20.0})
+    for day, part in df.groupby(df["recording_taken"].dt.date):
+        rollups = HourlyRollups()
+        rollups.add(part)
+        s3.put_object(Bucket="late-ordovician", Key=f"{day:%Y/%m/%d}/hourly.parquet",
+                      Body=get_artifacts(rollups.result(), "hourly", ["parquet"])["hourly.parquet"])
+    partitions = get_partitions(date(2024, 4, 16), date(2024, 4, 18))
+
+    first = backfill(partitions, "hourly", ["parquet"],
+                     executor=ThreadPoolExecutor(max_workers=2))
+    second = backfill(partitions, "hourly", ["parquet"],
+                      executor=ThreadPoolExecutor(max_workers=2))
+
+    assert [bool(first[partition]) for partition in partitions] == [True, True, False]
+    assert not any(second.values())
+    assert get_manifest(s3, date(2024, 4, 17))["source"] == "hourly"
+    summary = pd.read_parquet(BytesIO(s3.get_object(
+        Bucket="late-ordovician", Key="2024/04/17/summary.parquet")["Body"].read()))
+    assert summary["soil_moisture_mean"].tolist() == [10.0]
+    monthly = s3.get_object(Bucket="late-ordovician", Key="2024/04/monthly.parquet")
+    assert pd.read_parquet(BytesIO(monthly["Body"].read()))["soil_moisture_count"].tolist() == [48]
+
+
+def test_get_month_rollups_of_empty_days(s3):
+    empty = get_artifacts(compact(HourlyRollups().result(), "D"), "daily", ["parquet"])
+    s3.put_object(Bucket="late-ordovician", Key="2024/04/01/daily.parquet",
+                  Body=empty["daily.parquet"])
+
+    month_rollups = get_month_rollups(s3, date(2024, 4, 1))
+
+    assert month_rollups.empty
+    assert compact(month_rollups, "M").empty
+
+
+class FakeRecordings:
+    """Stands in for a connection to a database holding only s_beta.recording."""
+
+    def __init__(self, readings: list[tuple]):
+        self.readings = sorted(readings)
+        self.rows, self.rowcount = [], 0
+
+    def cursor(self, as_dict=True):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def commit(self):
+        pass
+
+    def execute(self, query, params=None):
+        if "recording_stats" in query:
+            self.rows = []
+        elif "DELETE TOP" in query:
+            batch_size, since, until = params
+            deleted = [r for r in self.readings if since <= r[0] < until][:batch_size]
+            self.readings = [r for r in self.readings if r not in deleted]
+            self.rowcount = len(deleted)
+        elif "MIN(recording_taken)" in query:
+            self.rows = [{"oldest": self.readings[0][0] if self.readings else None}]
+        elif "COUNT(*)" in query:
+            since, until = params
+            self.rows = [{"recordings": sum(since <= r[0] < until for r in self.readings)}]
+        else:
+            since, until = params
+            self.rows = [r for r in self.readings if since <= r[0] < until]
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+
+def get_readings(start: str, hours: int) -> list[tuple]:
+    return [(time.to_pydatetime(), plant_id, 20.0 + minute % 5, 15.0, None)
+            for minute, time in enumerate(pd.date_range(start, periods=hours * 60, freq="min"))
+            for plant_id in [1, 2]]
+
+
+def test_get_window_matches_midnight_run():
+    since, until = get_window(date(2024, 4, 18))
+
+    assert (since, until) == (datetime(2024, 4, 16), datetime(2024, 4, 17))
+
+
+def test_backfill_from_raw_matches_daily_run(s3, monkeypatch):
+    monkeypatch.setenv("AWS_KEY", "testing")
+    monkeypatch.setenv("AWS_SKEY", "testing")
+    readings = get_readings("2024-04-15 22:00", 52)
+    partition = date(2024, 4, 18)
+
+    daily = FakeRecordings(readings)
+    archive_partition(daily, s3, partition, ["parquet"])
+    daily_files = {key: s3.get_object(Bucket="late-ordovician", Key=key)["Body"].read()
+                   for key in ["2024/04/18/hourly.parquet", "2024/04/18/anomalies.parquet"]}
+
+    backfilled = FakeRecordings(readings)
+    monkeypatch.setattr(backfill_module, "get_db_connection", lambda config: backfilled)
+    backfill([partition], "raw", ["parquet"], force=True,
+             executor=ThreadPoolExecutor(max_workers=1))
+
+    for key, body in daily_files.items():
+        assert s3.get_object(Bucket="late-ordovician", Key=key)["Body"].read() == body
+    hourly = pd.read_parquet(BytesIO(daily_files["2024/04/18/hourly.parquet"]))
+    assert hourly["bucket_start"].min() == pd.Timestamp("2024-04-16", tz="UTC")
+    assert hourly["soil_moisture_count"].sum() == 2 * 24 * 60
+    assert backfilled.readings == daily.readings
+    assert not [r for r in daily.readings if datetime(2024, 4, 16) <= r[0] < datetime(2024, 4, 17)]
+
+
+def test_archive_pending_after_skipped_day(s3):
+    conn = FakeRecordings(get_readings("2024-04-15", 48))
+
+    partitions = archive_pending(conn, s3, date(2024, 4, 18), ["parquet"])
+
+    assert partitions == [date(2024, 4, 17), date(2024, 4, 18)]
+    for partition in partitions:
+        body = s3.get_object(Bucket="late-ordovician",
+                             Key=f"{partition:%Y/%m/%d}/hourly.parquet")["Body"].read()
+        hourly = pd.read_parquet(BytesIO(body))
+        assert hourly["bucket_start"].min().date() == partition - timedelta(days=2)
+        assert hourly["soil_moisture_count"].sum() == 2 * 24 * 60
+    assert conn.readings == []
+
+
+def test_archive_pending_without_readings(s3):
+    assert archive_pending(FakeRecordings([]), s3, date(2024, 4, 18)) == [date(2024, 4, 18)]
+
+
+def test_backfill_from_hourly_by_plant(s3, monkeypatch):
+    monkeypatch.setenv("AWS_KEY", "testing")
+    monkeypatch.setenv("AWS_SKEY", "testing")
+    rollups = HourlyRollups()
+    rollups.add(pd.DataFrame({
+        "recording_taken": pd.date_range("2024-04-15", periods=48, freq="h", tz="UTC"),
+        "plant_id": [1, 2] * 24, "soil_moisture": 10.0, "temperature": 20.0}))
+    for filename, body in get_artifacts(rollups.result(), "hourly", ["parquet"],
+                                        by_plant=True).items():
+        s3.put_object(Bucket="late-ordovician", Key=f"2024/04/17/{filename}", Body=body)
+
+    results = backfill([date(2024, 4, 17)], "hourly", ["parquet"], by_plant=True,
+                       executor=ThreadPoolExecutor(max_workers=1))
+
+    assert set(results[date(2024, 4, 17)]["files"]) >= {
+        "2024/04/17/daily.parquet", "2024/04/17/summary/plant_id=1.parquet",
+        "2024/04/17/hourly/plant_id=2.parquet"}
+    daily = pd.read_parquet(BytesIO(s3.get_object(
+        Bucket="late-ordovician", Key="2024/04/17/daily.parquet")["Body"].read()))
+    assert daily.groupby("plant_id")["soil_moisture_count"].sum().tolist() == [24, 24]
@@ -0,0 +1,146 @@
+"""
+Uploads serialised archive files to S3 straight from memory, several at a
+time, with multipart uploads for large files; each object carries a SHA-256
+checksum that S3 verifies on receipt and that is kept in its metadata.
+Partitions can be written atomically, staged under a temporary prefix and
+copied into place, then marked complete by a manifest
+"""
+
+# ========== IMPORTS ==========
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from hashlib import sha256
+from io import BytesIO
+import json
+from uuid import uuid4
+from botocore.exceptions import ClientError
+from boto3 import client
+from boto3.s3.transfer import TransferConfig
+from archive import PROCESSING_VERSION, SCHEMA_VERSION
+
+BUCKET = "late-ordovician"
+MAX_WORKERS = 4
+TEMP_PREFIX = "_tmp/"
+MANIFEST = "_manifest.json"
+# files larger than this are sent in parts of this size, several parts at once
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+TRANSFER_CONFIG = TransferConfig(multipart_threshold=MULTIPART_THRESHOLD,
+                                 multipart_chunksize=MULTIPART_THRESHOLD,
+                                 max_concurrency=MAX_WORKERS)
+
+
+# ========== FUNCTIONS ==========
+def get_key(partition: date, filename: str, prefix: str = "%Y/%m/%d/") -> str:
+    """Returns the S3 key of `filename` in the partition of date `partition`."""
+
+    return partition.strftime(prefix) + filename
+
+
+def upload_bytes(client: client, body: bytes, key: str,
+                 bucket: str = BUCKET) -> str:
+    """Uploads `body` to `key` from memory. Small files are sent in one
+    request, which S3 checks against the SHA-256 sent with it; large ones
+    are sent in parts.
+    Returns the hex SHA-256 of `body`."""
+
+    digest = sha256(body)
+    metadata = {"sha256": digest.hexdigest()}
+
+    if len(body) < MULTIPART_THRESHOLD:
+        client.put_object(Bucket=bucket, Key=key, Body=body, Metadata=metadata,
+                          ChecksumSHA256=b64encode(digest.digest()).decode())
+    else:
+        client.upload_fileobj(BytesIO(body), bucket, key,
+                              ExtraArgs={"Metadata": metadata,
+                                         "ChecksumAlgorithm": "SHA256"},
+                              Config=TRANSFER_CONFIG)
+
+    return digest.hexdigest()
+
+
+def upload_artifacts(client: client,
+                     artifacts: dict[str, bytes],
+                     partition: date,
+                     bucket: str = BUCKET,
+                     prefix: str = "%Y/%m/%d/",
+                     max_workers: int = MAX_WORKERS) -> dict[str, str]:
+    """Uploads serialised archive files under the prefix of the
+    `partition` date, `max_workers` at a time.
+    Returns {key: hex SHA-256}."""
+
+    keys = {get_key(partition, filename, prefix): body
+            for filename, body in artifacts.items()}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        checksums = executor.map(
+            lambda item: upload_bytes(client, item[1], item[0], bucket),
+            keys.items())
+        return dict(zip(keys, checksums))
+
+
+def upload_atomic(client: client,
+                  artifacts: dict[str, bytes],
+                  partition: date,
+                  bucket: str = BUCKET,
+                  prefix: str = "%Y/%m/%d/",
+                  max_workers: int = MAX_WORKERS) -> dict[str, str]:
+    """Uploads serialised archive files under a temporary prefix, then copies
+    each into place, so no reader ever sees a partly written file and a
+    failed run leaves the partition as it was.
+    Returns {key: hex SHA-256}."""
+
+    staging = f"{TEMP_PREFIX}{uuid4().hex}/"
+    staged = upload_artifacts(client, artifacts, partition, bucket,
+                              staging + prefix, max_workers)
+
+    def publish(temp_key: str) -> str:
+        key = temp_key.removeprefix(staging)
+        # a server-side copy, which keeps the metadata
+        client.copy_object(Bucket=bucket, Key=key, ChecksumAlgorithm="SHA256",
+                           CopySource={"Bucket": bucket, "Key": temp_key})
+        client.delete_object(Bucket=bucket, Key=temp_key)
+        return key
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        keys = list(executor.map(publish, staged))
+    return dict(zip(keys, staged.values()))
+
+
+def get_manifest(client: client,
+                 partition: date,
+                 bucket: str = BUCKET) -> dict | None:
+    """Returns the manifest of the `partition` date, or None if the
+    partition was never completely written."""
+
+    try:
+        body = client.get_object(Bucket=bucket,
+                                 Key=get_key(partition, MANIFEST))["Body"]
+    except ClientError as error:
+        if error.response["Error"]["Code"] == "NoSuchKey":
+            return None
+        raise
+
+    return json.loads(body.read())
+
+
+def put_manifest(client: client,
+                 partition: date,
+                 checksums: dict[str, str],
+                 source: str,
+                 bucket: str = BUCKET) -> dict:
+    """Writes the manifest of the `partition` date, once all its files are
+    in place, recording the files and how and when they were derived.
+    Returns the manifest."""
+
+    manifest = {"partition": partition.isoformat(),
+                "processing_version": PROCESSING_VERSION,
+                "schema_version": SCHEMA_VERSION,
+                "source": source,
+                "written_at": datetime.now(timezone.utc).isoformat(),
+                "files": checksums}
+    client.put_object(Bucket=bucket, Key=get_key(partition, MANIFEST),
+                      Body=json.dumps(manifest, indent=2).encode(),
+                      ContentType="application/json")
+
+    return manifest
@@ -0,0 +1,157 @@
+"""
+Benchmarks the per-recording loader against the bulk loader using an in-memory stand-in
+for the RDS database that charges a fixed latency for every round trip.
+
+Usage: python bench_load.py [plant_count ...]
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+
+from entities import Recording, Botanist, Origin, Plant, Image
+from cache import DimensionCache
+from load import upload_data, upload_data_bulk
+
+# Typical client <-> RDS round trip from Lambda in the same region
+ROUND_TRIP_SECONDS = 0.002
+
+
+class StandInCursor:
+    """Cursor that answers every statement as if all dimension rows already exist."""
+
+    def __init__(self, connection: StandInConnection):
+        self.connection = connection
+        self.rows = []
+        self.rowcount = 0
+        self.lastrowid = 1
+
+    def execute(self, sql: str, params=None) -> None:
+        """Records the statement and charges one round trip."""
+        self.connection.round_trip()
+        self.rows = self.connection.responder(sql, params)
+        self.rowcount = len(self.rows)
+
+    def fetchone(self) -> dict | None:
+        """Returns the first row of the last result."""
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self) -> list[dict]:
+        """Returns all rows of the last result."""
+        return self.rows
+
+
+class StandInConnection:
+    """Connection that counts round trips and commits."""
+
+    def __init__(self, responder):
+        self.responder = responder
+        self.round_trips = 0
+        self.commits = 0
+
+    def round_trip(self) -> None:
+        """Simulates the network latency of one request to the database."""
+        self.round_trips += 1
+        time.sleep(ROUND_TRIP_SECONDS)
+
+    def cursor(self) -> StandInCursor:
+        """Returns a new cursor."""
+        return StandInCursor(self)
+
+    def commit(self) -> None:
+        """Commits the open transaction."""
+        self.round_trip()
+        self.commits += 1
+
+    def close(self) -> None:
+        """Closes the connection."""
+
+
+def make_batch(plant_count: int) -> list[Recording]:
+    """Returns one minute of synthetic recordings for the given number of plants."""
+    botanists = [
+        Botanist(f"Name{i}", "Surname", f"botanist{i}@lnhm.co.uk", f"0{i}") for i in range(3)
+    ]
+
+    return [
+        Recording(
+            plant=Plant(
+                name=f"Plant {i}",
+                id=i,
+                origin=Origin(float(i % 40), float(-i % 40), "Place", "GB", "Europe/London"),
+            ),
+            recording_taken="2024-04-17 10:56:19",
+            last_watered="2024-04-16 14:03:04",
+            soil_moisture=27.2,
+            temperature=13.2,
+            botanist=botanists[i % len(botanists)],
+            image=Image(f"https://images/{i}.jpg", "CC", "https://licence", 45),
+        )
+        for i in range(plant_count)
+    ]
+
+
+def make_responder(batch: list[Recording]):
+    """Returns a function answering the loaders' queries for the given batch."""
+    origins = [
+        {"origin_id": 1, "longitude": item.plant.origin.longitude,
+         "latitude": item.plant.origin.latitude}
+        for item in batch
+    ]
+    images = [{"image_id": 1, "original_url": item.image.original_url} for item in batch]
+    botanists = [
+        {"botanist_id": 1, "email": item.botanist.email, "phone_number": item.botanist.phone,
+         "first_name": item.botanist.first_name, "last_name": item.botanist.last_name}
+        for item in batch
+    ]
+    plants = [{"plant_id": item.plant.id} for item in batch]
+    existing = {"origin_id": 1, "plant_id": 1, "image_id": 1, "botanist_id": 1}
+
+    def responder(sql: str, params) -> list[dict]:
+        if "INSERT INTO s_beta.recording" in sql:
+            return [
+                {"plant_id": params[i], "recording_taken": params[i + 1]}
+                for i in range(0, len(params), 7)
+            ]
+        if not sql.lstrip().startswith("SELECT"):
+            return []
+        if "WHERE" in sql:
+            return [existing]
+        if "s_beta.origin" in sql:
+            return origins
+        if "s_beta.plant" in sql:
+            return plants
+        if "s_beta.image" in sql:
+            return images
+        return botanists
+
+    return responder
+
+
+def run(loader, batch: list[Recording]) -> tuple[float, int, int]:
+    """Loads a batch with the given loader, returning seconds, round trips and commits."""
+    conn = StandInConnection(make_responder(batch))
+    start = time.perf_counter()
+    loader(batch, conn)
+
+    return time.perf_counter() - start, conn.round_trips, conn.commits
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [51, 500, 2000]
+
+    print(f"{'plants':>8} {'loader':>6} {'seconds':>9} {'round trips':>12} {'commits':>8}")
+    for count in counts:
+        data = make_batch(count)
+        warm = DimensionCache()
+        run(lambda batch, conn, cache=warm: upload_data_bulk(batch, conn, cache), data)
+
+        loaders = (
+            ("row", upload_data),
+            ("bulk", upload_data_bulk),
+            ("cached", lambda batch, conn, cache=warm: upload_data_bulk(batch, conn, cache)),
+        )
+        for name, load in loaders:
+            seconds, trips, commits = run(load, data)
+            print(f"{count:>8} {name:>6} {seconds:>9.3f} {trips:>12} {commits:>8}")
@@ -0,0 +1,81 @@
+"""
+Benchmarks `transform` against `transform_batch` on synthetic plant API payloads.
+
+Usage: python bench_transform.py [record_count ...]
+"""
+
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from transform import transform, transform_batch
+
+BOTANISTS = [
+    {"email": "carl.linnaeus@lnhm.co.uk", "name": "Carl Linnaeus", "phone": "(146)994-1635"},
+    {"email": "gertrude.jekyll@lnhm.co.uk", "name": "Gertrude Jekyll", "phone": "001-481-273-3691"},
+    {"email": "eliza.andrews@lnhm.co.uk", "name": "Eliza Andrews", "phone": "(846)669-6651"},
+]
+
+# Timings are the best of several runs, as single runs vary with garbage collection
+REPEAT = 5
+
+
+def make_payloads(count: int, plant_count: int = 51) -> list[dict]:
+    """Returns `count` API responses cycling through `plant_count` plants, one per minute."""
+    start = datetime(2024, 4, 17, 10, 0)
+    payloads = []
+
+    for i in range(count):
+        plant_id = i % plant_count
+        taken = start + timedelta(minutes=i // plant_count)
+        watered = taken - timedelta(hours=random.randint(1, 30), seconds=random.randint(0, 59))
+        payloads.append(
+            {
+                "botanist": BOTANISTS[plant_id % len(BOTANISTS)],
+                "images": {
+                    "license": 45,
+                    "license_name": "Attribution-ShareAlike 3.0 Unported (CC BY-SA 3.0)",
+                    "license_url": "https://creativecommons.org/licenses/by-sa/3.0/deed.en",
+                    "original_url": f"https://perenual.com/storage/species_image/{plant_id}.jpg",
+                },
+                "last_watered": watered.strftime("%a, %d %b %Y %H:%M:%S GMT"),
+                "name": f" plant {plant_id},",
+                "origin_location": [
+                    str(plant_id), str(-plant_id), "Resplendor", "BR", "America/Sao_Paulo"
+                ],
+                "plant_id": plant_id,
+                "recording_taken": taken.strftime("%Y-%m-%d %H:%M:%S"),
+                "scientific_name": [f"Epipremnum aureum{plant_id} 'Cultivar'"],
+                "soil_moisture": random.uniform(15, 35),
+                "temperature": random.uniform(10, 20),
+            }
+        )
+
+    return payloads
+
+
+def timed(function, payloads: list[dict], repeat: int = REPEAT) -> tuple[float, list]:
+    """
+    Returns the fewest seconds taken to run the function on the payloads over `repeat`
+    runs, and its output.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = function(payloads)
+        best = min(best, time.perf_counter() - start)
+
+    return best, output
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+
+    print(f"{'records':>9} {'transform':>10} {'batch':>8} {'speedup':>8}")
+    for record_count in counts:
+        data = make_payloads(record_count)
+        baseline, expected = timed(transform, data)
+        batched, actual = timed(transform_batch, data)
+        assert actual == expected
+        print(f"{record_count:>9} {baseline:>9.3f}s {batched:>7.3f}s {baseline / batched:>7.1f}x")
@@ -0,0 +1,79 @@
+"""
+In-process cache of dimension table keys. Instances created at module level survive across
+warm Lambda invocations, so dimension rows only need to be read from the database once per
+container.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Hashable
+
+DIMENSION_TABLES = ("origin", "plant", "image", "botanist")
+
+DEFAULT_MAX_SIZE = 10_000
+
+
+class LRUCache:
+    """Mapping of natural keys to surrogate keys, evicting the least recently used entry."""
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self._entries: OrderedDict[Hashable, int] = OrderedDict()
+
+    def get(self, key: Hashable) -> int | None:
+        """Returns the cached value for a key, or None if it is not cached."""
+        if key not in self._entries:
+            return None
+
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, key: Hashable, value: int) -> None:
+        """Caches a value, evicting the least recently used entry if the cache is full."""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def update(self, mapping: dict[Hashable, int]) -> None:
+        """Caches every entry in the mapping."""
+        for key, value in mapping.items():
+            self.put(key, value)
+
+    def clear(self) -> None:
+        """Removes every entry."""
+        self._entries.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DimensionCache:
+    """One LRU cache per dimension table, keyed on the natural keys used by the loader."""
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE):
+        self.tables = {table: LRUCache(max_size) for table in DIMENSION_TABLES}
+        self.prefilled = False
+
+    def __getitem__(self, table: str) -> LRUCache:
+        return self.tables[table]
+
+    def invalidate(self, table: str | None = None) -> None:
+        """
+        Clears the cached keys of one table, or of every table if none is given. Clearing
+        every table also causes the cache to be prefilled again on next use.
+        """
+        if table is None:
+            for cache in self.tables.values():
+                cache.clear()
+            self.prefilled = False
+        else:
+            self.tables[table].clear()
+
+
+DIMENSION_CACHE = DimensionCache()
@@ -0,0 +1,108 @@
+"""
+Drops recordings that have already been loaded, so that a retried invocation or an API
+response with an unchanged `recording_taken` does not insert the same reading twice. The
+keys loaded in the last few minutes are kept in memory across warm invocations and seeded
+from the database on cold start. The unique index on (plant_id, recording_taken) ignores
+any duplicate that still reaches the database, e.g. from two overlapping invocations.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from datetime import datetime, timedelta
+
+from pymssql import Cursor
+
+from entities import RecordingBatch
+
+# Readings older than this are never re-sent by the API, so their keys can be forgotten
+HORIZON_MINUTES = 10
+
+
+def recording_key(plant_id: int, recording_taken) -> tuple[int, str]:
+    """
+    Returns the natural key of a recording, with the timestamp in the API's format whether
+    it was read from a response or from the database.
+    """
+    return int(plant_id), str(recording_taken)[:19].replace("T", " ")
+
+
+class RecentKeys:
+    """Keys of the recordings loaded within the horizon of the newest one."""
+
+    def __init__(self, horizon_minutes: int = HORIZON_MINUTES):
+        self.horizon = timedelta(minutes=horizon_minutes)
+        self.keys: set[tuple[int, str]] = set()
+        self._order: deque[tuple[int, str]] = deque()
+        self.newest = ""
+        self.seeded = False
+
+    def __contains__(self, key: tuple[int, str]) -> bool:
+        return key in self.keys
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def seed(self, cursor: Cursor) -> None:
+        """Loads the keys of the recordings taken within the horizon from the database."""
+        cursor.execute(
+            """
+            SELECT plant_id, recording_taken
+            FROM s_beta.recording
+            WHERE recording_taken >= DATEADD(
+                minute, %s, (SELECT MAX(recording_taken) FROM s_beta.recording)
+            )
+            ORDER BY recording_taken;
+            """,
+            (-int(self.horizon.total_seconds() // 60),),
+        )
+        self.keys.clear()
+        self._order.clear()
+        self.newest = ""
+        self.add(
+            recording_key(row["plant_id"], row["recording_taken"])
+            for row in cursor.fetchall()
+        )
+
+        self.seeded = True
+
+    def add(self, keys) -> None:
+        """Remembers the given keys as loaded and forgets those past the horizon."""
+        for key in keys:
+            if key not in self.keys:
+                self.keys.add(key)
+                self._order.append(key)
+                self.newest = max(self.newest, key[1])
+
+        if not self.newest:
+            return
+
+        cutoff = str(datetime.fromisoformat(self.newest) - self.horizon)
+        while self._order and self._order[0][1] < cutoff:
+            self.keys.discard(self._order.popleft())
+
+    def new_only(self, batch: RecordingBatch) -> tuple[RecordingBatch, int]:
+        """
+        Returns the batch without recordings already loaded or repeated within the batch,
+        and the number of recordings dropped.
+        """
+        seen = set()
+        kept = []
+        for index, key in enumerate(
+            map(recording_key, batch.plant_ids, batch.recording_taken)
+        ):
+            if key not in self.keys and key not in seen:
+                seen.add(key)
+                kept.append(index)
+
+        if len(kept) == len(batch):
+            return batch, 0
+
+        return batch.select(kept), len(batch) - len(kept)
+
+    def mark_loaded(self, batch: RecordingBatch) -> None:
+        """Remembers every recording in a batch that has been committed."""
+        self.add(map(recording_key, batch.plant_ids, batch.recording_taken))
+
+
+RECENT_KEYS = RecentKeys()
@@ -0,0 +1,174 @@
+"""
+Near-real-time anomaly detection in the minute pipeline. Every plant's baseline (mean and
+standard deviation of each metric over the last day) is read from s_beta.recording_stats
+and cached across warm invocations, so each new reading is scored with a dictionary lookup
+as it is loaded. Anomalous readings are written to s_beta.anomaly and, if a queue is
+configured, sent to SQS for notification within a minute of being taken.
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from math import isnan, sqrt
+
+from pymssql import Connection, Cursor
+
+from entities import RecordingBatch
+from load import chunks, values_clause
+
+METRICS = ("soil_moisture", "temperature")
+
+# Readings further than this many standard deviations from their plant's mean are anomalous
+THRESHOLD = 2.5
+BASELINE_WINDOW = timedelta(hours=24)
+# Baselines move slowly, so they are only re-read from the statistics store this often
+BASELINE_TTL = timedelta(minutes=15)
+# Most messages SQS accepts in one SendMessageBatch call
+QUEUE_BATCH_SIZE = 10
+
+
+@dataclass
+class Anomaly:
+    """A reading too far from its plant's baseline."""
+
+    plant_id: int
+    recording_taken: str
+    metric: str
+    value: float
+    mean: float
+    std: float
+    z_score: float
+
+
+class AnomalyDetector:
+    """Per-plant baselines of every metric, held for the life of the container."""
+
+    def __init__(self, threshold: float = THRESHOLD, ttl: timedelta = BASELINE_TTL):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.baselines: dict[tuple[int, str], tuple[float, float]] = {}
+        self.refreshed_at: datetime | None = None
+
+    def stale(self, now: datetime) -> bool:
+        """Returns True if the baselines have not been read within the TTL of `now`."""
+        return self.refreshed_at is None or now - self.refreshed_at >= self.ttl
+
+    def refresh(self, cursor: Cursor, now: datetime) -> None:
+        """
+        Replaces the baselines with the mean and sample standard deviation of each plant's
+        readings per metric since `BASELINE_WINDOW` before `now`, combined in one query
+        from the hourly statistics.
+        """
+        since = (now - BASELINE_WINDOW).replace(minute=0, second=0, microsecond=0)
+        cursor.execute(
+            """
+            SELECT plant_id, metric,
+                SUM(reading_count) AS reading_count,
+                SUM(reading_count * mean) AS total,
+                SUM(m2 + reading_count * mean * mean) AS total_squares
+            FROM s_beta.recording_stats
+            WHERE bucket_start >= %s
+            GROUP BY plant_id, metric;
+            """,
+            (since,),
+        )
+        self.baselines.clear()
+        for row in cursor.fetchall():
+            count = row["reading_count"]
+            if count < 2:
+                continue
+            mean = row["total"] / count
+            variance = (row["total_squares"] - count * mean * mean) / (count - 1)
+            if variance > 0:
+                self.baselines[(row["plant_id"], row["metric"])] = (mean, sqrt(variance))
+
+        self.refreshed_at = now
+
+    def score(self, batch: RecordingBatch) -> list[Anomaly]:
+        """
+        Returns the readings in the batch further than the threshold from their plant's
+        baseline, one metric column at a time. Plants without a baseline are not scored.
+        """
+        anomalies = []
+        for metric in METRICS:
+            column = getattr(batch, metric)
+            for index, (plant_id, value) in enumerate(zip(batch.plant_ids, column)):
+                baseline = self.baselines.get((plant_id, metric))
+                if baseline is None or isnan(value):
+                    continue
+                mean, std = baseline
+                z_score = (value - mean) / std
+                if abs(z_score) > self.threshold:
+                    anomalies.append(
+                        Anomaly(plant_id, batch.recording_taken[index], metric, value,
+                                mean, std, z_score)
+                    )
+
+        return anomalies
+
+
+def insert_anomalies(cursor: Cursor, anomalies: list[Anomaly]) -> None:
+    """
+    Inserts anomalies into s_beta.anomaly using one multi-row INSERT per 1000 rows. The
+    unique index on (plant_id, recording_taken, metric) ignores any already recorded.
+    """
+    rows = [
+        (a.plant_id, a.recording_taken, a.metric, a.value, a.mean, a.std, a.z_score)
+        for a in anomalies
+    ]
+    for chunk in chunks(rows):
+        values, params = values_clause(chunk)
+        cursor.execute(
+            f"""
+            INSERT INTO s_beta.anomaly
+                ("plant_id", "recording_taken", "metric", "value", "mean", "std", "z_score")
+            VALUES
+                {values};
+            """,
+            params,
+        )
+
+
+def enqueue_anomalies(queue, queue_url: str, anomalies: list[Anomaly]) -> int:
+    """
+    Sends one message per anomaly to an SQS queue, ten to a request. Returns the number of
+    messages SQS did not accept.
+    """
+    failed = 0
+    for chunk in chunks(anomalies, QUEUE_BATCH_SIZE):
+        response = queue.send_message_batch(
+            QueueUrl=queue_url,
+            Entries=[
+                {"Id": str(index), "MessageBody": json.dumps(asdict(anomaly))}
+                for index, anomaly in enumerate(chunk)
+            ],
+        )
+        failed += len(response.get("Failed", []))
+
+    return failed
+
+
+def record_anomalies(conn: Connection, anomalies: list[Anomaly]) -> None:
+    """Writes the anomalies found in a loaded batch to the anomaly table and commits."""
+    if not anomalies:
+        return
+
+    insert_anomalies(conn.cursor(), anomalies)
+    conn.commit()
+
+
+def summarise_anomalies(anomalies: list[Anomaly]) -> str:
+    """Returns a one-line summary of anomalies for logging."""
+    if not anomalies:
+        return "No anomalies."
+
+    return f"{len(anomalies)} anomalies: " + ", ".join(
+        f"plant {anomaly.plant_id} {anomaly.metric}={anomaly.value:.2f} "
+        f"({anomaly.z_score:+.1f} standard deviations)"
+        for anomaly in anomalies
+    )
+
+
+ANOMALY_DETECTOR = AnomalyDetector()
@@ -1,8 +1,12 @@
-from dataclasses import dataclass
-from typing import Optional
+from __future__ import annotations
 
+from array import array
+from dataclasses import dataclass, field
+from math import isnan
+from typing import Generic, Iterable, Iterator, Optional, TypeVar
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class Botanist:
     first_name: str
     last_name: str
@@ -10,7 +14,7 @@ class Botanist:
     phone: str
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Image:
     original_url: str
     license_name: str
@@ -18,7 +22,7 @@ class Image:
     license: int
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Origin:
     longitude: float
     latitude: float
@@ -27,7 +31,7 @@ class Origin:
     timezone: str
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Plant:
     name: str
     id: int
@@ -35,7 +39,7 @@ class Plant:
     scientific_name: Optional[str] = None
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Recording:
     plant: Plant
     recording_taken: str
@@ -44,3 +48,116 @@ class Recording:
     temperature: float
     botanist: Botanist
     image: Optional[Image] = None
+
+
+T = TypeVar("T")
+
+
+class Interner(Generic[T]):
+    """
+    Factory returning one shared instance per distinct set of field values, so that the
+    same botanist or origin seen across plants and minutes is only allocated once. Takes
+    the entity's fields positionally, in declaration order.
+    """
+
+    def __init__(self, entity: type[T], max_size: int = 10_000):
+        self.entity = entity
+        self.max_size = max_size
+        self._instances: dict[tuple, T] = {}
+
+    def __call__(self, *values) -> T:
+        instance = self._instances.get(values)
+        if instance is None:
+            if len(self._instances) >= self.max_size:
+                self._instances.clear()
+            instance = self._instances[values] = self.entity(*values)
+
+        return instance
+
+    def __len__(self) -> int:
+        return len(self._instances)
+
+
+BOTANISTS = Interner(Botanist)
+IMAGES = Interner(Image)
+ORIGINS = Interner(Origin)
+PLANTS = Interner(Plant)
+
+
+@dataclass
+class RecordingBatch:
+    """
+    Column-oriented batch of recordings. Numeric columns are stored in typed arrays, with
+    NaN standing in for missing readings, and dimension columns hold references to shared
+    entity instances.
+    """
+
+    plant_ids: array = field(default_factory=lambda: array("q"))
+    recording_taken: list[str] = field(default_factory=list)
+    last_watered: list[Optional[str]] = field(default_factory=list)
+    soil_moisture: array = field(default_factory=lambda: array("d"))
+    temperature: array = field(default_factory=lambda: array("d"))
+    plants: list[Plant] = field(default_factory=list)
+    botanists: list[Botanist] = field(default_factory=list)
+    images: list[Optional[Image]] = field(default_factory=list)
+
+    @classmethod
+    def from_recordings(cls, recordings: Iterable[Recording]) -> RecordingBatch:
+        """Returns a batch holding the given recordings."""
+        batch = cls()
+        for recording in recordings:
+            batch.append(recording)
+
+        return batch
+
+    def append(self, recording: Recording) -> None:
+        """Adds a recording to the end of the batch."""
+        self.plant_ids.append(recording.plant.id)
+        self.recording_taken.append(recording.recording_taken)
+        self.last_watered.append(recording.last_watered)
+        self.soil_moisture.append(
+            float("nan") if recording.soil_moisture is None else recording.soil_moisture
+        )
+        self.temperature.append(
+            float("nan") if recording.temperature is None else recording.temperature
+        )
+        self.plants.append(recording.plant)
+        self.botanists.append(recording.botanist)
+        self.images.append(recording.image)
+
+    def select(self, indices: Iterable[int]) -> RecordingBatch:
+        """Returns a new batch holding only the recordings at the given positions."""
+        indices = list(indices)
+
+        return RecordingBatch(
+            plant_ids=array("q", [self.plant_ids[i] for i in indices]),
+            recording_taken=[self.recording_taken[i] for i in indices],
+            last_watered=[self.last_watered[i] for i in indices],
+            soil_moisture=array("d", [self.soil_moisture[i] for i in indices]),
+            temperature=array("d", [self.temperature[i] for i in indices]),
+            plants=[self.plants[i] for i in indices],
+            botanists=[self.botanists[i] for i in indices],
+            images=[self.images[i] for i in indices],
+        )
+
+    def __len__(self) -> int:
+        return len(self.plant_ids)
+
+    def __getitem__(self, index: int) -> Recording:
+        return Recording(
+            plant=self.plants[index],
+            recording_taken=self.recording_taken[index],
+            last_watered=self.last_watered[index],
+            soil_moisture=nan_to_none(self.soil_moisture[index]),
+            temperature=nan_to_none(self.temperature[index]),
+            botanist=self.botanists[index],
+            image=self.images[index],
+        )
+
+    def __iter__(self) -> Iterator[Recording]:
+        return (self[index] for index in range(len(self)))
+
+
+def nan_to_none(value: float) -> Optional[float]:
+    """Returns None in place of NaN, which marks a missing reading in a batch column."""
+    return None if isnan(value) else value
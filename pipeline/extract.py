@@ -1,23 +1,197 @@
 """Script containing functions for pulling data from the Plants API asynchronously. """
 
+from __future__ import annotations
+
 import asyncio
+import random
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
 
 import aiohttp
 
+# The pipeline runs every minute, so the whole extract must finish well within that
+CONCURRENCY_LIMIT = 20
+REQUEST_TIMEOUT = 5
+OVERALL_TIMEOUT = 30
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.25
+DNS_CACHE_SECONDS = 300
+KEEPALIVE_SECONDS = 30
+
+
+@dataclass
+class FetchResult:
+    """The outcome of fetching one endpoint, including failed attempts and timing."""
+
+    url: str
+    data: dict | None = None
+    status: int | None = None
+    attempts: int = 0
+    elapsed: float = 0.0
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        """Returns True if the endpoint returned data."""
+        return self.data is not None
+
+
+def is_retryable(status: int) -> bool:
+    """Returns True if a response status indicates the request may succeed if repeated."""
+    return status >= 500 or status == 429
+
+
+def backoff(attempt: int) -> float:
+    """Returns the delay before the given retry, doubling each time with full jitter."""
+    return random.uniform(0, BACKOFF_BASE * 2 ** (attempt - 1))
+
+
+async def fetch_json(
+    session: aiohttp.ClientSession,
+    url: str,
+    semaphore: asyncio.Semaphore,
+    deadline: float,
+    request_timeout: float = REQUEST_TIMEOUT,
+    max_retries: int = MAX_RETRIES,
+) -> FetchResult:
+    """
+    Makes an asynchronous call to an API using the provided endpoint. Server errors,
+    connection errors and timeouts are retried with exponential backoff until the
+    retries or the time before `deadline` (an event loop time) run out.
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    result = FetchResult(url)
+
+    while result.attempts <= max_retries:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            result.error = "Deadline exceeded"
+            break
+
+        try:
+            async with semaphore:
+                # Timed once a slot is free, so waiting in the queue does not use up the timeout
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    result.error = "Deadline exceeded"
+                    break
+
+                result.attempts += 1
+                timeout = aiohttp.ClientTimeout(total=min(request_timeout, remaining))
+                async with session.get(url, timeout=timeout) as response:
+                    result.status = response.status
+                    if not is_retryable(response.status):
+                        response.raise_for_status()
+                        result.data = await response.json()
+                        result.error = None
+                        break
+                    result.error = f"Server error {response.status}"
+        except (aiohttp.ContentTypeError, ValueError):
+            # Subclass of ClientResponseError, so caught first: the response was not JSON
+            result.error = f"Invalid payload from status {result.status}"
+            break
+        except aiohttp.ClientResponseError as e:
+            result.error = f"Client error {e.status}"
+            break
+        except asyncio.TimeoutError:
+            result.error = "Timed out"
+        except aiohttp.ClientError as e:
+            result.error = f"An error occurred: {e}"
+
+        if result.attempts <= max_retries:
+            await asyncio.sleep(min(backoff(result.attempts), max(deadline - loop.time(), 0)))
+
+    result.elapsed = loop.time() - start
+
+    return result
+
+
+def open_session(concurrency: int) -> aiohttp.ClientSession:
+    """Returns a session whose keep-alive connection pool matches the concurrency limit."""
+    connector = aiohttp.TCPConnector(
+        limit=concurrency,
+        ttl_dns_cache=DNS_CACHE_SECONDS,
+        keepalive_timeout=KEEPALIVE_SECONDS,
+    )
+
+    return aiohttp.ClientSession(connector=connector)
+
+
+async def fetch_results(
+    urls: list[str],
+    concurrency: int = CONCURRENCY_LIMIT,
+    request_timeout: float = REQUEST_TIMEOUT,
+    overall_timeout: float = OVERALL_TIMEOUT,
+    max_retries: int = MAX_RETRIES,
+) -> list[FetchResult]:
+    """
+    Fetches the provided endpoint URLs asynchronously with at most `concurrency` requests
+    in flight, returning a result for every URL in the same order.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    deadline = asyncio.get_running_loop().time() + overall_timeout
+
+    async with open_session(concurrency) as session:
+        tasks = [
+            fetch_json(session, url, semaphore, deadline, request_timeout, max_retries)
+            for url in urls
+        ]
+        return await asyncio.gather(*tasks)
+
+
+async def iter_results(
+    urls: list[str],
+    concurrency: int = CONCURRENCY_LIMIT,
+    request_timeout: float = REQUEST_TIMEOUT,
+    overall_timeout: float = OVERALL_TIMEOUT,
+    max_retries: int = MAX_RETRIES,
+) -> AsyncIterator[FetchResult]:
+    """
+    Fetches the provided endpoint URLs like `fetch_results`, but yields each result as soon
+    as its request completes.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    deadline = asyncio.get_running_loop().time() + overall_timeout
+
+    async with open_session(concurrency) as session:
+        tasks = [
+            asyncio.ensure_future(
+                fetch_json(session, url, semaphore, deadline, request_timeout, max_retries)
+            )
+            for url in urls
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+async def fetch_data_from_endpoints(urls: list[str], **kwargs) -> list[dict | None]:
+    """
+    Returns data from the provided endpoint URLs, with None for any endpoint that could
+    not be fetched. Calls to the API are asynchronous.
+    """
+    results = await fetch_results(urls, **kwargs)
+
+    return [result.data for result in results]
+
 
-async def fetch_json(session, url):
-    """Makes an asynchronous call to an API using the provided endpoint."""
-    try:
-        async with session.get(url) as response:
-            response.raise_for_status()
-            return await response.json()
-    except aiohttp.ClientError as e:
-        print(f"An error occurred: {e}")
+def summarise_results(results: list[FetchResult]) -> str:
+    """Returns a one-line summary of fetch results for logging."""
+    failed = [result for result in results if not result.ok]
+    slowest = max((result.elapsed for result in results), default=0.0)
+    retried = sum(result.attempts > 1 for result in results)
 
+    summary = (
+        f"Fetched {len(results) - len(failed)}/{len(results)} endpoints "
+        f"({retried} retried, slowest {slowest:.2f}s)."
+    )
+    if failed:
+        summary += " Failed: " + ", ".join(
+            f"{result.url} ({result.error})" for result in failed
+        )
 
-async def fetch_data_from_endpoints(urls: list[str]):
-    """Returns data from the provided endpoint URLs. Calls to the API are asynchronous."""
-    async with aiohttp.ClientSession() as session:
-        tasks = [fetch_json(session, url) for url in urls]
-        responses = await asyncio.gather(*tasks, return_exceptions=True)
-        return responses
+    return summary
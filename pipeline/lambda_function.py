@@ -1,12 +1,23 @@
 import asyncio
+from datetime import datetime, timezone
 from os import environ as ENV
 
+from boto3 import client
 from dotenv import load_dotenv
-from pymssql import connect
 
-from extract import fetch_data_from_endpoints
-from load import upload_data
-from transform import transform
+from cache import DIMENSION_CACHE
+from connection import get_pool
+from dedup import RECENT_KEYS
+from detector import ANOMALY_DETECTOR, enqueue_anomalies, record_anomalies, summarise_anomalies
+from extract import fetch_results, summarise_results
+from entities import RecordingBatch
+from last_seen import update_last_seen
+from load import upload_data, upload_data_bulk
+from outliers import OUTLIER_FILTER, summarise_outliers
+from registry import PLANT_REGISTRY
+from stats import update_stats
+from stream import run_stream
+from transform import transform_batch
 
 load_dotenv()
 
@@ -17,24 +28,98 @@ DB_USER = ENV["DB_USER"]
 DB_PORT = ENV["DB_PORT"]
 DB_PASSWORD = ENV["DB_PASSWORD"]
 
+# "bulk" loads each minute with set-based statements; "row" uses the per-recording loader
+LOAD_MODE = ENV.get("LOAD_MODE", "bulk")
+# "batch" extracts, transforms and loads in turn; "stream" loads recordings as responses arrive
+PIPELINE_MODE = ENV.get("PIPELINE_MODE", "batch")
+# "reject" drops invalid readings before loading them; "flag" only logs them
+OUTLIER_MODE = ENV.get("OUTLIER_MODE", "reject")
+# "detect" scores each loaded recording against its plant's baseline; "off" skips this
+ANOMALY_MODE = ENV.get("ANOMALY_MODE", "off")
+# SQS queue that anomalies found by the pipeline are sent to for notification, if any
+ANOMALY_QUEUE_URL = ENV.get("ANOMALY_QUEUE_URL")
+
+PLANTS_API_URL = "https://data-eng-plants-api.herokuapp.com/plants/{}"
+
+
+def load(batch: RecordingBatch, conn) -> None:
+    """
+    Validates a batch of recordings, uploads those not already loaded and adds those
+    inserted to the statistics store and last-seen index, all in one transaction. If
+    detection is on, anomalous readings are recorded and queued.
+    """
+    batch, duplicates = RECENT_KEYS.new_only(batch)
+    if duplicates:
+        print(f"Skipped {duplicates} recordings already loaded.")
+
+    batch, outliers = OUTLIER_FILTER.apply(batch, reject=OUTLIER_MODE == "reject")
+    if outliers:
+        print(summarise_outliers(outliers))
+
+    anomalies = ANOMALY_DETECTOR.score(batch) if ANOMALY_MODE == "detect" else []
+
+    upload = upload_data if LOAD_MODE == "row" else upload_data_bulk
+    try:
+        # Duplicates the unique index ignored are left out of the stats, and the stats and
+        # last-seen index are only ever committed with the recordings they describe
+        inserted = upload(batch, conn, DIMENSION_CACHE, commit=False)
+        update_stats(conn, inserted, commit=False)
+        update_last_seen(conn, inserted, commit=False)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        DIMENSION_CACHE.invalidate()
+        raise
+
+    RECENT_KEYS.mark_loaded(batch)
+
+    if anomalies:
+        print(summarise_anomalies(anomalies))
+        record_anomalies(conn, anomalies)
+        if ANOMALY_QUEUE_URL:
+            failed = enqueue_anomalies(client("sqs"), ANOMALY_QUEUE_URL, anomalies)
+            if failed:
+                print(f"Could not queue {failed} anomaly notifications.")
+
 
 async def main():
-    conn = connect(
-        server=ENV["DB_HOST"],
-        user=ENV["DB_USER"],
-        password=ENV["DB_PASSWORD"],
-        database=ENV["DB_NAME"],
-        port=ENV["DB_PORT"],
-        as_dict=True,
-    )
+    # The pool lives at module level, so warm invocations reuse the open connection
+    pool = get_pool(ENV)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    # State kept across warm invocations is read from the database on cold start
+    if not (PLANT_REGISTRY.loaded and OUTLIER_FILTER.restored and RECENT_KEYS.seeded):
+        with pool.connection() as conn:
+            PLANT_REGISTRY.load(conn.cursor())
+            OUTLIER_FILTER.restore(conn.cursor())
+            RECENT_KEYS.seed(conn.cursor())
+
+    if ANOMALY_MODE == "detect" and ANOMALY_DETECTOR.stale(now):
+        with pool.connection() as conn:
+            ANOMALY_DETECTOR.refresh(conn.cursor(), now)
+
+    plant_ids = {
+        PLANTS_API_URL.format(plant_id): plant_id
+        for plant_id in PLANT_REGISTRY.ids_to_fetch(now)
+    }
+
+    with pool.connection() as conn:
+        if PIPELINE_MODE == "stream":
+            results = await run_stream(list(plant_ids), lambda batch: load(batch, conn))
+        else:
+            results = await fetch_results(list(plant_ids))
+
+            transform_data = transform_batch([result.data for result in results])
 
-    urls = [f"https://data-eng-plants-api.herokuapp.com/plants/{i}" for i in range(51)]
+            load(RecordingBatch.from_recordings(transform_data), conn)
 
-    extract_data = await fetch_data_from_endpoints(urls)
+        print(summarise_results(results))
 
-    transform_data = transform(extract_data)
+        for result in results:
+            PLANT_REGISTRY.record(plant_ids[result.url], result.status, now)
 
-    upload_data(transform_data, conn)
+        PLANT_REGISTRY.save(conn.cursor())
+        conn.commit()
 
 
 def handler(event, context):
@@ -0,0 +1,73 @@
+"""
+Index of when each plant last reported, kept in s_beta.plant_last_seen with one row per
+plant, so that the health check finds plants that have stopped reporting with an
+O(plants) lookup rather than by scanning recordings. When a plant reports again after a
+gap, the gap is recorded in s_beta.reading_gap to keep a history of outages per plant.
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+
+from pymssql import Connection, Cursor
+
+from entities import RecordingBatch
+from load import chunks, values_clause
+
+# Readings arrive every minute, so a longer silence than this is a gap
+GAP_THRESHOLD = timedelta(minutes=5)
+
+
+def latest_readings(batch: RecordingBatch) -> dict[int, str]:
+    """Returns the time of each plant's newest recording in the batch."""
+    latest: dict[int, str] = {}
+    for plant_id, taken in zip(batch.plant_ids, batch.recording_taken):
+        if taken > latest.get(plant_id, ""):
+            latest[plant_id] = taken
+
+    return latest
+
+
+def merge_last_seen(cursor: Cursor, latest: dict[int, str]) -> None:
+    """
+    Records the gaps longer than `GAP_THRESHOLD` that the new readings close, then moves
+    each plant's last-seen time forward. Uses one INSERT and one MERGE per 1000 plants.
+    """
+    rows = list(latest.items())
+
+    for chunk in chunks(rows):
+        values, params = values_clause(chunk)
+        cursor.execute(
+            f"""
+            INSERT INTO s_beta.reading_gap ("plant_id", "gap_start", "gap_end")
+            SELECT target.plant_id, target.last_seen, source.last_seen
+            FROM s_beta.plant_last_seen AS target
+            JOIN (VALUES {values}) AS source ("plant_id", "last_seen")
+                ON target.plant_id = source.plant_id
+            WHERE DATEDIFF(second, target.last_seen, source.last_seen) > %s;
+
+            MERGE s_beta.plant_last_seen AS target
+            USING (VALUES {values}) AS source ("plant_id", "last_seen")
+            ON target.plant_id = source.plant_id
+            WHEN MATCHED AND source.last_seen > target.last_seen THEN
+                UPDATE SET last_seen = source.last_seen
+            WHEN NOT MATCHED THEN
+                INSERT ("plant_id", "last_seen")
+                VALUES (source.plant_id, source.last_seen);
+            """,
+            params + (int(GAP_THRESHOLD.total_seconds()),) + params,
+        )
+
+
+def update_last_seen(conn: Connection, batch: RecordingBatch, commit: bool = True) -> None:
+    """
+    Moves the last-seen times of the plants in a loaded batch forward and commits, unless
+    `commit` is False and the caller commits it with the recordings.
+    """
+    latest = latest_readings(batch)
+    if not latest:
+        return
+
+    merge_last_seen(conn.cursor(), latest)
+    if commit:
+        conn.commit()
@@ -4,39 +4,72 @@ from __future__ import annotations
 
 from pymssql import Connection, Cursor
 
-from entities import Recording, Origin, Plant, Image, Botanist
-
-
-def upload_data(data: list[Recording], conn: Connection) -> None:
+from cache import DimensionCache, LRUCache
+from dedup import recording_key
+from entities import (
+    Recording,
+    RecordingBatch,
+    Origin,
+    Plant,
+    Image,
+    Botanist,
+    nan_to_none,
+)
+
+
+def upload_data(
+    data: list[Recording] | RecordingBatch,
+    conn: Connection,
+    cache: DimensionCache | None = None,
+    commit: bool = True,
+) -> RecordingBatch:
     """
     Uploads transformed data to the specified database. Tries to obtain the keys of
-    existing entities in the database; if it does not exist, uploads the entity.
+    existing entities from the cache, if given, and then the database; if it does not
+    exist, uploads the entity. The batch is committed once, unless `commit` is False and
+    the caller commits it with other writes.
+
+    Returns the recordings actually inserted, without those the unique index ignored.
     """
+    batch = data if isinstance(data, RecordingBatch) else RecordingBatch.from_recordings(data)
     cursor = conn.cursor()
+    cache = cache if cache is not None else DimensionCache()
+    inserted = []
 
-    for item in data:
-        origin_id = get_origin_id(cursor, item.plant.origin)
+    for index, item in enumerate(batch):
+        key = origin_key(item.plant.origin)
+        origin_id = cache["origin"].get(key) or get_origin_id(cursor, item.plant.origin)
         if origin_id is None:
-            origin_id = upload_origin(conn, cursor, item.plant.origin)
+            origin_id = upload_origin(cursor, item.plant.origin)
+        cache["origin"].put(key, origin_id)
 
-        plant_id = get_plant_id(cursor, item.plant)
-        if plant_id is None:
-            upload_plant(conn, cursor, item.plant, origin_id)
+        if item.plant.id not in cache["plant"]:
+            if get_plant_id(cursor, item.plant) is None:
+                upload_plant(cursor, item.plant, origin_id)
+            cache["plant"].put(item.plant.id, item.plant.id)
 
         if item.image:
-            image_id = get_image_id(cursor, item.image)
+            key = item.image.original_url
+            image_id = cache["image"].get(key) or get_image_id(cursor, item.image)
             if image_id is None:
-                image_id = upload_image(conn, cursor, item.image)
+                image_id = upload_image(cursor, item.image)
+            cache["image"].put(key, image_id)
         else:
             image_id = None
 
-        botanist_id = get_botanist_id(cursor, item.botanist)
+        key = botanist_key(item.botanist)
+        botanist_id = cache["botanist"].get(key) or get_botanist_id(cursor, item.botanist)
         if botanist_id is None:
-            botanist_id = upload_botanist(conn, cursor, item.botanist)
+            botanist_id = upload_botanist(cursor, item.botanist)
+        cache["botanist"].put(key, botanist_id)
 
-        upload_recording(conn, item, item.plant.id, image_id, botanist_id)
+        if upload_recording(cursor, item, item.plant.id, image_id, botanist_id):
+            inserted.append(index)
 
-    conn.close()
+    if commit:
+        conn.commit()
+
+    return batch.select(inserted)
 
 
 def get_origin_id(cursor: Cursor, origin: Origin) -> int | None:
@@ -59,7 +92,7 @@ def get_origin_id(cursor: Cursor, origin: Origin) -> int | None:
     return res["origin_id"] if res else None
 
 
-def upload_origin(conn: Connection, cursor: Cursor, origin: Origin) -> int:
+def upload_origin(cursor: Cursor, origin: Origin) -> int:
     """Uploads an origin object to the database, returning the new ID of the uploaded entity."""
     sql = """
                 INSERT INTO s_beta.origin
@@ -78,8 +111,6 @@ def upload_origin(conn: Connection, cursor: Cursor, origin: Origin) -> int:
 
     cursor.execute(sql, params)
 
-    conn.commit()
-
     return int(cursor.lastrowid)
 
 
@@ -102,9 +133,7 @@ def get_plant_id(cursor: Cursor, plant: Plant) -> int | None:
     return res["plant_id"] if res else None
 
 
-def upload_plant(
-    conn: Connection, cursor: Cursor, plant: Plant, origin_id: int
-) -> None:
+def upload_plant(cursor: Cursor, plant: Plant, origin_id: int) -> None:
     """Uploads a plant object to the database, returning the new ID of the uploaded entity."""
     sql = """
         INSERT INTO s_beta.plant
@@ -117,8 +146,6 @@ def upload_plant(
 
     cursor.execute(sql, params)
 
-    conn.commit()
-
 
 def get_image_id(cursor: Cursor, image: Image) -> int | None:
     """
@@ -139,7 +166,7 @@ def get_image_id(cursor: Cursor, image: Image) -> int | None:
     return res["image_id"] if res else None
 
 
-def upload_image(conn: Connection, cursor: Cursor, image: Image) -> int:
+def upload_image(cursor: Cursor, image: Image) -> int:
     """Uploads an image object to the database, returning the new ID of the uploaded entity."""
     sql = """
         INSERT INTO s_beta.image
@@ -152,8 +179,6 @@ def upload_image(conn: Connection, cursor: Cursor, image: Image) -> int:
 
     cursor.execute(sql, params)
 
-    conn.commit()
-
     return int(cursor.lastrowid)
 
 
@@ -184,7 +209,7 @@ def get_botanist_id(cursor: Cursor, botanist: Botanist) -> int | None:
     return res["botanist_id"] if res else None
 
 
-def upload_botanist(conn: Connection, cursor: Cursor, botanist: Botanist) -> int:
+def upload_botanist(cursor: Cursor, botanist: Botanist) -> int:
     """Uploads a botanist object to the database, returning the new ID of the uploaded entity."""
     sql = """
             INSERT INTO s_beta.botanist
@@ -197,19 +222,20 @@ def upload_botanist(conn: Connection, cursor: Cursor, botanist: Botanist) -> int
 
     cursor.execute(sql, params)
 
-    conn.commit()
-
     return int(cursor.lastrowid)
 
 
 def upload_recording(
-    conn: Connection,
+    cursor: Cursor,
     recording: Recording,
     plant_id: int,
     image_id: int,
     botanist_id: int,
-) -> None:
-    """Uploads a recording object to the database."""
+) -> bool:
+    """
+    Uploads a recording object to the database, returning whether it was inserted or
+    ignored as a duplicate by the unique index.
+    """
     sql = """
         INSERT INTO s_beta.recording
             ("plant_id", "recording_taken", "last_watered", "soil_moisture", "temperature", "image_id", "botanist_id")
@@ -227,6 +253,401 @@ def upload_recording(
         botanist_id,
     )
 
-    conn.commit()
+    cursor.execute(sql, params)
+
+    return cursor.rowcount > 0
+
+
+# SQL Server rejects table value constructors with more than 1000 rows in an INSERT.
+MAX_ROWS_PER_STATEMENT = 1000
+
+
+def upload_data_bulk(
+    data: list[Recording] | RecordingBatch,
+    conn: Connection,
+    cache: DimensionCache | None = None,
+    commit: bool = True,
+) -> RecordingBatch:
+    """
+    Uploads a whole batch of transformed data using set-based statements. Each dimension
+    table is reconciled with one MERGE and one key lookup, recordings are inserted with
+    multi-row INSERTs and the batch is committed once, so the number of round trips does
+    not grow with the number of plants. If `commit` is False, the caller commits the batch
+    with its other writes.
+
+    If a cache is given, it is prefilled on first use and dimensions it already holds are
+    not sent to the database at all. The cache is invalidated if the load fails, in case
+    a cached key no longer exists.
+
+    Returns the recordings actually inserted, without those the unique index ignored.
+    """
+    batch = data if isinstance(data, RecordingBatch) else RecordingBatch.from_recordings(data)
+    if not batch:
+        return batch
+
+    cursor = conn.cursor()
+    tables = cache.tables if cache is not None else {}
+
+    try:
+        if cache is not None and not cache.prefilled:
+            prefill_cache(cursor, cache)
+
+        plants = list(dict.fromkeys(batch.plants))
+        origin_ids = merge_origins(
+            cursor, [plant.origin for plant in plants], tables.get("origin")
+        )
+        merge_plants(cursor, plants, origin_ids, tables.get("plant"))
+
+        images = [image for image in dict.fromkeys(batch.images) if image]
+        image_ids = merge_images(cursor, images, tables.get("image"))
+
+        botanists = list(dict.fromkeys(batch.botanists))
+        botanist_ids = merge_botanists(cursor, botanists, tables.get("botanist"))
+        botanist_column = {
+            botanist: botanist_ids[botanist_key(botanist)] for botanist in botanists
+        }
+
+        rows = list(
+            zip(
+                batch.plant_ids,
+                batch.recording_taken,
+                batch.last_watered,
+                map(nan_to_none, batch.soil_moisture),
+                map(nan_to_none, batch.temperature),
+                [image_ids.get(image.original_url) if image else None for image in batch.images],
+                [botanist_column[botanist] for botanist in batch.botanists],
+            )
+        )
+        inserted = insert_recordings(cursor, rows)
+
+        if commit:
+            conn.commit()
+    except Exception:
+        if cache is not None:
+            cache.invalidate()
+        raise
+
+    return batch.select(first_of(map(recording_key, batch.plant_ids, batch.recording_taken),
+                                 inserted))
+
+
+def first_of(keys, inserted: set[tuple[int, str]]) -> list[int]:
+    """
+    Returns the index of the first occurrence of each key that was inserted, as the
+    unique index keeps only the first of any repeated within a batch.
+    """
+    pending = set(inserted)
+    indices = []
+    for index, key in enumerate(keys):
+        if key in pending:
+            pending.discard(key)
+            indices.append(index)
+
+    return indices
+
+
+def origin_key(origin: Origin) -> tuple[float, float]:
+    """Returns the natural key of an origin, rounded to the precision stored in the database."""
+    return round(float(origin.longitude), 6), round(float(origin.latitude), 6)
+
+
+def botanist_key(botanist: Botanist) -> tuple[str, str, str, str]:
+    """Returns the natural key of a botanist."""
+    return botanist.email, botanist.phone, botanist.first_name, botanist.last_name
+
+
+def prefill_cache(cursor: Cursor, cache: DimensionCache) -> None:
+    """Loads the keys of every existing dimension row into the cache, one query per table."""
+    cursor.execute("SELECT origin_id, longitude, latitude FROM s_beta.origin;")
+    cache["origin"].update(
+        {
+            (round(float(row["longitude"]), 6), round(float(row["latitude"]), 6)): row[
+                "origin_id"
+            ]
+            for row in cursor.fetchall()
+        }
+    )
+
+    cursor.execute("SELECT plant_id FROM s_beta.plant;")
+    cache["plant"].update({row["plant_id"]: row["plant_id"] for row in cursor.fetchall()})
+
+    cursor.execute("SELECT image_id, original_url FROM s_beta.image;")
+    cache["image"].update({row["original_url"]: row["image_id"] for row in cursor.fetchall()})
+
+    cursor.execute(
+        "SELECT botanist_id, email, phone_number, first_name, last_name FROM s_beta.botanist;"
+    )
+    cache["botanist"].update(
+        {
+            (row["email"], row["phone_number"], row["first_name"], row["last_name"]): row[
+                "botanist_id"
+            ]
+            for row in cursor.fetchall()
+        }
+    )
+
+    cache.prefilled = True
+
+
+def split_cached(keys, cache: LRUCache | None) -> tuple[dict, list]:
+    """Splits natural keys into a mapping of those already cached and a list of the rest."""
+    if cache is None:
+        return {}, list(keys)
+
+    cached = {key: cache.get(key) for key in keys if key in cache}
+
+    return cached, [key for key in keys if key not in cached]
+
+
+def values_clause(rows: list[tuple]) -> tuple[str, tuple]:
+    """
+    Builds a table value constructor with one placeholder per value, returning the SQL
+    fragment and the flattened parameters.
+    """
+    row_sql = "(" + ", ".join(["%s"] * len(rows[0])) + ")"
+    sql = ",\n".join([row_sql] * len(rows))
+    params = tuple(value for row in rows for value in row)
+
+    return sql, params
+
+
+def chunks(rows: list, size: int = MAX_ROWS_PER_STATEMENT) -> list[list]:
+    """Splits a list of rows into lists of at most `size` rows."""
+    return [rows[i : i + size] for i in range(0, len(rows), size)]
+
+
+def merge_origins(
+    cursor: Cursor, origins: list[Origin], cache: LRUCache | None = None
+) -> dict[tuple[float, float], int]:
+    """
+    Inserts any origins not already in the database in a single MERGE, returning a mapping
+    of (longitude, latitude) to origin_id for every origin in the batch. Origins held in
+    the cache are not sent to the database.
+    """
+    unique = {origin_key(origin): origin for origin in origins}
+    origin_ids, missing = split_cached(unique, cache)
+    if not missing:
+        return origin_ids
+
+    values, params = values_clause(
+        [
+            (*key, unique[key].place_name, unique[key].country_code, unique[key].timezone)
+            for key in missing
+        ]
+    )
+    cursor.execute(
+        f"""
+        MERGE s_beta.origin AS target
+        USING (VALUES {values})
+            AS source ("longitude", "latitude", "place_name", "country_code", "timezone")
+        ON target.longitude = source.longitude
+        AND target.latitude = source.latitude
+        WHEN NOT MATCHED THEN
+            INSERT ("longitude", "latitude", "place_name", "country_code", "timezone")
+            VALUES (source.longitude, source.latitude, source.place_name,
+                    source.country_code, source.timezone);
+        """,
+        params,
+    )
+
+    values, params = values_clause(missing)
+    cursor.execute(
+        f"""
+        SELECT o.origin_id, o.longitude, o.latitude
+        FROM s_beta.origin AS o
+        JOIN (VALUES {values}) AS source ("longitude", "latitude")
+            ON o.longitude = source.longitude
+            AND o.latitude = source.latitude;
+        """,
+        params,
+    )
+
+    merged = {
+        (round(float(row["longitude"]), 6), round(float(row["latitude"]), 6)): row[
+            "origin_id"
+        ]
+        for row in cursor.fetchall()
+    }
+    if cache is not None:
+        cache.update(merged)
+
+    return origin_ids | merged
+
+
+def merge_plants(
+    cursor: Cursor,
+    plants: list[Plant],
+    origin_ids: dict[tuple[float, float], int],
+    cache: LRUCache | None = None,
+) -> None:
+    """
+    Inserts any plants not already in the database in a single MERGE. Plants held in the
+    cache are not sent to the database.
+    """
+    unique = {plant.id: plant for plant in plants}
+    _, missing = split_cached(unique, cache)
+    if not missing:
+        return
+
+    values, params = values_clause(
+        [
+            (
+                plant_id,
+                unique[plant_id].name,
+                unique[plant_id].scientific_name,
+                origin_ids[origin_key(unique[plant_id].origin)],
+            )
+            for plant_id in missing
+        ]
+    )
+    cursor.execute(
+        f"""
+        MERGE s_beta.plant AS target
+        USING (VALUES {values})
+            AS source ("plant_id", "plant_name", "scientific_name", "origin_id")
+        ON target.plant_id = source.plant_id
+        WHEN NOT MATCHED THEN
+            INSERT ("plant_id", "plant_name", "scientific_name", "origin_id")
+            VALUES (source.plant_id, source.plant_name, source.scientific_name,
+                    source.origin_id);
+        """,
+        params,
+    )
+
+    if cache is not None:
+        cache.update({plant_id: plant_id for plant_id in missing})
+
 
-    conn.cursor().execute(sql, params)
+def merge_images(
+    cursor: Cursor, images: list[Image], cache: LRUCache | None = None
+) -> dict[str, int]:
+    """
+    Inserts any images not already in the database in a single MERGE, returning a mapping
+    of original_url to image_id for every image in the batch. Images held in the cache are
+    not sent to the database.
+    """
+    unique = {image.original_url: image for image in images}
+    image_ids, missing = split_cached(unique, cache)
+    if not missing:
+        return image_ids
+
+    values, params = values_clause(
+        [
+            (url, unique[url].license, unique[url].license_name, unique[url].license_url)
+            for url in missing
+        ]
+    )
+    cursor.execute(
+        f"""
+        MERGE s_beta.image AS target
+        USING (VALUES {values})
+            AS source ("original_url", "license", "license_name", "license_url")
+        ON target.original_url = source.original_url
+        WHEN NOT MATCHED THEN
+            INSERT ("original_url", "license", "license_name", "license_url")
+            VALUES (source.original_url, source.license, source.license_name,
+                    source.license_url);
+        """,
+        params,
+    )
+
+    values, params = values_clause([(url,) for url in missing])
+    cursor.execute(
+        f"""
+        SELECT i.image_id, i.original_url
+        FROM s_beta.image AS i
+        JOIN (VALUES {values}) AS source ("original_url")
+            ON i.original_url = source.original_url;
+        """,
+        params,
+    )
+
+    merged = {row["original_url"]: row["image_id"] for row in cursor.fetchall()}
+    if cache is not None:
+        cache.update(merged)
+
+    return image_ids | merged
+
+
+def merge_botanists(
+    cursor: Cursor, botanists: list[Botanist], cache: LRUCache | None = None
+) -> dict[tuple[str, str, str, str], int]:
+    """
+    Inserts any botanists not already in the database in a single MERGE, returning a
+    mapping of (email, phone, first_name, last_name) to botanist_id for every botanist in
+    the batch. Botanists held in the cache are not sent to the database.
+    """
+    unique = {botanist_key(botanist) for botanist in botanists}
+    botanist_ids, missing = split_cached(unique, cache)
+    if not missing:
+        return botanist_ids
+
+    values, params = values_clause(missing)
+    cursor.execute(
+        f"""
+        MERGE s_beta.botanist AS target
+        USING (VALUES {values})
+            AS source ("email", "phone_number", "first_name", "last_name")
+        ON target.email = source.email
+        AND target.phone_number = source.phone_number
+        AND target.first_name = source.first_name
+        AND target.last_name = source.last_name
+        WHEN NOT MATCHED THEN
+            INSERT ("email", "phone_number", "first_name", "last_name")
+            VALUES (source.email, source.phone_number, source.first_name,
+                    source.last_name);
+        """,
+        params,
+    )
+
+    cursor.execute(
+        f"""
+        SELECT b.botanist_id, b.email, b.phone_number, b.first_name, b.last_name
+        FROM s_beta.botanist AS b
+        JOIN (VALUES {values})
+            AS source ("email", "phone_number", "first_name", "last_name")
+            ON b.email = source.email
+            AND b.phone_number = source.phone_number
+            AND b.first_name = source.first_name
+            AND b.last_name = source.last_name;
+        """,
+        params,
+    )
+
+    merged = {
+        (row["email"], row["phone_number"], row["first_name"], row["last_name"]): row[
+            "botanist_id"
+        ]
+        for row in cursor.fetchall()
+    }
+    if cache is not None:
+        cache.update(merged)
+
+    return botanist_ids | merged
+
+
+def insert_recordings(cursor: Cursor, rows: list[tuple]) -> set[tuple[int, str]]:
+    """
+    Inserts recording rows of (plant_id, recording_taken, last_watered, soil_moisture,
+    temperature, image_id, botanist_id) using one multi-row INSERT per 1000 rows, returning
+    the (plant_id, recording_taken) keys of the rows inserted. Rows the unique index
+    ignores as duplicates are not output.
+    """
+    inserted = set()
+    for chunk in chunks(rows):
+        values, params = values_clause(chunk)
+        cursor.execute(
+            f"""
+            INSERT INTO s_beta.recording
+                ("plant_id", "recording_taken", "last_watered", "soil_moisture", "temperature", "image_id", "botanist_id")
+            OUTPUT inserted.plant_id, inserted.recording_taken
+            VALUES
+                {values};
+            """,
+            params,
+        )
+        inserted.update(
+            recording_key(row["plant_id"], row["recording_taken"]) for row in cursor.fetchall()
+        )
+
+    return inserted
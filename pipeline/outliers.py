@@ -0,0 +1,188 @@
+"""
+Filters physically impossible readings out of each batch before it is loaded, and flags
+statistical outliers without dropping them. Each plant's recent readings are kept in memory across warm invocations and
+restored from the database on cold start, so a reading can be compared with its plant's
+last hour in constant time.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass
+from math import isnan, sqrt
+
+from pymssql import Cursor
+
+from entities import RecordingBatch
+
+METRICS = ("soil_moisture", "temperature")
+
+# Readings outside these ranges cannot come from a working sensor
+PHYSICAL_BOUNDS = {"soil_moisture": (0.0, 100.0), "temperature": (-10.0, 60.0)}
+IMPOSSIBLE = ("missing", "out of physical range")
+
+# One reading per plant per minute
+WINDOW_SIZE = 60
+MIN_HISTORY = 10
+Z_LIMIT = 4.0
+
+
+@dataclass
+class Outlier:
+    """A reading that failed validation, and why."""
+
+    plant_id: int
+    recording_taken: str
+    metric: str
+    value: float
+    reason: str
+
+    @property
+    def impossible(self) -> bool:
+        """True if no working sensor could have taken the reading."""
+        return self.reason in IMPOSSIBLE
+
+
+class RollingWindow:
+    """The most recent readings of one metric for one plant, with running sums."""
+
+    __slots__ = ("values", "total", "total_squares")
+
+    def __init__(self, size: int = WINDOW_SIZE):
+        self.values: deque[float] = deque(maxlen=size)
+        self.total = 0.0
+        self.total_squares = 0.0
+
+    def add(self, value: float) -> None:
+        """Adds a reading, dropping the oldest if the window is full."""
+        if len(self.values) == self.values.maxlen:
+            oldest = self.values[0]
+            self.total -= oldest
+            self.total_squares -= oldest * oldest
+
+        self.values.append(value)
+        self.total += value
+        self.total_squares += value * value
+
+    def z_score(self, value: float) -> float | None:
+        """
+        Returns how many standard deviations a value lies from the window's mean, or None
+        if there is too little history or no variation to judge by.
+        """
+        count = len(self.values)
+        if count < MIN_HISTORY:
+            return None
+
+        mean = self.total / count
+        variance = (self.total_squares - count * mean * mean) / (count - 1)
+        if variance <= 0:
+            return None
+
+        return (value - mean) / sqrt(variance)
+
+
+class OutlierFilter:
+    """Per-plant rolling bounds for every metric, held for the life of the container."""
+
+    def __init__(self, window_size: int = WINDOW_SIZE, z_limit: float = Z_LIMIT):
+        self.window_size = window_size
+        self.z_limit = z_limit
+        self.windows: dict[tuple[int, str], RollingWindow] = {}
+        self.restored = False
+
+    def window(self, plant_id: int, metric: str) -> RollingWindow:
+        """Returns the rolling window of a plant's metric, creating it if needed."""
+        key = (plant_id, metric)
+        if key not in self.windows:
+            self.windows[key] = RollingWindow(self.window_size)
+
+        return self.windows[key]
+
+    def restore(self, cursor: Cursor) -> None:
+        """Rebuilds the rolling windows from the last hour of recordings in the database."""
+        cursor.execute(
+            """
+            SELECT plant_id, soil_moisture, temperature
+            FROM s_beta.recording
+            WHERE recording_taken >= DATEADD(
+                hour, -1, (SELECT MAX(recording_taken) FROM s_beta.recording)
+            )
+            ORDER BY recording_taken;
+            """
+        )
+        self.windows.clear()
+        for row in cursor.fetchall():
+            for metric in METRICS:
+                self.window(row["plant_id"], metric).add(float(row[metric]))
+
+        self.restored = True
+
+    def check(self, plant_id: int, metric: str, value: float) -> str | None:
+        """Returns the reason a reading is invalid, or None if it is acceptable."""
+        if isnan(value):
+            return "missing"
+
+        low, high = PHYSICAL_BOUNDS[metric]
+        if not low <= value <= high:
+            return "out of physical range"
+
+        z_score = self.window(plant_id, metric).z_score(value)
+        if z_score is not None and abs(z_score) > self.z_limit:
+            return f"{z_score:+.1f} standard deviations from the last hour"
+
+        return None
+
+    def apply(
+        self, batch: RecordingBatch, reject: bool = True
+    ) -> tuple[RecordingBatch, list[Outlier]]:
+        """
+        Checks every reading in the batch, one metric column at a time. Returns the batch
+        without recordings holding an impossible reading (or unchanged if `reject` is False)
+        and every invalid reading found. Statistical outliers are only flagged, and every
+        possible reading is added to the rolling windows, so a real change in level, such as
+        after watering, stops being flagged within a few readings.
+        """
+        outliers = []
+        for metric in METRICS:
+            column = getattr(batch, metric)
+            for index, (plant_id, value) in enumerate(zip(batch.plant_ids, column)):
+                reason = self.check(plant_id, metric, value)
+                if reason:
+                    outliers.append(
+                        Outlier(plant_id, batch.recording_taken[index], metric, value, reason)
+                    )
+
+        impossible = {
+            (outlier.plant_id, outlier.recording_taken)
+            for outlier in outliers
+            if outlier.impossible
+        }
+        kept = [
+            index
+            for index, key in enumerate(zip(batch.plant_ids, batch.recording_taken))
+            if key not in impossible
+        ]
+
+        for metric in METRICS:
+            column = getattr(batch, metric)
+            for index in kept:
+                self.window(batch.plant_ids[index], metric).add(column[index])
+
+        if reject and len(kept) < len(batch):
+            batch = batch.select(kept)
+
+        return batch, outliers
+
+
+def summarise_outliers(outliers: list[Outlier]) -> str:
+    """Returns a one-line summary of invalid readings for logging."""
+    if not outliers:
+        return "No invalid readings."
+
+    return f"{len(outliers)} invalid readings: " + ", ".join(
+        f"plant {outlier.plant_id} {outlier.metric}={outlier.value:.2f} ({outlier.reason})"
+        for outlier in outliers
+    )
+
+
+OUTLIER_FILTER = OutlierFilter()
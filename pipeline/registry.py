@@ -0,0 +1,143 @@
+"""
+Registry of plant IDs known to the plants API. Active IDs are fetched every minute, while
+IDs that returned 404 are only probed again after a back-off that doubles with every miss.
+The registry is kept in s_beta.plant_registry so that the health check knows which plants
+to expect readings from.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from pymssql import Cursor
+
+from load import values_clause
+
+# IDs probed when the registry is empty
+BOOTSTRAP_PROBE_COUNT = 64
+# IDs above the highest active ID probed for newly added plants
+PROBE_AHEAD = 10
+PROBE_BACKOFF = timedelta(minutes=5)
+MAX_PROBE_BACKOFF = timedelta(days=1)
+
+
+@dataclass
+class PlantStatus:
+    """Whether a plant ID currently returns data, and when to probe it again if not."""
+
+    active: bool
+    misses: int = 0
+    last_checked: datetime | None = None
+    next_probe: datetime | None = None
+
+
+class PlantRegistry:
+    """In-memory view of s_beta.plant_registry, loaded once per Lambda container."""
+
+    def __init__(self):
+        self.plants: dict[int, PlantStatus] = {}
+        self.loaded = False
+        self._changed: set[int] = set()
+
+    def load(self, cursor: Cursor) -> None:
+        """Replaces the in-memory registry with the contents of the database table."""
+        cursor.execute(
+            """
+            SELECT plant_id, active, misses, last_checked, next_probe
+            FROM s_beta.plant_registry;
+            """
+        )
+        self.plants = {
+            row["plant_id"]: PlantStatus(
+                active=bool(row["active"]),
+                misses=row["misses"],
+                last_checked=row["last_checked"],
+                next_probe=row["next_probe"],
+            )
+            for row in cursor.fetchall()
+        }
+        self._changed.clear()
+        self.loaded = True
+
+    def active_ids(self) -> set[int]:
+        """Returns the IDs of plants that returned data when last fetched."""
+        return {plant_id for plant_id, status in self.plants.items() if status.active}
+
+    def ids_to_fetch(self, now: datetime) -> list[int]:
+        """
+        Returns the IDs to request this run: every active ID, every inactive ID whose
+        back-off has elapsed and any unknown ID up to PROBE_AHEAD above the highest
+        active ID.
+        """
+        active = self.active_ids()
+        limit = max(active) + PROBE_AHEAD + 1 if active else BOOTSTRAP_PROBE_COUNT
+
+        return sorted(
+            plant_id
+            for plant_id in set(range(limit)) | set(self.plants)
+            if plant_id not in self.plants
+            or self.plants[plant_id].active
+            or self.plants[plant_id].next_probe <= now
+        )
+
+    def record(self, plant_id: int, status: int | None, now: datetime) -> None:
+        """
+        Updates a plant ID with the HTTP status it returned. A 404 marks it inactive and
+        schedules the next probe; any other failure is treated as transient and ignored.
+        """
+        if status == 200:
+            plant = PlantStatus(active=True, last_checked=now)
+        elif status == 404:
+            misses = self.plants[plant_id].misses + 1 if plant_id in self.plants else 1
+            delay = min(PROBE_BACKOFF * 2 ** (misses - 1), MAX_PROBE_BACKOFF)
+            plant = PlantStatus(
+                active=False, misses=misses, last_checked=now, next_probe=now + delay
+            )
+        else:
+            return
+
+        previous = self.plants.get(plant_id)
+        if previous is None or not (previous.active and plant.active):
+            self._changed.add(plant_id)
+        self.plants[plant_id] = plant
+
+    def save(self, cursor: Cursor) -> None:
+        """
+        Writes plants whose state changed since the registry was loaded or last saved.
+        Active plants that are still active are not rewritten every minute.
+        """
+        if not self._changed:
+            return
+
+        rows = [
+            (
+                plant_id,
+                int(self.plants[plant_id].active),
+                self.plants[plant_id].misses,
+                self.plants[plant_id].last_checked,
+                self.plants[plant_id].next_probe,
+            )
+            for plant_id in sorted(self._changed)
+        ]
+        values, params = values_clause(rows)
+        cursor.execute(
+            f"""
+            MERGE s_beta.plant_registry AS target
+            USING (VALUES {values})
+                AS source ("plant_id", "active", "misses", "last_checked", "next_probe")
+            ON target.plant_id = source.plant_id
+            WHEN MATCHED THEN
+                UPDATE SET active = source.active, misses = source.misses,
+                           last_checked = source.last_checked, next_probe = source.next_probe
+            WHEN NOT MATCHED THEN
+                INSERT ("plant_id", "active", "misses", "last_checked", "next_probe")
+                VALUES (source.plant_id, source.active, source.misses,
+                        source.last_checked, source.next_probe);
+            """,
+            params,
+        )
+        self._changed.clear()
+
+
+PLANT_REGISTRY = PlantRegistry()
@@ -0,0 +1,122 @@
+"""
+Incremental statistics of every plant's readings, kept in s_beta.recording_stats with one
+row per plant, metric and hour. Each row holds the count, mean and sum of squared
+differences from the mean (M2) of Welford's algorithm, plus the minimum and maximum. The
+pipeline folds each loaded batch into the rows of its hours, so the health check, long-term
+job and dashboard can read baselines in O(plants) rather than re-aggregating raw readings.
+"""
+
+from __future__ import annotations
+
+from math import isnan
+
+from pymssql import Connection, Cursor
+
+from entities import RecordingBatch
+from load import chunks, values_clause
+
+METRICS = ("soil_moisture", "temperature")
+
+
+class RunningStats:
+    """Count, mean, M2, minimum and maximum of a stream of readings."""
+
+    __slots__ = ("count", "mean", "m2", "minimum", "maximum")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = float("inf")
+        self.maximum = float("-inf")
+
+    def add(self, value: float) -> None:
+        """Adds a reading using Welford's update."""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+
+
+def bucket_start(recording_taken: str) -> str:
+    """Returns the start of the hour a recording was taken in."""
+    return str(recording_taken)[:13] + ":00:00"
+
+
+def bucket_stats(batch: RecordingBatch) -> dict[tuple[int, str, str], RunningStats]:
+    """
+    Summarises a batch per plant, metric and hour. Missing readings are skipped.
+    """
+    buckets: dict[tuple[int, str, str], RunningStats] = {}
+
+    hours = [bucket_start(taken) for taken in batch.recording_taken]
+    for metric in METRICS:
+        for plant_id, hour, value in zip(batch.plant_ids, hours, getattr(batch, metric)):
+            if isnan(value):
+                continue
+            key = (plant_id, metric, hour)
+            if key not in buckets:
+                buckets[key] = RunningStats()
+            buckets[key].add(value)
+
+    return buckets
+
+
+def merge_stats(cursor: Cursor, buckets: dict[tuple[int, str, str], RunningStats]) -> None:
+    """
+    Folds batch statistics into s_beta.recording_stats, combining them with any existing
+    row for the same plant, metric and hour. Uses one MERGE per 1000 buckets.
+    """
+    rows = [
+        (plant_id, metric, hour, stats.count, stats.mean, stats.m2, stats.minimum, stats.maximum)
+        for (plant_id, metric, hour), stats in buckets.items()
+    ]
+
+    for chunk in chunks(rows):
+        values, params = values_clause(chunk)
+        cursor.execute(
+            f"""
+            MERGE s_beta.recording_stats AS target
+            USING (VALUES {values})
+                AS source ("plant_id", "metric", "bucket_start", "reading_count", "mean", "m2",
+                           "min_value", "max_value")
+            ON target.plant_id = source.plant_id
+            AND target.metric = source.metric
+            AND target.bucket_start = source.bucket_start
+            WHEN MATCHED THEN
+                UPDATE SET
+                    reading_count = target.reading_count + source.reading_count,
+                    mean = target.mean + (source.mean - target.mean)
+                        * source.reading_count / (target.reading_count + source.reading_count),
+                    m2 = target.m2 + source.m2 + SQUARE(source.mean - target.mean)
+                        * CAST(target.reading_count AS FLOAT) * source.reading_count
+                        / (target.reading_count + source.reading_count),
+                    min_value = IIF(source.min_value < target.min_value,
+                                    source.min_value, target.min_value),
+                    max_value = IIF(source.max_value > target.max_value,
+                                    source.max_value, target.max_value)
+            WHEN NOT MATCHED THEN
+                INSERT ("plant_id", "metric", "bucket_start", "reading_count", "mean", "m2",
+                        "min_value", "max_value")
+                VALUES (source.plant_id, source.metric, source.bucket_start,
+                        source.reading_count, source.mean, source.m2,
+                        source.min_value, source.max_value);
+            """,
+            params,
+        )
+
+
+def update_stats(conn: Connection, batch: RecordingBatch, commit: bool = True) -> None:
+    """
+    Folds a loaded batch into the statistics store and commits, unless `commit` is False
+    and the caller commits it with the recordings.
+    """
+    buckets = bucket_stats(batch)
+    if not buckets:
+        return
+
+    merge_stats(conn.cursor(), buckets)
+    if commit:
+        conn.commit()
@@ -0,0 +1,94 @@
+"""
+Streaming mode for the pipeline. Each API response is transformed as soon as it arrives
+and queued for the loader, which writes batches whenever enough recordings have queued up
+or enough time has passed. This overlaps API latency with database writes and keeps memory
+bounded by the batch size rather than the number of plants.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Callable
+
+from entities import RecordingBatch
+from extract import FetchResult, iter_results
+from transform import transform
+
+BATCH_SIZE = 500
+FLUSH_SECONDS = 2.0
+# Recordings allowed to queue up before the extractor waits for the loader
+QUEUE_SIZE = 2 * BATCH_SIZE
+
+_DONE = object()
+
+
+async def produce(urls: list[str], queue: asyncio.Queue, **fetch_kwargs) -> list[FetchResult]:
+    """Fetches and transforms each endpoint, queueing its recordings as soon as they are ready."""
+    results = []
+
+    try:
+        async for result in iter_results(urls, **fetch_kwargs):
+            results.append(result)
+            for recording in transform([result.data]):
+                await queue.put(recording)
+    finally:
+        await queue.put(_DONE)
+
+    return results
+
+
+async def consume(
+    queue: asyncio.Queue,
+    load: Callable[[RecordingBatch], None],
+    batch_size: int = BATCH_SIZE,
+    flush_seconds: float = FLUSH_SECONDS,
+) -> int:
+    """
+    Loads queued recordings in batches of up to `batch_size`, flushing a partial batch once
+    its first recording has waited `flush_seconds`. The blocking load runs in a worker
+    thread so that fetching continues meanwhile. Returns the number of recordings loaded.
+    """
+    loop = asyncio.get_running_loop()
+    batch = RecordingBatch()
+    flush_at = None
+    loaded = 0
+
+    while True:
+        timeout = None if flush_at is None else max(flush_at - loop.time(), 0)
+        try:
+            item = await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            item = None
+
+        if item is not None and item is not _DONE:
+            batch.append(item)
+            flush_at = flush_at or loop.time() + flush_seconds
+
+        if batch and (item is None or item is _DONE or len(batch) >= batch_size):
+            await asyncio.to_thread(load, batch)
+            loaded += len(batch)
+            batch, flush_at = RecordingBatch(), None
+
+        if item is _DONE:
+            return loaded
+
+
+async def run_stream(
+    urls: list[str],
+    load: Callable[[RecordingBatch], None],
+    batch_size: int = BATCH_SIZE,
+    flush_seconds: float = FLUSH_SECONDS,
+    **fetch_kwargs,
+) -> list[FetchResult]:
+    """
+    Streams the endpoints through transform into `load`, returning the fetch results in
+    the order the requests completed.
+    """
+    queue = asyncio.Queue(maxsize=max(QUEUE_SIZE, batch_size))
+
+    results, _ = await asyncio.gather(
+        produce(urls, queue, **fetch_kwargs),
+        consume(queue, load, batch_size, flush_seconds),
+    )
+
+    return results
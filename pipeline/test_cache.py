@@ -0,0 +1,76 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from cache import DimensionCache, LRUCache
+from load import upload_data_bulk
+from test_load import make_recording
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert len(cache) == 2
+
+
+def test_dimension_cache_invalidate_table():
+    cache = DimensionCache()
+    cache["plant"].put(1, 1)
+    cache["image"].put("url", 2)
+    cache.prefilled = True
+
+    cache.invalidate("plant")
+
+    assert len(cache["plant"]) == 0
+    assert cache["image"].get("url") == 2
+    assert cache.prefilled
+
+
+def test_dimension_cache_invalidate_all():
+    cache = DimensionCache()
+    cache["botanist"].put(("e", "p", "f", "l"), 1)
+    cache.prefilled = True
+
+    cache.invalidate()
+
+    assert len(cache["botanist"]) == 0
+    assert not cache.prefilled
+
+
+@pytest.fixture
+def warm_cache():
+    cache = DimensionCache()
+    cache["origin"].put((-19.3, -41.2), 3)
+    cache["plant"].put(0, 0)
+    cache["image"].put("ourl", 7)
+    cache["botanist"].put(("email", "phone", "Fname", "Lname"), 5)
+    cache.prefilled = True
+    return cache
+
+
+def test_upload_data_bulk_warm_cache_only_inserts_recordings(warm_cache):
+    conn = MagicMock()
+
+    upload_data_bulk([make_recording(0)], conn, warm_cache)
+
+    execute = conn.cursor.return_value.execute
+    assert execute.call_count == 1
+    assert "INSERT INTO s_beta.recording" in execute.call_args.args[0]
+    assert execute.call_args.args[1][-2:] == (7, 5)
+
+
+def test_upload_data_bulk_failure_invalidates_cache(warm_cache):
+    conn = MagicMock()
+    conn.commit.side_effect = RuntimeError("foreign key violation")
+
+    with pytest.raises(RuntimeError):
+        upload_data_bulk([make_recording(0)], conn, warm_cache)
+
+    assert not warm_cache.prefilled
+    assert len(warm_cache["origin"]) == 0
@@ -0,0 +1,122 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from pymssql import ColumnsWithoutNamesError, OperationalError
+
+from connection import ConnectionPool, get_pool
+
+CONFIG = {
+    "DB_HOST": "localhost",
+    "DB_PORT": 1433,
+    "DB_USER": "user",
+    "DB_PASSWORD": "password",
+    "DB_NAME": "database",
+}
+
+
+@pytest.fixture
+def factory():
+    return MagicMock(side_effect=lambda **kwargs: MagicMock())
+
+
+def test_pool_reuses_released_connection(factory):
+    pool = ConnectionPool(CONFIG, factory)
+
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    assert first is second
+    assert factory.call_count == 1
+
+
+def test_pool_replaces_connection_failing_ping(factory):
+    pool = ConnectionPool(CONFIG, factory)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.cursor.return_value.execute.side_effect = OperationalError("connection reset")
+
+    assert pool.acquire() is not conn
+    conn.close.assert_called_once()
+    assert pool.size == 1
+
+
+def test_pool_recycles_expired_connection(factory):
+    pool = ConnectionPool(CONFIG, factory, max_age=60)
+
+    with patch("connection.time.monotonic", return_value=0):
+        conn = pool.acquire()
+    with patch("connection.time.monotonic", return_value=61):
+        pool.release(conn)
+
+    conn.close.assert_called_once()
+    assert pool.size == 0
+
+
+def test_pool_is_bounded(factory):
+    pool = ConnectionPool(CONFIG, factory, max_size=1)
+    pool.acquire()
+
+    with pytest.raises(TimeoutError):
+        pool.acquire(timeout=0.01)
+
+
+def test_pool_rolls_back_connection_on_error(factory):
+    pool = ConnectionPool(CONFIG, factory)
+
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            raise ValueError
+
+    conn.rollback.assert_called_once()
+    conn.close.assert_not_called()
+    assert pool.acquire() is conn
+
+
+def test_pool_discards_connection_failing_rollback(factory):
+    pool = ConnectionPool(CONFIG, factory)
+
+    with pytest.raises(OperationalError):
+        with pool.connection() as conn:
+            conn.rollback.side_effect = OperationalError("connection reset")
+            raise OperationalError("connection reset")
+
+    conn.close.assert_called_once()
+    assert pool.size == 0
+
+
+def test_get_pool_returns_module_level_pool(factory):
+    assert get_pool(CONFIG, factory) is get_pool(dict(CONFIG))
+
+
+def test_pool_reuses_connection_with_dict_cursors():
+    def dict_connection(**kwargs):
+        conn = MagicMock()
+
+        def execute(query, *args):
+            # as_dict=True cursors refuse columns without names
+            if "AS" not in query:
+                raise ColumnsWithoutNamesError("Specified as_dict=True and there are columns with no names")
+
+        conn.cursor.return_value.execute.side_effect = execute
+        return conn
+
+    pool = ConnectionPool(CONFIG, MagicMock(side_effect=dict_connection))
+
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    assert first is second
+
+
+def test_pool_rolls_back_open_transaction_on_release(factory):
+    pool = ConnectionPool(CONFIG, factory)
+
+    with pool.connection() as conn:
+        conn.cursor().execute("INSERT INTO s_beta.recording VALUES (1);")
+
+    conn.rollback.assert_called_once()
+    assert pool.acquire() is conn
@@ -0,0 +1,65 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from dedup import RecentKeys, recording_key
+from entities import RecordingBatch
+from test_load import make_recording
+
+
+def make_batch(*keys: tuple[int, str]) -> RecordingBatch:
+    batch = RecordingBatch.from_recordings(make_recording(plant_id) for plant_id, _ in keys)
+    batch.recording_taken = [taken for _, taken in keys]
+    return batch
+
+
+def test_recording_key_matches_database_timestamps():
+    assert recording_key(3, datetime(2024, 4, 17, 10, 56, 19)) == (3, "2024-04-17 10:56:19")
+    assert recording_key(3, "2024-04-17T10:56:19.123") == (3, "2024-04-17 10:56:19")
+
+
+def test_new_only_drops_duplicates_within_batch():
+    batch, duplicates = RecentKeys().new_only(
+        make_batch(
+            (1, "2024-04-17 10:56:19"),
+            (1, "2024-04-17 10:56:19"),
+            (2, "2024-04-17 10:56:19"),
+        )
+    )
+
+    assert duplicates == 1
+    assert list(batch.plant_ids) == [1, 2]
+
+
+def test_new_only_drops_recently_loaded():
+    recent = RecentKeys()
+    recent.mark_loaded(make_batch((1, "2024-04-17 10:56:19")))
+
+    batch, duplicates = recent.new_only(
+        make_batch((1, "2024-04-17 10:56:19"), (1, "2024-04-17 10:57:19"))
+    )
+
+    assert duplicates == 1
+    assert batch.recording_taken == ["2024-04-17 10:57:19"]
+
+
+def test_keys_expire_past_horizon():
+    recent = RecentKeys(horizon_minutes=10)
+    recent.mark_loaded(make_batch((1, "2024-04-17 10:00:00"), (1, "2024-04-17 10:05:00")))
+    recent.mark_loaded(make_batch((1, "2024-04-17 10:12:00")))
+
+    assert (1, "2024-04-17 10:00:00") not in recent
+    assert (1, "2024-04-17 10:05:00") in recent
+    assert len(recent) == 2
+
+
+def test_seed():
+    cursor = MagicMock()
+    cursor.fetchall.return_value = [
+        {"plant_id": 4, "recording_taken": datetime(2024, 4, 17, 10, 56, 19)}
+    ]
+    recent = RecentKeys()
+
+    recent.seed(cursor)
+
+    assert recent.seeded
+    assert (4, "2024-04-17 10:56:19") in recent
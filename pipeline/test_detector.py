@@ -0,0 +1,100 @@
+import json
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+from detector import (
+    Anomaly,
+    AnomalyDetector,
+    enqueue_anomalies,
+    record_anomalies,
+    summarise_anomalies,
+)
+from test_outliers import make_batch
+
+NOW = datetime(2024, 4, 17, 12, 0)
+
+
+def make_detector() -> AnomalyDetector:
+    """Returns a detector with baselines of mean 30, std 2 for plant 1's metrics."""
+    cursor = MagicMock()
+    cursor.fetchall.return_value = [
+        # 10 readings with mean 30 and M2 36, so a sample variance of 4
+        {"plant_id": 1, "metric": metric, "reading_count": 10,
+         "total": 300.0, "total_squares": 9036.0}
+        for metric in ("soil_moisture", "temperature")
+    ] + [{"plant_id": 2, "metric": "temperature", "reading_count": 1,
+          "total": 20.0, "total_squares": 400.0}]
+
+    detector = AnomalyDetector()
+    detector.refresh(cursor, NOW)
+    return detector
+
+
+def test_refresh_reads_baselines_from_stats():
+    detector = make_detector()
+
+    assert detector.baselines[(1, "soil_moisture")] == (30.0, 2.0)
+    assert (2, "temperature") not in detector.baselines
+
+
+def test_stale_after_ttl():
+    detector = AnomalyDetector(ttl=timedelta(minutes=15))
+    assert detector.stale(NOW)
+
+    detector.refreshed_at = NOW
+    assert not detector.stale(NOW + timedelta(minutes=14))
+    assert detector.stale(NOW + timedelta(minutes=15))
+
+
+def test_score_flags_readings_past_threshold():
+    anomalies = make_detector().score(make_batch((1, 36.0, 31.0), (1, 30.0, 24.0), (2, 99.0, 99.0)))
+
+    assert [(a.metric, a.value) for a in anomalies] == [
+        ("soil_moisture", 36.0),
+        ("temperature", 24.0),
+    ]
+    assert anomalies[0].z_score == 3.0
+
+
+def test_record_anomalies_inserts_and_commits():
+    conn = MagicMock()
+    anomaly = Anomaly(1, "2024-04-17 10:00:00", "temperature", 24.0, 30.0, 2.0, -3.0)
+
+    record_anomalies(conn, [anomaly])
+
+    sql, params = conn.cursor.return_value.execute.call_args.args
+    assert "INSERT INTO s_beta.anomaly" in sql
+    assert params == (1, "2024-04-17 10:00:00", "temperature", 24.0, 30.0, 2.0, -3.0)
+    conn.commit.assert_called_once()
+
+
+def test_record_anomalies_skips_empty():
+    conn = MagicMock()
+
+    record_anomalies(conn, [])
+
+    conn.cursor.assert_not_called()
+
+
+def test_enqueue_anomalies_batches_by_ten():
+    queue = MagicMock()
+    queue.send_message_batch.return_value = {"Failed": [{"Id": "0"}]}
+    anomalies = [
+        Anomaly(plant_id, "2024-04-17 10:00:00", "temperature", 24.0, 30.0, 2.0, -3.0)
+        for plant_id in range(12)
+    ]
+
+    failed = enqueue_anomalies(queue, "https://sqs/queue", anomalies)
+
+    assert queue.send_message_batch.call_count == 2
+    entries = queue.send_message_batch.call_args_list[0].kwargs["Entries"]
+    assert len(entries) == 10
+    assert json.loads(entries[3]["MessageBody"])["plant_id"] == 3
+    assert failed == 2
+
+
+def test_summarise_anomalies():
+    anomaly = Anomaly(1, "2024-04-17 10:00:00", "temperature", 24.0, 30.0, 2.0, -3.0)
+
+    assert summarise_anomalies([]) == "No anomalies."
+    assert "plant 1 temperature=24.00 (-3.0 standard deviations)" in summarise_anomalies([anomaly])
@@ -0,0 +1,59 @@
+from dataclasses import FrozenInstanceError
+from math import isnan
+
+import pytest
+
+from entities import Interner, Origin, RecordingBatch
+from test_load import make_recording
+from transform import transform
+from test_stream import plant_data
+
+
+def test_interner_shares_equal_instances():
+    origins = Interner(Origin)
+
+    first = origins(-19.3, -41.2, "Resplendor", "BR", "America/Sao_Paulo")
+    second = origins(-19.3, -41.2, "Resplendor", "BR", "America/Sao_Paulo")
+
+    assert first is second
+    assert len(origins) == 1
+
+
+def test_interner_is_bounded():
+    origins = Interner(Origin, max_size=1)
+
+    origins(0.0, 0.0, "A", "GB", "Europe/London")
+    origins(1.0, 1.0, "B", "GB", "Europe/London")
+
+    assert len(origins) == 1
+
+
+def test_entities_are_frozen():
+    with pytest.raises(FrozenInstanceError):
+        make_recording(0).plant.origin.longitude = 0
+
+
+def test_transform_interns_dimensions():
+    first, second = transform([plant_data(0), plant_data(1)])
+
+    assert first.botanist is second.botanist
+    assert first.plant.origin is second.plant.origin
+
+
+def test_recording_batch_round_trip():
+    recordings = [make_recording(0), make_recording(1, image=False)]
+
+    batch = RecordingBatch.from_recordings(recordings)
+
+    assert len(batch) == 2
+    assert list(batch.plant_ids) == [0, 1]
+    assert list(batch) == recordings
+
+
+def test_recording_batch_missing_reading():
+    recording = transform([plant_data(0) | {"temperature": None}])[0]
+
+    batch = RecordingBatch.from_recordings([recording])
+
+    assert isnan(batch.temperature[0])
+    assert batch[0].temperature is None
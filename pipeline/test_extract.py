@@ -0,0 +1,108 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import extract
+from extract import fetch_results, fetch_data_from_endpoints, summarise_results
+
+
+async def with_server(coroutine):
+    """Runs the coroutine against a local stand-in for the plants API."""
+    calls = {}
+
+    async def plant(request):
+        plant_id = int(request.match_info["plant_id"])
+        calls[plant_id] = calls.get(plant_id, 0) + 1
+
+        if plant_id == 1 and calls[plant_id] == 1:
+            return web.json_response({"error": "busy"}, status=503)
+        if plant_id == 2:
+            return web.json_response({"error": "plant not found"}, status=404)
+        if plant_id == 3:
+            await asyncio.sleep(1)
+        if plant_id == 4:
+            return web.Response(text="<html>Service unavailable</html>", content_type="text/html")
+
+        return web.json_response({"plant_id": plant_id})
+
+    app = web.Application()
+    app.router.add_get("/plants/{plant_id}", plant)
+
+    async with TestServer(app) as server:
+        urls = [str(server.make_url(f"/plants/{i}")) for i in range(5)]
+        return await coroutine(urls), calls
+
+
+def test_fetch_results(monkeypatch):
+    monkeypatch.setattr(extract, "BACKOFF_BASE", 0.01)
+
+    results, calls = asyncio.run(
+        with_server(
+            lambda urls: fetch_results(urls, request_timeout=0.2, overall_timeout=0.5, max_retries=1)
+        )
+    )
+
+    assert results[0].data == {"plant_id": 0}
+    assert results[0].attempts == 1
+
+    assert results[1].data == {"plant_id": 1}
+    assert results[1].attempts == 2
+
+    assert results[2].status == 404
+    assert results[2].error == "Client error 404"
+    assert calls[2] == 1
+
+    assert not results[3].ok
+    assert results[3].error == "Timed out"
+    assert results[3].attempts == 2
+
+
+def test_fetch_results_respects_overall_deadline():
+    results, _ = asyncio.run(
+        with_server(lambda urls: fetch_results(urls[3:], request_timeout=5, overall_timeout=0.2))
+    )
+
+    assert not results[0].ok
+    assert results[0].elapsed < 0.5
+
+
+def test_fetch_results_deadline_counts_from_slot():
+    results, calls = asyncio.run(
+        with_server(
+            lambda urls: fetch_results(
+                [urls[3]] * 2, concurrency=1, request_timeout=5, overall_timeout=0.3
+            )
+        )
+    )
+
+    assert [result.attempts for result in results] == [1, 0]
+    assert results[1].error == "Deadline exceeded"
+    assert calls[3] == 1
+    assert max(result.elapsed for result in results) < 0.6
+
+
+def test_fetch_results_rejects_non_json_payload():
+    results, calls = asyncio.run(with_server(lambda urls: fetch_results(urls[4:])))
+
+    assert not results[0].ok
+    assert results[0].error == "Invalid payload from status 200"
+    assert calls[4] == 1
+
+
+def test_fetch_data_from_endpoints():
+    data, _ = asyncio.run(with_server(lambda urls: fetch_data_from_endpoints(urls[:3])))
+
+    assert data[0] == {"plant_id": 0}
+    assert data[2] is None
+
+
+def test_summarise_results():
+    results = [
+        extract.FetchResult("a", data={}, attempts=2, elapsed=0.5),
+        extract.FetchResult("b", attempts=1, elapsed=0.1, error="Timed out"),
+    ]
+
+    assert summarise_results(results) == (
+        "Fetched 1/2 endpoints (1 retried, slowest 0.50s). Failed: b (Timed out)"
+    )
@@ -0,0 +1,38 @@
+from unittest.mock import MagicMock
+
+from entities import RecordingBatch
+from last_seen import GAP_THRESHOLD, latest_readings, update_last_seen
+from test_stats import make_batch
+
+
+def test_latest_readings_keeps_newest_per_plant():
+    latest = latest_readings(
+        make_batch(
+            (1, "2024-04-17 10:57:19", 13.0),
+            (1, "2024-04-17 10:56:19", 13.0),
+            (2, "2024-04-17 10:55:00", 13.0),
+        )
+    )
+
+    assert latest == {1: "2024-04-17 10:57:19", 2: "2024-04-17 10:55:00"}
+
+
+def test_update_last_seen_records_gaps_and_merges():
+    conn = MagicMock()
+
+    update_last_seen(conn, make_batch((1, "2024-04-17 10:56:19", 13.0)))
+
+    sql, params = conn.cursor.return_value.execute.call_args.args
+    assert "INSERT INTO s_beta.reading_gap" in sql
+    assert "MERGE s_beta.plant_last_seen" in sql
+    assert params == (1, "2024-04-17 10:56:19", GAP_THRESHOLD.total_seconds(),
+                      1, "2024-04-17 10:56:19")
+    conn.commit.assert_called_once()
+
+
+def test_update_last_seen_empty_batch():
+    conn = MagicMock()
+
+    update_last_seen(conn, RecordingBatch())
+
+    conn.cursor.assert_not_called()
@@ -0,0 +1,110 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from load import upload_data_bulk, values_clause
+from entities import Recording, RecordingBatch, Plant, Origin, Botanist, Image
+
+
+def make_recording(plant_id: int, image: bool = True) -> Recording:
+    return Recording(
+        plant=Plant(
+            name="Epipremnum Aureum",
+            id=plant_id,
+            origin=Origin(
+                longitude=-19.3,
+                latitude=-41.2,
+                place_name="Resplendor",
+                country_code="BR",
+                timezone="America/Sao_Paulo",
+            ),
+        ),
+        recording_taken="2024-04-17 10:56:19",
+        last_watered="2024-04-16 14:03:04",
+        soil_moisture=27.2,
+        temperature=13.2,
+        botanist=Botanist(
+            first_name="Fname", last_name="Lname", email="email", phone="phone"
+        ),
+        image=Image(original_url="ourl", license_name="name", license_url="lurl", license=45)
+        if image
+        else None,
+    )
+
+
+@pytest.fixture
+def conn():
+    connection = MagicMock()
+    cursor = connection.cursor.return_value
+    cursor.fetchall.side_effect = [
+        [{"origin_id": 3, "longitude": -19.3, "latitude": -41.2}],
+        [{"image_id": 7, "original_url": "ourl"}],
+        [
+            {
+                "botanist_id": 5,
+                "email": "email",
+                "phone_number": "phone",
+                "first_name": "Fname",
+                "last_name": "Lname",
+            }
+        ],
+        [{"plant_id": 0, "recording_taken": datetime(2024, 4, 17, 10, 56, 19)}],
+    ]
+    return connection
+
+
+def test_values_clause():
+    sql, params = values_clause([(1, "a"), (2, "b")])
+
+    assert sql == "(%s, %s),\n(%s, %s)"
+    assert params == (1, "a", 2, "b")
+
+
+def test_upload_data_bulk_round_trips_independent_of_batch_size(conn):
+    upload_data_bulk([make_recording(i) for i in range(200)], conn)
+
+    assert conn.cursor.return_value.execute.call_count == 8
+    conn.commit.assert_called_once()
+
+
+def test_upload_data_bulk_inserts_resolved_keys(conn):
+    upload_data_bulk([make_recording(0), make_recording(1, image=False)], conn)
+
+    sql, params = conn.cursor.return_value.execute.call_args.args
+
+    assert "INSERT INTO s_beta.recording" in sql
+    assert "OUTPUT inserted.plant_id, inserted.recording_taken" in sql
+    assert params == (
+        0, "2024-04-17 10:56:19", "2024-04-16 14:03:04", 27.2, 13.2, 7, 5,
+        1, "2024-04-17 10:56:19", "2024-04-16 14:03:04", 27.2, 13.2, None, 5,
+    )
+
+
+def test_upload_data_bulk_empty_batch(conn):
+    upload_data_bulk([], conn)
+
+    conn.cursor.assert_not_called()
+    conn.commit.assert_not_called()
+
+
+def test_upload_data_bulk_accepts_recording_batch(conn):
+    upload_data_bulk(RecordingBatch.from_recordings([make_recording(0)]), conn)
+
+    sql, params = conn.cursor.return_value.execute.call_args.args
+
+    assert "INSERT INTO s_beta.recording" in sql
+    assert params == (0, "2024-04-17 10:56:19", "2024-04-16 14:03:04", 27.2, 13.2, 7, 5)
+
+
+def test_upload_data_bulk_returns_only_inserted_recordings(conn):
+    inserted = upload_data_bulk([make_recording(0), make_recording(1), make_recording(0)], conn)
+
+    assert list(inserted.plant_ids) == [0]
+    assert inserted.recording_taken == ["2024-04-17 10:56:19"]
+
+
+def test_upload_data_bulk_leaves_commit_to_caller(conn):
+    upload_data_bulk([make_recording(0)], conn, commit=False)
+
+    conn.commit.assert_not_called()
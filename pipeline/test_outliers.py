@@ -0,0 +1,96 @@
+from unittest.mock import MagicMock
+
+from entities import RecordingBatch
+from outliers import OutlierFilter, RollingWindow, MIN_HISTORY, summarise_outliers
+from test_stream import plant_data
+from transform import transform
+
+
+def make_batch(*readings: tuple[int, float, float]) -> RecordingBatch:
+    return RecordingBatch.from_recordings(
+        transform(
+            [
+                plant_data(plant_id)
+                | {
+                    "soil_moisture": moisture,
+                    "temperature": temperature,
+                    "recording_taken": f"2024-04-17 10:{i:02d}:00",
+                }
+                for i, (plant_id, moisture, temperature) in enumerate(readings)
+            ]
+        )
+    )
+
+
+def test_rolling_window_z_score():
+    window = RollingWindow(size=MIN_HISTORY)
+    for value in [10.0, 12.0] * MIN_HISTORY:
+        window.add(value)
+
+    assert len(window.values) == MIN_HISTORY
+    assert round(window.z_score(11.0), 6) == 0
+    assert window.z_score(21.0) > 9
+
+
+def test_rolling_window_needs_history():
+    window = RollingWindow()
+    window.add(1.0)
+
+    assert window.z_score(100.0) is None
+
+
+def test_filter_rejects_impossible_readings():
+    batch, outliers = OutlierFilter().apply(make_batch((0, -5.0, 13.0), (1, 30.0, 13.0)))
+
+    assert list(batch.plant_ids) == [1]
+    assert [(o.plant_id, o.metric, o.reason) for o in outliers] == [
+        (0, "soil_moisture", "out of physical range")
+    ]
+
+
+def test_filter_flags_statistical_outliers():
+    outlier_filter = OutlierFilter()
+    for i in range(MIN_HISTORY):
+        outlier_filter.apply(make_batch((0, 30.0 + i % 2, 13.0 + i % 2)))
+
+    batch, outliers = outlier_filter.apply(make_batch((0, 30.5, 40.0)))
+
+    assert len(batch) == 1
+    assert outliers[0].metric == "temperature"
+    assert not outliers[0].impossible
+    assert len(outlier_filter.window(0, "temperature").values) == MIN_HISTORY + 1
+
+
+def test_filter_adapts_to_step_change():
+    outlier_filter = OutlierFilter()
+    for i in range(60):
+        outlier_filter.apply(make_batch((0, 20.0 + i % 2, 13.0 + i % 2)))
+
+    flagged = []
+    for i in range(20):
+        batch, outliers = outlier_filter.apply(make_batch((0, 60.0 + i % 2, 13.0 + i % 2)))
+        assert len(batch) == 1
+        flagged.append(bool(outliers))
+
+    assert flagged[0]
+    assert not any(flagged[5:])
+
+
+def test_filter_flag_mode_keeps_readings():
+    batch, outliers = OutlierFilter().apply(make_batch((0, 150.0, 13.0)), reject=False)
+
+    assert len(batch) == 1
+    assert "plant 0 soil_moisture=150.00" in summarise_outliers(outliers)
+
+
+def test_filter_restore():
+    cursor = MagicMock()
+    cursor.fetchall.return_value = [
+        {"plant_id": 3, "soil_moisture": 30.0, "temperature": 13.0}
+    ] * 5
+    outlier_filter = OutlierFilter()
+
+    outlier_filter.restore(cursor)
+
+    assert outlier_filter.restored
+    assert len(outlier_filter.window(3, "soil_moisture").values) == 5
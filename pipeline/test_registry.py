@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+from registry import PlantRegistry, BOOTSTRAP_PROBE_COUNT, PROBE_AHEAD, PROBE_BACKOFF
+
+NOW = datetime(2024, 4, 17, 10, 0)
+
+
+def test_empty_registry_probes_bootstrap_range():
+    assert PlantRegistry().ids_to_fetch(NOW) == list(range(BOOTSTRAP_PROBE_COUNT))
+
+
+def test_registry_skips_dead_ids_until_backoff_elapses():
+    registry = PlantRegistry()
+    registry.record(0, 200, NOW)
+    registry.record(1, 404, NOW)
+    registry.record(2, 200, NOW)
+
+    assert 1 not in registry.ids_to_fetch(NOW)
+    assert 1 in registry.ids_to_fetch(NOW + PROBE_BACKOFF)
+    assert registry.ids_to_fetch(NOW) == [0, 2] + list(range(3, 3 + PROBE_AHEAD))
+
+
+def test_registry_backoff_doubles():
+    registry = PlantRegistry()
+    registry.record(7, 404, NOW)
+    registry.record(7, 404, NOW)
+
+    assert registry.plants[7].misses == 2
+    assert registry.plants[7].next_probe == NOW + 2 * PROBE_BACKOFF
+
+
+def test_registry_ignores_transient_failures():
+    registry = PlantRegistry()
+    registry.record(3, 200, NOW)
+    registry.record(3, 500, NOW + timedelta(minutes=1))
+    registry.record(3, None, NOW + timedelta(minutes=2))
+
+    assert registry.active_ids() == {3}
+
+
+def test_registry_saves_only_changes():
+    registry = PlantRegistry()
+    registry.record(0, 200, NOW)
+    cursor = MagicMock()
+
+    registry.save(cursor)
+    registry.record(0, 200, NOW)
+    registry.save(cursor)
+
+    cursor.execute.assert_called_once()
+    assert cursor.execute.call_args.args[1] == (0, 1, 0, NOW, None)
+
+
+def test_registry_load():
+    cursor = MagicMock()
+    cursor.fetchall.return_value = [
+        {"plant_id": 4, "active": True, "misses": 0, "last_checked": NOW, "next_probe": None}
+    ]
+    registry = PlantRegistry()
+
+    registry.load(cursor)
+
+    assert registry.loaded
+    assert registry.active_ids() == {4}
@@ -0,0 +1,70 @@
+from statistics import mean, variance
+from unittest.mock import MagicMock
+
+from entities import RecordingBatch
+from stats import RunningStats, bucket_stats, update_stats
+from test_load import make_recording
+
+
+def make_batch(*readings: tuple[int, str, float]) -> RecordingBatch:
+    batch = RecordingBatch.from_recordings(make_recording(plant_id) for plant_id, _, _ in readings)
+    batch.recording_taken = [taken for _, taken, _ in readings]
+    for index, (_, _, value) in enumerate(readings):
+        batch.temperature[index] = value
+    return batch
+
+
+def test_running_stats_matches_two_pass():
+    values = [13.2, 14.1, 12.9, 30.0, 13.5]
+    stats = RunningStats()
+    for value in values:
+        stats.add(value)
+
+    assert stats.count == 5
+    assert round(stats.mean, 9) == round(mean(values), 9)
+    assert round(stats.m2 / (stats.count - 1), 9) == round(variance(values), 9)
+    assert (stats.minimum, stats.maximum) == (12.9, 30.0)
+
+
+def test_bucket_stats_groups_by_plant_metric_and_hour():
+    buckets = bucket_stats(
+        make_batch(
+            (1, "2024-04-17 10:56:19", 13.0),
+            (1, "2024-04-17 10:57:19", 15.0),
+            (1, "2024-04-17 11:00:19", 20.0),
+            (2, "2024-04-17 10:56:19", float("nan")),
+        )
+    )
+
+    assert buckets[(1, "temperature", "2024-04-17 10:00:00")].mean == 14.0
+    assert buckets[(1, "temperature", "2024-04-17 11:00:00")].count == 1
+    assert (2, "temperature", "2024-04-17 10:00:00") not in buckets
+    assert (2, "soil_moisture", "2024-04-17 10:00:00") in buckets
+
+
+def test_update_stats_merges_and_commits():
+    conn = MagicMock()
+
+    update_stats(conn, make_batch((1, "2024-04-17 10:56:19", 13.0)))
+
+    sql, params = conn.cursor.return_value.execute.call_args.args
+    assert "MERGE s_beta.recording_stats" in sql
+    assert params[:4] == (1, "soil_moisture", "2024-04-17 10:00:00", 1)
+    conn.commit.assert_called_once()
+
+
+def test_update_stats_leaves_commit_to_caller():
+    conn = MagicMock()
+
+    update_stats(conn, make_batch((1, "2024-04-17 10:56:19", 13.0)), commit=False)
+
+    conn.cursor.return_value.execute.assert_called_once()
+    conn.commit.assert_not_called()
+
+
+def test_update_stats_empty_batch():
+    conn = MagicMock()
+
+    update_stats(conn, RecordingBatch())
+
+    conn.cursor.assert_not_called()
@@ -0,0 +1,50 @@
+import asyncio
+
+import stream
+from extract import FetchResult
+from stream import run_stream
+
+
+def plant_data(plant_id: int) -> dict:
+    return {
+        "botanist": {"email": "email", "name": "fname lname", "phone": "phone"},
+        "last_watered": "Tue, 16 Apr 2024 14:03:04 GMT",
+        "name": "Epipremnum aureum",
+        "origin_location": ["-19.3", "-41.2", "Resplendor", "BR", "America/Sao_Paulo"],
+        "plant_id": plant_id,
+        "recording_taken": "2024-04-17 10:56:19",
+        "soil_moisture": 27.2,
+        "temperature": 13.2,
+    }
+
+
+def fake_iter_results(delays: list[float]):
+    async def iter_results(urls, **kwargs):
+        for i, (url, delay) in enumerate(zip(urls, delays)):
+            await asyncio.sleep(delay)
+            yield FetchResult(url, data=plant_data(i) if i != 1 else None, status=200)
+
+    return iter_results
+
+
+def test_run_stream_flushes_by_size(monkeypatch):
+    monkeypatch.setattr(stream, "iter_results", fake_iter_results([0] * 5))
+    batches = []
+
+    results = asyncio.run(
+        run_stream([f"url{i}" for i in range(5)], batches.append, batch_size=2)
+    )
+
+    assert len(results) == 5
+    assert [[r.plant.id for r in batch] for batch in batches] == [[0, 2], [3, 4]]
+
+
+def test_run_stream_flushes_by_time(monkeypatch):
+    monkeypatch.setattr(stream, "iter_results", fake_iter_results([0, 0, 0.2]))
+    batches = []
+
+    asyncio.run(
+        run_stream(["a", "b", "c"], batches.append, batch_size=100, flush_seconds=0.05)
+    )
+
+    assert [[r.plant.id for r in batch] for batch in batches] == [[0], [2]]
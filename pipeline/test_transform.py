@@ -1,7 +1,9 @@
 import pytest
 from transform import (
     clean_scientific_name,
+    parse_last_watered,
     transform,
+    transform_batch,
     validate_keys,
     Recording,
     Plant,
@@ -132,3 +134,72 @@ def test_validate_keys():
     }
 
     assert validate_keys(expected_keys, test_data)
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("Tue, 16 Apr 2024 14:03:04 GMT", "2024-04-16 14:03:04"),
+        ("Thu, 29 Feb 2024 23:59:59 GMT", "2024-02-29 23:59:59"),
+        ("Tue, 16 Apr 2024 14:03:04 UTC", "2024-04-16 14:03:04"),
+        ("Wed, 31 Apr 2024 14:03:04 GMT", None),
+        ("Tue, 16 Apr 2024 24:03:04 GMT", None),
+        ("16/04/2024", None),
+    ],
+)
+def test_parse_last_watered(text, expected):
+    assert parse_last_watered(text) == expected
+
+
+def test_transform_batch_matches_transform():
+    item = {
+        "botanist": {"email": "email", "name": "fname lname", "phone": "phone"},
+        "images": {
+            "license": 45,
+            "license_name": "name",
+            "license_url": "lurl",
+            "original_url": "ourl",
+        },
+        "last_watered": "Tue, 16 Apr 2024 14:03:04 GMT",
+        "name": "Epipremnum aureum",
+        "origin_location": ["-19.3", "-41.2", "Resplendor", "BR", "America/Sao_Paulo"],
+        "plant_id": 0,
+        "recording_taken": "2024-04-17 10:56:19",
+        "scientific_name": ["Epipremnum aureum"],
+        "soil_moisture": 27.2,
+        "temperature": 13.2,
+    }
+    test_data = [
+        item,
+        None,
+        {"plant_id": 1},
+        item | {"plant_id": 2, "last_watered": "not a date", "images": None},
+        item | {"plant_id": 3, "name": " Venus flytrap,", "scientific_name": ["Begonia 'Art Hodes'"]},
+        item | {"plant_id": 4, "last_watered": None},
+    ]
+
+    assert transform_batch(test_data) == transform(test_data)
+    assert [r.plant.id for r in transform_batch(test_data)] == [0, 2, 3, 4]
+
+
+def test_transform_batch_keys_images_on_their_fields():
+    item = {
+        "botanist": {"email": "email", "name": "fname lname", "phone": "phone"},
+        "images": {
+            "license": 45,
+            "license_name": "name",
+            "license_url": "lurl",
+            "original_url": "ourl",
+            "sizes": {"small": "surl"},
+        },
+        "name": "Epipremnum aureum",
+        "origin_location": ["-19.3", "-41.2", "Resplendor", "BR", "America/Sao_Paulo"],
+        "plant_id": 0,
+        "recording_taken": "2024-04-17 10:56:19",
+    }
+    reordered = item | {"images": dict(reversed(item["images"].items()))}
+
+    first, second = transform_batch([item, reordered])
+
+    assert first.image == Image("ourl", "name", "lurl", 45)
+    assert first.image is second.image
@@ -13,4 +13,22 @@ DROP TABLE s_beta.plant;
 GO
 
 DROP TABLE s_beta.origin;
+GO
+
+DROP TABLE s_beta.plant_registry;
+GO
+
+DROP TABLE s_beta.recording_stats;
+GO
+
+DROP TABLE s_beta.plant_last_seen;
+GO
+
+DROP TABLE s_beta.reading_gap;
+GO
+
+DROP TABLE s_beta.anomaly;
+GO
+
+DROP TABLE s_beta.alert_state;
 GO
\ No newline at end of file
@@ -61,3 +61,112 @@ BEGIN
             FOREIGN KEY (botanist_id) REFERENCES s_beta.botanist(botanist_id) ON DELETE CASCADE
     );
 END;
+
+-- One recording per plant per reading; duplicate inserts are ignored rather than failing the batch
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'ux_recording_plant_taken' AND object_id = OBJECT_ID('s_beta.recording'))
+BEGIN
+    WITH ranked AS (
+        SELECT ROW_NUMBER() OVER (PARTITION BY plant_id, recording_taken ORDER BY recording_id) AS occurrence
+        FROM s_beta.recording
+    )
+    DELETE FROM ranked WHERE occurrence > 1;
+
+    CREATE UNIQUE INDEX ux_recording_plant_taken
+        ON s_beta.recording (plant_id, recording_taken)
+        WITH (IGNORE_DUP_KEY = ON);
+END;
+
+-- Covers the health check's query for the last hour of readings
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'ix_recording_taken' AND object_id = OBJECT_ID('s_beta.recording'))
+BEGIN
+    CREATE INDEX ix_recording_taken
+        ON s_beta.recording (recording_taken, plant_id)
+        INCLUDE (soil_moisture, temperature);
+END;
+
+IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'plant_registry' AND schema_id = SCHEMA_ID('s_beta'))
+BEGIN
+    CREATE TABLE s_beta.plant_registry (
+        plant_id INT PRIMARY KEY,
+        active BIT NOT NULL,
+        misses SMALLINT NOT NULL DEFAULT 0,
+        last_checked DATETIME2 NOT NULL,
+        next_probe DATETIME2
+    );
+END;
+
+-- Per plant, metric and hour: count, mean and M2 (sum of squared differences from the mean) of
+-- Welford's algorithm, updated by the pipeline as each batch is loaded
+IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'recording_stats' AND schema_id = SCHEMA_ID('s_beta'))
+BEGIN
+    CREATE TABLE s_beta.recording_stats (
+        plant_id INT NOT NULL,
+        metric VARCHAR(20) NOT NULL,
+        bucket_start DATETIME2 NOT NULL,
+        reading_count INT NOT NULL,
+        mean FLOAT NOT NULL,
+        m2 FLOAT NOT NULL,
+        min_value FLOAT NOT NULL,
+        max_value FLOAT NOT NULL,
+        PRIMARY KEY (plant_id, metric, bucket_start)
+    );
+END;
+
+-- When each plant last reported, kept by the pipeline so the health check need not scan recordings
+IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'plant_last_seen' AND schema_id = SCHEMA_ID('s_beta'))
+BEGIN
+    CREATE TABLE s_beta.plant_last_seen (
+        plant_id INT PRIMARY KEY,
+        last_seen DATETIME2 NOT NULL
+    );
+    INSERT INTO s_beta.plant_last_seen (plant_id, last_seen)
+    SELECT plant_id, MAX(recording_taken)
+    FROM s_beta.recording
+    GROUP BY plant_id;
+END;
+
+-- Periods longer than a few minutes in which a plant did not report, recorded when it reports again
+IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'reading_gap' AND schema_id = SCHEMA_ID('s_beta'))
+BEGIN
+    CREATE TABLE s_beta.reading_gap (
+        plant_id INT NOT NULL,
+        gap_start DATETIME2 NOT NULL,
+        gap_end DATETIME2 NOT NULL,
+        PRIMARY KEY (plant_id, gap_start)
+    );
+END;
+
+-- Readings the pipeline found too far from their plant's baseline as they were loaded
+IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'anomaly' AND schema_id = SCHEMA_ID('s_beta'))
+BEGIN
+    CREATE TABLE s_beta.anomaly (
+        anomaly_id BIGINT IDENTITY(1,1) PRIMARY KEY,
+        plant_id INT NOT NULL,
+        recording_taken DATETIME2 NOT NULL,
+        metric VARCHAR(20) NOT NULL,
+        value FLOAT NOT NULL,
+        mean FLOAT NOT NULL,
+        std FLOAT NOT NULL,
+        z_score FLOAT NOT NULL,
+        detected_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+    );
+    CREATE UNIQUE INDEX ux_anomaly_plant_taken_metric
+        ON s_beta.anomaly (plant_id, recording_taken, metric)
+        WITH (IGNORE_DUP_KEY = ON);
+END;
+
+-- Open health check alerts per plant, metric ('' for missing plants) and kind, so that
+-- persistent alerts are only sent again once they escalate or their cooldown expires
+IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'alert_state' AND schema_id = SCHEMA_ID('s_beta'))
+BEGIN
+    CREATE TABLE s_beta.alert_state (
+        plant_id INT NOT NULL,
+        metric VARCHAR(20) NOT NULL,
+        kind VARCHAR(10) NOT NULL,
+        first_seen DATETIME2 NOT NULL,
+        last_seen DATETIME2 NOT NULL,
+        last_sent DATETIME2 NOT NULL,
+        severity FLOAT NOT NULL,
+        PRIMARY KEY (plant_id, metric, kind)
+    );
+END;
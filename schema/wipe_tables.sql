@@ -14,3 +14,21 @@ GO
 
 DELETE FROM s_beta.origin;
 GO
+
+DELETE FROM s_beta.plant_registry;
+GO
+
+DELETE FROM s_beta.recording_stats;
+GO
+
+DELETE FROM s_beta.plant_last_seen;
+GO
+
+DELETE FROM s_beta.reading_gap;
+GO
+
+DELETE FROM s_beta.anomaly;
+GO
+
+DELETE FROM s_beta.alert_state;
+GO
\ No newline at end of file